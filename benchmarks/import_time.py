@@ -0,0 +1,54 @@
+'''
+Measures the cost of importing each contract module in a fresh interpreter.
+
+Run from the repository root:
+
+    python benchmarks/import_time.py [--runs N]
+
+The pyteal import itself is reported separately so the per-module numbers
+show only what the contract module adds on top of it.
+'''
+
+import argparse
+import statistics
+import subprocess
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "pyteal",
+    "contracts.dao_app_approval",
+    "contracts.dao_app_clear",
+    "contracts.dot_algo_registry",
+    "contracts.dot_algo_name_record",
+]
+
+SNIPPET = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+
+
+def time_import(module, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module)],
+            cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = time_import("pyteal", args.runs)
+    for module in MODULES:
+        t = time_import(module, args.runs) if module != "pyteal" else baseline
+        print("{:<36} {:8.1f} ms  (+{:.1f} ms over pyteal)".format(module, t * 1000, (t - baseline) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+'''
+Worst-case opcode cost of the name record LogicSig per name length, for
+each charset check strategy.
+
+Run from the repository root:
+
+    python benchmarks/name_record_cost.py [--reg-app-id N] [--lengths 3,4,5,8,16,32,64]
+
+The charset loop runs exactly len(name) times, so each row is the static
+cost analysis with the loop bound set to that length.
+'''
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyteal import compileTeal, Mode
+
+from contracts.cost_analyzer import ProgramAnalysis, LOGIC_SIG_BUDGET
+from contracts.dot_algo_name_record import ValidateRecord, CHARSET_CHECK_BITMASK, CHARSET_CHECK_RANGE
+from contracts.name_record_template import LOGIC_SIG_VERSION, _application_address
+from contracts.teal_assembler import assemble
+
+STRATEGIES = [CHARSET_CHECK_RANGE, CHARSET_CHECK_BITMASK]
+
+
+def cost(name, reg_app_id, charset_check):
+    teal = compileTeal(ValidateRecord(name, reg_app_id, _application_address(reg_app_id), charset_check),
+                       Mode.Signature, version=LOGIC_SIG_VERSION)
+    analysis = ProgramAnalysis(teal, LOGIC_SIG_BUDGET, name_length_bound=len(name))
+    return analysis.report()["cost"], len(assemble(teal))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reg-app-id", type=int, default=1)
+    parser.add_argument("--lengths", default="3,4,5,8,16,32,64")
+    args = parser.parse_args()
+
+    print("{:>6}  {:>12} {:>12}  {:>8}".format("length", *STRATEGIES, "saved"))
+    for length in [int(n) for n in args.lengths.split(",")]:
+        name = ("a0" * length)[:length]
+        costs = [cost(name, args.reg_app_id, s)[0] for s in STRATEGIES]
+        print("{:>6}  {:>12} {:>12}  {:>7.0f}%".format(length, costs[0], costs[1], 100.0 * (costs[0] - costs[1]) / costs[0]))
+
+    for strategy in STRATEGIES:
+        print("{} program size: {} bytes".format(strategy, cost("abc", args.reg_app_id, strategy)[1]))
+
+
+if __name__ == "__main__":
+    main()
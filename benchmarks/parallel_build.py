@@ -0,0 +1,56 @@
+'''
+Wall time of a full contract build with the process pool at different
+worker counts, cache disabled so every program is compiled.
+
+Run from the repository root:
+
+    python benchmarks/parallel_build.py [--names 32] [--runs 3]
+
+The batch is the four DAO and registry programs plus one name record
+LogicSig per name, what a deploy plus test bootstrap compiles.
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contracts.build import build_targets, build_teal, ZERO_ADDRESS
+from contracts.build_cache import BuildCache
+
+
+def time_build(targets, processes, runs):
+    samples = []
+    for _ in range(runs):
+        cache = BuildCache(cache_dir=None)
+        t = time.perf_counter()
+        build_teal(targets, processes, cache)
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    names = ["name{:04d}".format(i) for i in range(args.names)]
+    targets = build_targets(12345678, ZERO_ADDRESS, 1, names)
+    print("{} programs, {} cores".format(len(targets), os.cpu_count()))
+
+    counts = sorted(set([1, 2, 4, 8, 16, args.max_processes]))
+    counts = [n for n in counts if n <= max(args.max_processes, 1)]
+    serial = None
+    for processes in counts:
+        t = time_build(targets, processes, args.runs)
+        serial = serial or t
+        print("{:>3} processes {:8.0f} ms  x{:.2f}".format(processes, t * 1000, serial / t))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+asyncio clients for algod and the indexer.
+
+The clients speak HTTP/1.1 over asyncio streams and keep connections
+alive, so a single event loop can have hundreds of calls in flight over
+at most pool_size connections per endpoint. Their methods mirror the
+py-algorand-sdk clients the helpers use and return the same values,
+and they raise the SDK's AlgodHTTPError and IndexerHTTPError, the
+latter as http_pool.IndexerHTTPStatusError carrying the status.
+
+    algod_client = AsyncAlgodClient(token, "http://localhost:4001")
+    status = await algod_client.status()
+    ...
+    await algod_client.close()
+"""
+
+import asyncio
+import base64
+import copy
+import json
+import ssl
+from urllib import parse
+
+from algosdk import constants, encoding, error
+from algosdk.future import transaction
+
+from .confirmation import AsyncConfirmationWaiter
+from .http_pool import RETRY_METHODS, IndexerHTTPStatusError
+from .params_cache import SuggestedParamsCache
+
+DEFAULT_POOL_SIZE = 16
+API_VERSION_PREFIX = "/v2"
+USER_AGENT = "py-algorand-sdk"
+
+
+class _Connection(object):
+
+    __slots__ = ("reader", "writer")
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncHTTPPool(object):
+    """
+    Keep-alive HTTP/1.1 connections to one endpoint. At most pool_size
+    requests run at once, the rest wait for a connection to free up.
+    """
+
+    def __init__(self, address, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        url = parse.urlsplit(address)
+        if url.scheme not in ("http", "https"):
+            raise ValueError("unsupported endpoint: {}".format(address))
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.base_path = url.path.rstrip("/")
+        self.timeout = timeout
+        self._host_header = url.netloc
+        self._ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle = []
+        self.connections_opened = 0
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self._ssl)
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    async def _exchange(self, conn, method, path, headers, body):
+        head = ["{} {} HTTP/1.1".format(method, path), "Host: " + self._host_header]
+        head.extend("{}: {}".format(name, value) for name, value in headers.items())
+        head.append("Content-Length: {}".format(len(body)))
+        conn.writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await conn.writer.drain()
+
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by {}".format(self.host))
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await conn.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = response_headers.get("connection", "").lower() != "close"
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await conn.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await conn.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await conn.reader.readexactly(size))
+                await conn.reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await conn.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            data = await conn.reader.read()
+            keep_alive = False
+        return status, data, keep_alive
+
+    async def request(self, method, path, headers=None, body=b""):
+        """(status, body) of one request, path is relative to the endpoint's base path."""
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            try:
+                if conn is None:
+                    conn = await self._open()
+                try:
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, self.base_path + path, headers or {}, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused or method not in RETRY_METHODS:
+                        raise
+                    # The server closed an idle connection, retry a GET once on a new one
+                    conn.close()
+                    conn = await self._open()
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, self.base_path + path, headers or {}, body), self.timeout)
+            except BaseException:
+                if conn is not None:
+                    conn.close()
+                raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn.close()
+            return status, data
+
+    async def close(self):
+        while self._idle:
+            conn = self._idle.pop()
+            conn.close()
+            try:
+                await conn.writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+
+def _error_message(data):
+    text = data.decode('utf-8', 'replace')
+    try:
+        return json.loads(text)["message"]
+    except (ValueError, KeyError, TypeError):
+        return text
+
+
+class _AsyncClient(object):
+
+    auth_header = None
+
+    def __init__(self, token, address, headers=None, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        self.token = token
+        self.address = address
+        self.headers = headers
+        self.pool = AsyncHTTPPool(address, pool_size, timeout)
+
+    def _raise(self, status, data):
+        raise NotImplementedError
+
+    async def request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": USER_AGENT}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth and self.token:
+            header[self.auth_header] = self.token
+        if requrl not in constants.unversioned_paths:
+            requrl = API_VERSION_PREFIX + requrl
+        if params:
+            requrl = requrl + "?" + parse.urlencode(params)
+        status, body = await self.pool.request(method, requrl, header, data or b"")
+        if status >= 400:
+            self._raise(status, body)
+        if response_format != "json":
+            return body
+        try:
+            return json.loads(body)
+        except ValueError as err:
+            raise error.AlgodResponseError("Failed to parse JSON response") from err
+
+    async def close(self):
+        await self.pool.close()
+
+
+class AsyncAlgodClient(_AsyncClient):
+
+    auth_header = constants.algod_auth_header
+
+    def _raise(self, status, data):
+        raise error.AlgodHTTPError(_error_message(data), status)
+
+    async def status(self):
+        return await self.request("GET", "/status")
+
+    async def status_after_block(self, block_num):
+        return await self.request("GET", "/status/wait-for-block-after/" + str(block_num))
+
+    async def suggested_params(self):
+        res = await self.request("GET", "/transactions/params")
+        return transaction.SuggestedParams(
+            res["fee"], res["last-round"], res["last-round"] + 1000, res["genesis-hash"],
+            res["genesis-id"], False, res["consensus-version"], res["min-fee"])
+
+    async def account_info(self, address):
+        return await self.request("GET", "/accounts/" + address)
+
+    async def application_info(self, application_id):
+        return await self.request("GET", "/applications/" + str(application_id))
+
+    async def asset_info(self, index):
+        return await self.request("GET", "/assets/" + str(index))
+
+    async def pending_transaction_info(self, transaction_id):
+        return await self.request("GET", "/transactions/pending/" + transaction_id, {"format": "json"})
+
+    async def compile(self, source):
+        return await self.request("POST", "/teal/compile", data=source.encode('utf-8'))
+
+    async def send_raw_transaction(self, txn):
+        """txn is base64 of the msgpack encoded signed transactions, as for the SDK."""
+        res = await self.request("POST", "/transactions", data=base64.b64decode(txn),
+                                 headers={"Content-Type": "application/x-binary"})
+        return res["txId"]
+
+    async def send_transaction(self, txn):
+        return await self.send_transactions([txn])
+
+    async def send_transactions(self, txns):
+        for txn in txns:
+            assert not isinstance(txn, transaction.Transaction), \
+                "Attempt to send UNSIGNED transaction {}".format(txn)
+        return await self.send_raw_transaction(
+            base64.b64encode(b"".join(base64.b64decode(encoding.msgpack_encode(txn)) for txn in txns)))
+
+
+class AsyncIndexerClient(_AsyncClient):
+
+    auth_header = constants.indexer_auth_header
+
+    def _raise(self, status, data):
+        raise IndexerHTTPStatusError(_error_message(data), status)
+
+    async def account_info(self, address, include_all=False):
+        return await self.request("GET", "/accounts/" + address, {"include-all": "true"} if include_all else None)
+
+    async def applications(self, application_id):
+        return await self.request("GET", "/applications/" + str(application_id))
+
+    async def search_transactions(self, **params):
+        return await self.request("GET", "/transactions", params)
+
+
+class AsyncSuggestedParamsCache(object):
+    """
+    contracts.params_cache for an AsyncAlgodClient. Calls that miss
+    together share one suggested_params request.
+    """
+
+    def __init__(self, algod_client, **kwargs):
+        self.cache = SuggestedParamsCache(algod_client, **kwargs)
+        self._fetch = None
+
+    async def _refresh(self):
+        return self.cache.store(await self.cache.algod_client.suggested_params())
+
+    async def get(self):
+        params = self.cache.lookup()
+        if params is not None:
+            return params
+        if self._fetch is None or self._fetch.done():
+            self._fetch = asyncio.ensure_future(self._refresh())
+        else:
+            # Served by the request already in flight
+            self.cache.hits += 1
+        return copy.copy(await asyncio.shield(self._fetch))
+
+    def observe_round(self, round):
+        self.cache.observe_round(round)
+
+
+class AsyncAlgod(object):
+    """An AsyncAlgodClient with its params cache and confirmation waiter."""
+
+    def __init__(self, algod_client):
+        self.client = algod_client
+        self.params = AsyncSuggestedParamsCache(algod_client)
+        self.waiter = AsyncConfirmationWaiter(algod_client, self.params.observe_round)
+
+    async def suggested_params(self):
+        return await self.params.get()
+
+    async def send_and_confirm(self, signed_txns):
+        """Send a group and return the pending transaction info of its last transaction once confirmed."""
+        await self.client.send_transactions(signed_txns)
+        last = signed_txns[-1]
+        return await self.waiter.confirm(last.get_txid(), last.transaction.last_valid_round)
+
+    async def close(self):
+        await self.client.close()
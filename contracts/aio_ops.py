@@ -0,0 +1,266 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+High-level registry and DAO operations on the asyncio clients.
+
+    ans = AsyncANS(AsyncAlgodClient(token, address), reg_app_id, dao_app_id=..., gov_asa_id=...)
+    await asyncio.gather(*[ans.resolve_name(name) for name in names])
+
+Every operation builds its group from the shared params cache, sends
+it, and returns once it is confirmed, so any number of them can run
+concurrently on one event loop. They build the same groups as the
+synchronous test helpers.
+
+Name record LogicSigs are assembled by algod's compile, in a worker
+thread, unless an assemble function such as the offline
+teal_assembler.assemble is given.
+"""
+
+import asyncio
+import base64
+import functools
+import time
+
+from algosdk import account, encoding, logic
+from algosdk.future import transaction
+from algosdk.v2client import algod
+from algosdk.future.transaction import LogicSig, LogicSigTransaction
+
+from . import constants
+from .aio import AsyncAlgod
+from .dot_algo_name_record import CHARSET_CHECK_RANGE
+from .methods import DISPATCH_NAME, registry_call, dao_call
+from .name_record_template import name_record_template
+from .name_records import decode_local_state
+from .proposals import (created_proposal_id, encode_payouts, program_chunks, program_hash,
+                        APPROVAL_PROGRAM, CLEAR_PROGRAM)
+
+# Minimum balance a name record account needs to opt in to the registry
+NAME_RECORD_FUNDING = 915000
+
+
+def name_price(name):
+    """Registration or renewal price of name for one year, in microalgos."""
+    if len(name) == 3:
+        return constants.COST_FOR_3
+    if len(name) == 4:
+        return constants.COST_FOR_4
+    return constants.COST_FOR_5
+
+
+def algod_assembler(algod_client):
+    """Blocking assemble(teal) by the compile endpoint of an AsyncAlgodClient's node."""
+    client = algod.AlgodClient(algod_client.token, algod_client.address, algod_client.headers)
+
+    def assemble(teal):
+        return base64.b64decode(client.compile(teal)['result'])
+
+    return assemble
+
+
+def _payouts(payouts):
+    return encode_payouts([(encoding.decode_address(addr), algo, ans) for addr, algo, ans in payouts])
+
+
+class AsyncANS(object):
+    """Registry and DAO operations for one deployment, on an AsyncAlgodClient."""
+
+    def __init__(self, algod_client, reg_app_id, indexer_client=None, dao_app_id=None, gov_asa_id=None,
+                 dispatch=DISPATCH_NAME, charset_check=CHARSET_CHECK_RANGE, dao_dispatch=None, assemble=None):
+        self.algod = algod_client if isinstance(algod_client, AsyncAlgod) else AsyncAlgod(algod_client)
+        self.indexer = indexer_client
+        self.reg_app_id = reg_app_id
+        self.dao_app_id = dao_app_id
+        self.gov_asa_id = gov_asa_id
+        self.dispatch = dispatch
+        self.dao_dispatch = dao_dispatch or dispatch
+        self.reg_escrow = logic.get_application_address(reg_app_id)
+        self.charset_check = charset_check
+        self.assemble = assemble or algod_assembler(self.algod.client)
+        self._template = None
+        self._template_lock = asyncio.Lock()
+
+    async def _name_record(self, method, name):
+        # Template and unspliceable names may call algod, off the event loop
+        loop = asyncio.get_running_loop()
+        if self._template is None:
+            async with self._template_lock:
+                if self._template is None:
+                    self._template = await loop.run_in_executor(None, functools.partial(
+                        name_record_template, self.reg_app_id, self.charset_check, self.dispatch, self.assemble))
+        return await loop.run_in_executor(None, getattr(self._template, method), name)
+
+    async def name_record_address(self, name):
+        return await self._name_record("address", name)
+
+    async def _sign_and_send(self, txns, private_key):
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+        return await self.algod.send_and_confirm([txn.sign(private_key) for txn in txns])
+
+    # Registry
+
+    async def register_name(self, name, years, private_key):
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        lsig = LogicSig(await self._name_record("program", name))
+        txns = [
+            transaction.PaymentTxn(sender, sp, self.reg_escrow, name_price(name) * years),
+            transaction.PaymentTxn(sender, sp, lsig.address(), NAME_RECORD_FUNDING),
+            transaction.ApplicationOptInTxn(lsig.address(), sp, self.reg_app_id),
+            transaction.ApplicationNoOpTxn(sender, sp, self.reg_app_id,
+                                           registry_call("register_name", name, years, dispatch=self.dispatch),
+                                           [lsig.address()]),
+        ]
+        transaction.assign_group_id(txns)
+        signed = [txns[0].sign(private_key), txns[1].sign(private_key), LogicSigTransaction(txns[2], lsig),
+                  txns[3].sign(private_key)]
+        return await self.algod.send_and_confirm(signed)
+
+    async def renew_name(self, name, years, private_key):
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        return await self._sign_and_send([
+            transaction.PaymentTxn(sender, sp, self.reg_escrow, name_price(name) * years),
+            transaction.ApplicationNoOpTxn(sender, sp, self.reg_app_id,
+                                           registry_call("renew_name", years, dispatch=self.dispatch),
+                                           [await self.name_record_address(name)]),
+        ], private_key)
+
+    async def initiate_transfer(self, name, price, recipient, private_key):
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        return await self._sign_and_send([
+            transaction.ApplicationNoOpTxn(sender, sp, self.reg_app_id,
+                                           registry_call("initiate_transfer", price, dispatch=self.dispatch),
+                                           [await self.name_record_address(name), recipient]),
+        ], private_key)
+
+    async def accept_transfer(self, name, price, owner, private_key):
+        """Pay owner the transfer price and the registry its fee, and take over name."""
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        return await self._sign_and_send([
+            transaction.PaymentTxn(sender, sp, owner, price),
+            transaction.PaymentTxn(sender, sp, self.reg_escrow, constants.COST_FOR_TRANSFER),
+            transaction.ApplicationNoOpTxn(sender, sp, self.reg_app_id,
+                                           registry_call("accept_transfer", dispatch=self.dispatch),
+                                           [await self.name_record_address(name)]),
+        ], private_key)
+
+    async def name_state(self, name):
+        """decode_local_state of name's record, None if it was never registered."""
+        address = await self.name_record_address(name)
+        if self.indexer is not None:
+            local_states = (await self.indexer.account_info(address))['account'].get('apps-local-state', [])
+        else:
+            local_states = (await self.algod.client.account_info(address)).get('apps-local-state', [])
+        for local_state in local_states:
+            if local_state['id'] == self.reg_app_id and not local_state.get('deleted'):
+                return decode_local_state(local_state.get('key-value', []))
+        return None
+
+    async def resolve_name(self, name):
+        """Owner address of name, None if it is not registered or has expired."""
+        state = await self.name_state(name)
+        if state is None or state.get('expiry') is None or state['expiry'] <= int(time.time()):
+            return None
+        return encoding.encode_address(state['owner'])
+
+    # DAO
+
+    async def _is_opted_in(self, address, app_id):
+        local_states = (await self.algod.client.account_info(address)).get('apps-local-state', [])
+        return any(local_state['id'] == app_id for local_state in local_states)
+
+    async def register_vote(self, proposal_id, choice, private_key):
+        """Vote on proposal_id, opting in to the DAO in the same group if needed."""
+        sender = account.address_from_private_key(private_key)
+        sp, opted_in = await asyncio.gather(self.algod.suggested_params(), self._is_opted_in(sender, self.dao_app_id))
+        txns = [] if opted_in else [transaction.ApplicationOptInTxn(sender, sp, self.dao_app_id)]
+        txns.append(transaction.ApplicationNoOpTxn(
+            sender, sp, self.dao_app_id, dao_call("register_vote", proposal_id, choice, dispatch=self.dao_dispatch),
+            foreign_assets=[self.gov_asa_id]))
+        return await self._sign_and_send(txns, private_key)
+
+    async def _deposit(self):
+        app = await self.algod.client.application_info(self.dao_app_id)
+        for entry in app['params'].get('global-state', []):
+            if base64.b64decode(entry['key']) == b"deposit":
+                return entry['value']['uint']
+        raise ValueError("DAO app {} has no deposit set".format(self.dao_app_id))
+
+    async def add_proposal(self, kind, duration, url, private_key, payouts=None, approval_program=None,
+                           clear_program=None, deposit=None):
+        """
+        Deposit and add a proposal, returning its id. payouts are the
+        (address, algo amount, ANS amount) entries of a funding proposal,
+        approval_program and clear_program the new registry programs of
+        an updatereg proposal.
+        """
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        if deposit is None:
+            deposit = await self._deposit()
+        args, accounts, foreign_apps = [], None, None
+        if kind == "funding":
+            args = [_payouts(payouts)]
+            accounts, foreign_apps = [self.reg_escrow], [self.reg_app_id]
+        elif kind == "updatereg":
+            args = [self.reg_app_id, program_hash(approval_program), program_hash(clear_program)]
+            foreign_apps = [self.reg_app_id]
+        txinfo = await self._sign_and_send([
+            transaction.AssetTransferTxn(sender, sp, logic.get_application_address(self.dao_app_id), deposit,
+                                         self.gov_asa_id),
+            transaction.ApplicationNoOpTxn(sender, sp, self.dao_app_id,
+                                           dao_call("add_proposal", kind, duration, url, *args,
+                                                    dispatch=self.dao_dispatch),
+                                           accounts=accounts, foreign_apps=foreign_apps),
+        ], private_key)
+        return created_proposal_id(txinfo)
+
+    async def declare_result(self, proposal_id, private_key, payouts=None, approval_program=None,
+                             clear_program=None):
+        """
+        Declare proposal_id's result. A funding proposal needs its payouts
+        again, an updatereg proposal its programs, staged in the same group.
+        """
+        sender = account.address_from_private_key(private_key)
+        sp = await self.algod.suggested_params()
+        txns = []
+        if approval_program is not None:
+            for kind, program in ((APPROVAL_PROGRAM, approval_program), (CLEAR_PROGRAM, clear_program)):
+                for chunk in program_chunks(program):
+                    txns.append(transaction.ApplicationNoOpTxn(
+                        sender, sp, self.dao_app_id, dao_call("stage_program", kind, chunk, dispatch=self.dao_dispatch)))
+        txns.append(transaction.ApplicationNoOpTxn(
+            sender, sp, self.dao_app_id,
+            dao_call("declare_result", proposal_id, _payouts(payouts) if payouts else b"", dispatch=self.dao_dispatch),
+            accounts=[addr for addr, _, _ in payouts or []], foreign_apps=[self.reg_app_id],
+            foreign_assets=[self.gov_asa_id]))
+        return await self._sign_and_send(txns, private_key)
+
+    async def close(self):
+        await self.algod.close()
+        if self.indexer is not None:
+            await self.indexer.close()
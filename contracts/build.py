@@ -0,0 +1,203 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Writes every contract artifact in one pass.
+
+    python -m contracts.build --out-dir build --gov-asa-id 85778236 \\
+        --registry-controller <DAO escrow address>
+
+For each program it writes <name>.teal and <name>.bin, plus an
+artifacts.json manifest with sizes and hashes. Bytecode comes from the
+offline assembler unless --algod-address is given. Name record
+LogicSigs are built for every --name given.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+
+ZERO_ADDRESS = "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAY5HFKQ"
+
+
+def build_targets(gov_asa_id, registry_controller, reg_app_id=None, names=(), dispatch=None, charset_check=None):
+    """Return [(artifact_name, program_fn, args, mode, version)] for a full build."""
+    from pyteal import Mode
+    from algosdk import logic
+    from . import dao_app_approval, dao_app_clear, dot_algo_registry, dot_algo_name_record
+    from .methods import DISPATCH_NAME
+    dispatch = dispatch or DISPATCH_NAME
+    charset_check = charset_check or dot_algo_name_record.CHARSET_CHECK_RANGE
+
+    targets = [
+        ("dao_app_approval", dao_app_approval.approval_program, (gov_asa_id, dispatch), Mode.Application, 6),
+        ("dao_app_clear_state", dao_app_clear.clear_state_program, (), Mode.Application, 6),
+        ("dot_algo_registry_approval", dot_algo_registry.approval_program, (registry_controller, dispatch), Mode.Application, 6),
+        ("dot_algo_registry_clear_state", dot_algo_registry.clear_state_program, (), Mode.Application, 6),
+    ]
+    if names:
+        reg_escrow_acct = logic.get_application_address(reg_app_id)
+        for name in names:
+            targets.append((
+                "name_record_" + name,
+                dot_algo_name_record.ValidateRecord,
+                (name, reg_app_id, reg_escrow_acct, charset_check, dispatch),
+                Mode.Signature,
+                4
+            ))
+    return targets
+
+
+# Below this many programs to compile a process pool costs more than it saves
+MIN_PARALLEL_BATCH = 4
+
+
+def _compile_target(target):
+    from pyteal import compileTeal
+    _, program_fn, args, mode, version = target
+    return compileTeal(program_fn(*args), mode, version=version)
+
+
+def build_teal(targets, processes=None, cache=None, min_parallel=MIN_PARALLEL_BATCH):
+    """
+    Return the TEAL for every target, in target order.
+
+    Cache misses are compiled across a process pool of up to processes
+    workers (default: one per core). Fewer than min_parallel misses, a
+    single process, or a pool that cannot be started, compile in-process.
+    """
+    from .build_cache import default_cache
+    cache = default_cache if cache is None else cache
+
+    teals = []
+    missing = []
+    for index, target in enumerate(targets):
+        _, program_fn, args, mode, version = target
+        key, teal = cache.lookup_teal(program_fn, args, mode, version)
+        teals.append(teal)
+        if teal is None:
+            missing.append((index, key, target))
+
+    processes = min(processes or os.cpu_count() or 1, len(missing))
+    compiled = None
+    if processes > 1 and len(missing) >= min_parallel:
+        import multiprocessing
+        try:
+            with multiprocessing.Pool(processes) as pool:
+                compiled = pool.map(_compile_target, [target for _, _, target in missing], chunksize=1)
+        except (OSError, ImportError):
+            # No usable process support here (e.g. no /dev/shm), build serially
+            compiled = None
+    if compiled is None:
+        compiled = [_compile_target(target) for _, _, target in missing]
+
+    for (index, key, _), teal in zip(missing, compiled):
+        cache.store_teal(key, teal)
+        teals[index] = teal
+    return teals
+
+
+def algod_assembler(algod_address, algod_token):
+    from algosdk.v2client import algod
+    client = algod.AlgodClient(algod_token, algod_address)
+
+    def assemble(teal):
+        return base64.b64decode(client.compile(teal)['result'])
+
+    return assemble
+
+
+def build_artifacts(out_dir, targets, assemble=None, cache=None, processes=None):
+    """Build targets, write them under out_dir and return the manifest dict."""
+    from .build_cache import default_cache
+    from .proposals import program_hash
+    cache = default_cache if cache is None else cache
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    teals = build_teal(targets, processes, cache)
+    for (artifact_name, _, _, _, version), teal in zip(targets, teals):
+        entry = {
+            "teal": artifact_name + ".teal",
+            "teal_sha256": hashlib.sha256(teal.encode('utf-8')).hexdigest(),
+            "version": version,
+        }
+        with open(os.path.join(out_dir, entry["teal"]), 'w') as f:
+            f.write(teal)
+
+        if assemble is not None:
+            program = cache.bytecode(teal, assemble)
+            entry["bin"] = artifact_name + ".bin"
+            entry["size"] = len(program)
+            # Chained hash an updatereg proposal stores for this program
+            entry["program_hash"] = program_hash(program).hex()
+            with open(os.path.join(out_dir, entry["bin"]), 'wb') as f:
+                f.write(program)
+
+        manifest[artifact_name] = entry
+
+    with open(os.path.join(out_dir, "artifacts.json"), 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m contracts.build", description="Build ANS DAO contract artifacts")
+    parser.add_argument("--out-dir", default="build")
+    parser.add_argument("--gov-asa-id", type=int, default=12345678)
+    parser.add_argument("--registry-controller", default=ZERO_ADDRESS)
+    parser.add_argument("--reg-app-id", type=int, default=0)
+    parser.add_argument("--name", action="append", default=[], dest="names",
+                        help="build the name record LogicSig for this name, may be repeated")
+    parser.add_argument("--dispatch", default="name", choices=["name", "selector"],
+                        help="route calls by method name or by 4-byte selector, see contracts.methods")
+    parser.add_argument("--charset-check", default="range", choices=["range", "bitmask"],
+                        help="name record charset check, bitmask changes every name's escrow address")
+    parser.add_argument("--processes", type=int, help="compile with this many processes, default one per core")
+    parser.add_argument("--algod-address", help="assemble with this algod node instead of offline")
+    parser.add_argument("--algod-token", default="")
+    args = parser.parse_args(argv)
+
+    if args.names and not args.reg_app_id:
+        parser.error("--name requires --reg-app-id")
+
+    if args.algod_address:
+        assemble = algod_assembler(args.algod_address, args.algod_token)
+    else:
+        from .teal_assembler import assemble
+
+    targets = build_targets(args.gov_asa_id, args.registry_controller, args.reg_app_id, args.names, args.dispatch,
+                            args.charset_check)
+    manifest = build_artifacts(args.out_dir, targets, assemble, processes=args.processes)
+    for artifact_name, entry in manifest.items():
+        if "size" in entry:
+            print("{}: {} ({} bytes)".format(artifact_name, entry["bin"], entry["size"]))
+        else:
+            print("{}: {}".format(artifact_name, entry["teal"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
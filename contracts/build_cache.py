@@ -0,0 +1,293 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import hashlib
+import inspect
+import os
+import sys
+import threading
+from collections import OrderedDict
+from importlib import metadata
+
+from pyteal import compileTeal, Mode
+
+# Bump when the cache layout or key derivation changes
+CACHE_FORMAT = "2"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ANS_BUILD_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ans-dao", "build")
+)
+DEFAULT_MAX_MEMORY_ENTRIES = 512
+DEFAULT_MAX_DISK_BYTES = 64 * 1024 * 1024
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+try:
+    PYTEAL_VERSION = metadata.version("pyteal")
+except metadata.PackageNotFoundError:
+    PYTEAL_VERSION = "unknown"
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class BuildCache(object):
+    """
+    Content-addressed cache of PyTeal build outputs.
+
+    TEAL text is keyed by a hash of the contracts package source, the
+    pyteal version, the template parameters, the mode and the TEAL
+    version. Assembled bytecode is keyed by a hash of the TEAL text it was
+    assembled from and of the assembler's source. Both live in an
+    in-memory LRU and in a size-bounded directory on disk.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._source_digests = {}
+        self._module_digests = {}
+        self._package_digest_value = None
+        self._disk_bytes = None
+        self._lock = threading.RLock()
+
+    def _path_digest(self, path):
+        # Hashed once, the modules this process runs are already imported
+        digest = self._source_digests.get(path)
+        if digest is None:
+            digest = self._source_digests[path] = _file_digest(path)
+        return digest
+
+    def _source_digest(self, fn):
+        digest = self._module_digests.get(fn.__module__)
+        if digest is None:
+            module = sys.modules.get(fn.__module__)
+            path = inspect.getsourcefile(module) if module is not None else None
+            if path is None:
+                return fn.__module__ + "." + fn.__qualname__
+            digest = self._module_digests[fn.__module__] = self._path_digest(path)
+        return digest
+
+    def _package_digest(self):
+        """
+        Digest of every module in the contracts package, since contracts
+        import their layouts, selectors and events from their neighbours.
+        Computed on first use and reused.
+        """
+        if self._package_digest_value is None:
+            h = hashlib.sha256()
+            for name in sorted(os.listdir(PACKAGE_DIR)):
+                if name.endswith(".py"):
+                    h.update(name.encode('utf-8') + b'\x00')
+                    h.update(self._path_digest(os.path.join(PACKAGE_DIR, name)).encode('utf-8'))
+            self._package_digest_value = h.hexdigest()
+        return self._package_digest_value
+
+    def teal_key(self, program_fn, args, mode, version):
+        h = hashlib.sha256()
+        for part in (
+            CACHE_FORMAT,
+            PYTEAL_VERSION,
+            program_fn.__module__ + "." + program_fn.__qualname__,
+            self._source_digest(program_fn),
+            self._package_digest(),
+            repr(tuple(args)),
+            str(mode),
+            str(version),
+        ):
+            h.update(part.encode('utf-8'))
+            h.update(b'\x00')
+        return h.hexdigest()
+
+    def bytecode_key(self, teal, assemble):
+        """Key of teal's bytecode, which also depends on the assembler's source."""
+        h = hashlib.sha256()
+        for part in ("bin" + CACHE_FORMAT, self._source_digest(assemble), teal):
+            h.update(part.encode('utf-8'))
+            h.update(b'\x00')
+        return h.hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def _memory_get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key, suffix):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key, suffix)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _disk_put(self, key, suffix, data):
+        if self.cache_dir is None:
+            return
+        path = self._path(key, suffix)
+        try:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data) - replaced
+            # Only walk the directory once the running total says it is over,
+            # the walk also picks up what other processes wrote
+            if self._disk_bytes > self.max_disk_bytes:
+                self._disk_bytes = self._evict_disk()
+        except OSError:
+            # The disk tier is best effort, the memory tier still holds the entry
+            pass
+
+    def _disk_usage(self):
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        return total
+
+    def _evict_disk(self):
+        """Remove least recently used entries until under max_disk_bytes, return the bytes left."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return total
+        # Least recently used first, hits refresh the mtime
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+        return total
+
+    def lookup_teal(self, program_fn, args, mode=Mode.Application, version=6):
+        """Return (key, teal) for program_fn(*args), teal is None on a miss."""
+        key = self.teal_key(program_fn, args, mode, version)
+        with self._lock:
+            teal = self._memory_get(key)
+            if teal is None:
+                data = self._disk_get(key, ".teal")
+                if data is not None:
+                    teal = data.decode('utf-8')
+                    self._memory_put(key, teal)
+            if teal is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return key, teal
+
+    def store_teal(self, key, teal):
+        with self._lock:
+            self._memory_put(key, teal)
+            self._disk_put(key, ".teal", teal.encode('utf-8'))
+
+    def teal(self, program_fn, *args, mode=Mode.Application, version=6):
+        """Return the TEAL for program_fn(*args), building it only on a miss."""
+        key, teal = self.lookup_teal(program_fn, args, mode, version)
+        if teal is None:
+            teal = compileTeal(program_fn(*args), mode, version=version)
+            self.store_teal(key, teal)
+        return teal
+
+    def bytecode(self, teal, assemble):
+        """Return the bytecode for teal, calling assemble(teal) only on a miss."""
+        key = self.bytecode_key(teal, assemble)
+        with self._lock:
+            program = self._memory_get(key)
+            if program is None:
+                program = self._disk_get(key, ".bin")
+                if program is not None:
+                    self._memory_put(key, program)
+            if program is not None:
+                self.hits += 1
+                return program
+            self.misses += 1
+
+        program = assemble(teal)
+
+        with self._lock:
+            self._memory_put(key, program)
+            self._disk_put(key, ".bin", program)
+        return program
+
+    def program(self, assemble, program_fn, *args, mode=Mode.Application, version=6):
+        """Return the assembled bytecode for program_fn(*args)."""
+        return self.bytecode(self.teal(program_fn, *args, mode=mode, version=version), assemble)
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+            if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+                for root, _, files in os.walk(self.cache_dir):
+                    for name in files:
+                        try:
+                            os.remove(os.path.join(root, name))
+                        except OSError:
+                            pass
+
+
+default_cache = BuildCache()
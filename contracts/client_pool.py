@@ -0,0 +1,310 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+algod and indexer clients over several endpoints, with failover and
+hedged reads.
+
+AlgodPool and IndexerPool stand in for a single SDK client. Each call
+goes to the healthiest endpoint first. A read that has not answered
+within hedge_after seconds is sent again to the next endpoint, and the
+first answer wins. Submissions are not hedged. They go to the best
+endpoint and only move on to the next one when a node fails.
+
+An endpoint's health is a moving average of its latency, scaled up by
+its recent consecutive failures. After a failure it sits out a backoff
+period, doubling per failure, during which it is only tried once
+every healthy endpoint has been.
+
+    pool = algod_pool([(token, address, headers) for token, address, headers in endpoints])
+    pool.status()
+
+To watch it route around a slow and a failing node on local stub servers:
+
+    python -m contracts.client_pool --requests 200
+"""
+
+import http.client
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from algosdk import error
+
+from . import http_pool
+
+DEFAULT_HEDGE_AFTER = 0.25
+DEFAULT_MAX_HEDGES = 1
+LATENCY_ALPHA = 0.3
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# Calls that change state, sent to one node at a time
+ALGOD_SUBMIT_METHODS = ("send_transaction", "send_transactions", "send_raw_transaction")
+# Calls that block by design, failed over but never hedged
+ALGOD_LONG_POLL_METHODS = ("status_after_block",)
+
+
+def is_node_failure(err):
+    """
+    Whether err says the node is unwell rather than the request is wrong,
+    e.g. an unknown account's 404 is an answer and not failed over.
+    """
+    if isinstance(err, error.AlgodHTTPError):
+        return err.code is None or err.code >= 500 or err.code == 429
+    if isinstance(err, error.IndexerHTTPError):
+        # Only http_pool's indexer errors carry the status
+        code = getattr(err, "code", None)
+        return code is not None and (code >= 500 or code == 429)
+    return isinstance(err, (OSError, socket.timeout, http.client.HTTPException, error.AlgodResponseError))
+
+
+class Endpoint(object):
+    """One client of a pool and its health."""
+
+    def __init__(self, client, name=None):
+        self.client = client
+        self.name = name or getattr(client, "algod_address", None) or getattr(client, "indexer_address", None)
+        self.latency = None
+        self.failures = 0
+        self.calls = 0
+        self.failed_calls = 0
+        self.hedged_calls = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def score(self, default_latency):
+        """Lower is healthier."""
+        latency = default_latency if self.latency is None else self.latency
+        return latency * (1 + self.failures)
+
+    def available(self, now):
+        return now >= self.retry_at
+
+    def record_success(self, latency):
+        with self._lock:
+            self.calls += 1
+            self.failures = 0
+            self.retry_at = 0.0
+            self.latency = latency if self.latency is None else \
+                LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency
+
+    def record_failure(self):
+        with self._lock:
+            self.calls += 1
+            self.failed_calls += 1
+            self.failures += 1
+            self.retry_at = time.monotonic() + min(BACKOFF * 2 ** (self.failures - 1), MAX_BACKOFF)
+
+    def stats(self):
+        return {
+            "name": self.name, "latency": self.latency, "failures": self.failures, "calls": self.calls,
+            "failed_calls": self.failed_calls, "hedged_calls": self.hedged_calls,
+        }
+
+
+class EndpointPool(object):
+
+    submit_methods = ()
+    long_poll_methods = ()
+
+    def __init__(self, clients, hedge_after=DEFAULT_HEDGE_AFTER, max_hedges=DEFAULT_MAX_HEDGES):
+        if not clients:
+            raise ValueError("a client pool needs at least one endpoint")
+        self.endpoints = [client if isinstance(client, Endpoint) else Endpoint(client) for client in clients]
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.endpoints))
+
+    def ranked(self):
+        """Endpoints healthiest first, those backing off after all the others."""
+        now = time.monotonic()
+        return sorted(self.endpoints, key=lambda e: (not e.available(now), e.score(self.hedge_after)))
+
+    def best(self):
+        return self.ranked()[0]
+
+    def _attempt(self, endpoint, method, args, kwargs):
+        start = time.monotonic()
+        try:
+            result = getattr(endpoint.client, method)(*args, **kwargs)
+        except Exception as err:
+            if is_node_failure(err):
+                endpoint.record_failure()
+            else:
+                endpoint.record_success(time.monotonic() - start)
+            raise
+        endpoint.record_success(time.monotonic() - start)
+        return result
+
+    def failover(self, method, *args, **kwargs):
+        """Call method on each endpoint in turn, healthiest first, until one is not a node failure."""
+        last_err = None
+        for endpoint in self.ranked():
+            try:
+                return self._attempt(endpoint, method, args, kwargs)
+            except Exception as err:
+                if not is_node_failure(err):
+                    raise
+                last_err = err
+        raise last_err
+
+    def hedged(self, method, *args, **kwargs):
+        """
+        Call method on the healthiest endpoint, and on the next one as well
+        when no answer came within hedge_after. The first answer wins, a
+        node failure moves on to the next endpoint straight away.
+        """
+        candidates = self.ranked()
+        running = {}
+        hedges = 0
+        last_err = None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            running[self._executor.submit(self._attempt, endpoint, method, args, kwargs)] = endpoint
+
+        launch()
+        while running:
+            done, _ = wait(list(running), timeout=self.hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                if candidates and hedges < self.max_hedges:
+                    hedges += 1
+                    candidates[0].hedged_calls += 1
+                    launch()
+                continue
+            for future in done:
+                del running[future]
+                err = future.exception()
+                if err is None:
+                    return future.result()
+                if not is_node_failure(err):
+                    raise err
+                last_err = err
+            if not running and candidates:
+                launch()
+        raise last_err
+
+    def call(self, method, *args, **kwargs):
+        if method in self.submit_methods or method in self.long_poll_methods or len(self.endpoints) == 1:
+            return self.failover(method, *args, **kwargs)
+        return self.hedged(method, *args, **kwargs)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        if not callable(getattr(self.endpoints[0].client, method, None)):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+    def stats(self):
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AlgodPool(EndpointPool):
+    """Drop-in for an AlgodClient over several algod nodes."""
+
+    submit_methods = ALGOD_SUBMIT_METHODS
+    long_poll_methods = ALGOD_LONG_POLL_METHODS
+
+
+class IndexerPool(EndpointPool):
+    """Drop-in for an IndexerClient over several indexers, every call is a hedged read."""
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _shared(pool_class, client_factory, endpoints, hedge_after):
+    clients = tuple(client_factory(token, address, headers) for token, address, headers in endpoints)
+    key = (pool_class, clients, hedge_after)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = pool_class(clients, hedge_after)
+        return pool
+
+
+def algod_pool(endpoints, hedge_after=DEFAULT_HEDGE_AFTER):
+    """The AlgodPool shared by every caller of these (token, address, headers) endpoints and hedge_after."""
+    return _shared(AlgodPool, http_pool.algod_client, endpoints, hedge_after)
+
+
+def indexer_pool(endpoints, hedge_after=DEFAULT_HEDGE_AFTER):
+    """The IndexerPool shared by every caller of these (token, address, headers) endpoints and hedge_after."""
+    return _shared(IndexerPool, http_pool.indexer_client, endpoints, hedge_after)
+
+
+def main(argv=None):
+    import argparse
+    import random
+    parser = argparse.ArgumentParser(prog="python -m contracts.client_pool")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--hedge-after", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    servers = {
+        "fast": http_pool.stub_server(delay=0.002),
+        # usually fast, stalls on one call in ten
+        "stalling": http_pool.stub_server(delay=lambda: 0.5 if random.random() < 0.1 else 0.001),
+        "failing": http_pool.stub_server(status=503),
+    }
+    clients = dict(
+        (label, http_pool.PooledAlgodClient("", "http://127.0.0.1:{}".format(server.server_port)))
+        for label, server in servers.items()
+    )
+
+    def run(label, client):
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            try:
+                client.status()
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print("{:20} mean {:7.2f} ms   p99 {:7.2f} ms   max {:7.2f} ms".format(
+            label, 1000 * sum(latencies) / len(latencies), 1000 * latencies[int(len(latencies) * 0.99)],
+            1000 * latencies[-1]))
+
+    run("stalling node only", clients["stalling"])
+    pool = AlgodPool([Endpoint(client, label) for label, client in clients.items()], hedge_after=args.hedge_after)
+    # Start with the failing and stalling nodes preferred, the pool has to learn
+    pool.endpoints.sort(key=lambda e: ("failing", "stalling", "fast").index(e.name))
+    run("pool of all three", pool)
+    for stats in pool.stats():
+        print("  {name:10} calls {calls:4}  failed {failed_calls:4}  hedged to {hedged_calls:4}".format(**stats))
+    pool.close()
+    for server in servers.values():
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Confirmation of many transactions against one block stream.
+
+A ConfirmationWaiter holds a set of pending txids. It waits for each
+new round once, checks every txid still pending after it, and resolves
+all those confirmed in that round together, so a bulk flow waits about
+as long as its slowest transaction rather than the sum of all of them.
+
+Every txid gets a concurrent.futures.Future. It resolves to algod's
+pending transaction info once confirmed. It fails with
+TransactionRejected if the node drops the transaction from its pool,
+or with TransactionExpired once the last round it was valid in has
+passed without it being confirmed. An error looking one txid up fails
+that txid alone; the others are still waited on.
+
+AsyncConfirmationWaiter does the same for asyncio clients, see
+contracts.aio. One background task drives the rounds for every
+coroutine awaiting a txid.
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TransactionRejected(Exception):
+    pass
+
+
+class TransactionExpired(Exception):
+    pass
+
+
+class _Pending(object):
+
+    __slots__ = ("future", "last_valid")
+
+    def __init__(self, future, last_valid):
+        self.future = future
+        self.last_valid = last_valid
+
+
+def _settle(pending, txid, txinfo, round):
+    """Resolve pending[txid] from its pending transaction info as of round, if it is done."""
+    entry = pending[txid]
+    if txinfo.get('confirmed-round', 0) > 0:
+        del pending[txid]
+        entry.future.set_result(txinfo)
+    elif txinfo.get('pool-error'):
+        del pending[txid]
+        entry.future.set_exception(TransactionRejected("{}: {}".format(txid, txinfo['pool-error'])))
+    else:
+        if entry.last_valid is None:
+            entry.last_valid = txinfo.get('txn', {}).get('txn', {}).get('lv')
+        if entry.last_valid is not None and round >= entry.last_valid:
+            del pending[txid]
+            entry.future.set_exception(TransactionExpired(
+                "{} not confirmed by its last valid round {}".format(txid, entry.last_valid)))
+
+
+class ConfirmationWaiter(object):
+    """
+    Waits for a set of txids at once, one status_after_block per round.
+
+    on_round is called with every round the waiter sees, e.g. to keep a
+    contracts.params_cache in step.
+    """
+
+    def __init__(self, algod_client, on_round=None):
+        self.algod_client = algod_client
+        self.on_round = on_round
+        self.round = None
+        self._pending = OrderedDict()
+
+    def add(self, txid, last_valid=None, callback=None):
+        """
+        Track txid and return its Future. last_valid is read from the
+        pending transaction when not given. callback(future) runs once
+        it resolves.
+        """
+        entry = self._pending.get(txid)
+        if entry is None:
+            entry = self._pending[txid] = _Pending(Future(), last_valid)
+            entry.future.set_running_or_notify_cancel()
+        elif last_valid is not None:
+            entry.last_valid = last_valid
+        if callback is not None:
+            entry.future.add_done_callback(callback)
+        return entry.future
+
+    def add_transactions(self, signed_txns, callback=None):
+        """Track signed transactions, their last valid round known up front."""
+        return [
+            self.add(stxn.get_txid(), stxn.transaction.last_valid_round, callback)
+            for stxn in signed_txns
+        ]
+
+    def pending(self):
+        return len(self._pending)
+
+    def _set_round(self, status):
+        self.round = status['last-round']
+        if self.on_round is not None:
+            self.on_round(self.round)
+
+    def poll(self):
+        """Check every pending txid against the last round seen, resolving those that are done."""
+        if self.round is None:
+            self._set_round(self.algod_client.status())
+        for txid in list(self._pending):
+            try:
+                txinfo = self.algod_client.pending_transaction_info(txid)
+            except Exception as e:
+                # Only this txid fails, e.g. one algod no longer knows
+                self._pending.pop(txid).future.set_exception(e)
+                continue
+            _settle(self._pending, txid, txinfo, self.round)
+
+    def wait(self, max_rounds=None):
+        """
+        Poll once per new round until nothing is pending, or for at most
+        max_rounds rounds. Returns the number of txids still pending.
+        """
+        self.poll()
+        rounds = 0
+        while self._pending and (max_rounds is None or rounds < max_rounds):
+            self._set_round(self.algod_client.status_after_block(self.round))
+            rounds += 1
+            self.poll()
+        return len(self._pending)
+
+
+def wait_for_confirmations(algod_client, txids, on_round=None):
+    """Pending transaction info of every txid, in order, once all are confirmed."""
+    waiter = ConfirmationWaiter(algod_client, on_round)
+    futures = [waiter.add(txid) for txid in txids]
+    waiter.wait()
+    return [future.result() for future in futures]
+
+
+class AsyncConfirmationWaiter(object):
+    """
+    ConfirmationWaiter for an asyncio algod client. confirm() may be
+    awaited from any number of coroutines; the pending txids of a round
+    are all checked concurrently.
+    """
+
+    def __init__(self, algod_client, on_round=None):
+        self.algod_client = algod_client
+        self.on_round = on_round
+        self.round = None
+        self._pending = OrderedDict()
+        self._driver = None
+
+    def pending(self):
+        return len(self._pending)
+
+    def confirm(self, txid, last_valid=None):
+        """Awaitable of txid's pending transaction info once it is confirmed."""
+        entry = self._pending.get(txid)
+        if entry is None:
+            entry = self._pending[txid] = _Pending(asyncio.get_running_loop().create_future(), last_valid)
+        elif last_valid is not None:
+            entry.last_valid = last_valid
+        if self._driver is None or self._driver.done():
+            self._driver = asyncio.ensure_future(self._drive())
+        # A caller giving up does not cancel the txid for the others
+        return asyncio.shield(entry.future)
+
+    def _set_round(self, status):
+        self.round = status['last-round']
+        if self.on_round is not None:
+            self.on_round(self.round)
+
+    async def _poll(self):
+        txids = list(self._pending)
+        txinfos = await asyncio.gather(
+            *[self.algod_client.pending_transaction_info(txid) for txid in txids], return_exceptions=True)
+        for txid, txinfo in zip(txids, txinfos):
+            if txid not in self._pending:
+                continue
+            if isinstance(txinfo, Exception):
+                self._pending.pop(txid).future.set_exception(txinfo)
+            else:
+                _settle(self._pending, txid, txinfo, self.round)
+
+    async def _drive(self):
+        try:
+            if self.round is None:
+                self._set_round(await self.algod_client.status())
+            while self._pending:
+                await self._poll()
+                if self._pending:
+                    self._set_round(await self.algod_client.status_after_block(self.round))
+        except Exception as err:
+            while self._pending:
+                self._pending.popitem()[1].future.set_exception(err)
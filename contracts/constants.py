@@ -28,4 +28,7 @@ RENEWAL_TIME = 86400*365
 ASCII_LOWER_CASE_A = 97
 ASCII_LOWER_CASE_Z = 122
 ASCII_DIGIT_0 = 48
-ASCII_DIGIT_9 = 57
\ No newline at end of file
+ASCII_DIGIT_9 = 57
+MAX_APP_ARGS = 16
+MAX_GROUP_SIZE = 16
+MAX_APP_ACCOUNTS = 4
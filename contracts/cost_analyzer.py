@@ -0,0 +1,459 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Static worst-case opcode cost and size per dispatch branch.
+
+    python -m contracts.cost_analyzer [--out report.json] [--gov-asa-id N]
+        [--registry-controller ADDR] [--reg-app-id N] [--name NAME]
+        [--dispatch name|selector] [--compare before.json]
+
+Builds the control-flow graph of the assembled TEAL, finds the methods
+the top-level Cond dispatches to (application args selectors and
+OnCompletion branches) and reports, per method, the worst-case opcode
+cost along any path and the bytes of code reachable from it. Loops are
+unrolled to their bound: GROUP_SIZE_BOUND when the loop condition reads
+global GroupSize, NAME_LENGTH_BOUND when it takes a len, and
+DEFAULT_LOOP_BOUND otherwise (flagged in the report).
+"""
+
+import json
+import sys
+
+from .teal_assembler import assemble_listing
+
+APPLICATION_BUDGET = 700
+LOGIC_SIG_BUDGET = 20000
+
+GROUP_SIZE_BOUND = 16
+NAME_LENGTH_BOUND = 64
+DEFAULT_LOOP_BOUND = 16
+
+# Everything not listed costs 1
+OPCODE_COSTS = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "ed25519verify": 1900,
+    "ecdsa_verify": 1700,
+    "ecdsa_pk_decompress": 650,
+    "ecdsa_pk_recover": 2000,
+    "divmodw": 20,
+    "sqrt": 4,
+    "expw": 10,
+    "bsqrt": 40,
+    "b+": 10,
+    "b-": 10,
+    "b/": 20,
+    "b*": 20,
+    "b%": 20,
+    "b|": 6,
+    "b&": 6,
+    "b^": 6,
+    "b~": 4,
+}
+
+BRANCHES = ("bnz", "bz", "b")
+TERMINALS = ("return", "err", "retsub")
+
+
+class CostAnalysisError(Exception):
+    pass
+
+
+class _Block(object):
+
+    __slots__ = ("index", "start", "end", "succs", "cost", "size", "calls")
+
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.succs = []
+        self.cost = 0
+        self.size = 0
+        self.calls = []
+
+
+class ProgramAnalysis(object):
+
+    def __init__(self, teal, budget=APPLICATION_BUDGET, default_loop_bound=DEFAULT_LOOP_BOUND,
+                 name_length_bound=NAME_LENGTH_BOUND, method_names=None):
+        self.listing = assemble_listing(teal)
+        self.budget = budget
+        self.default_loop_bound = default_loop_bound
+        self.name_length_bound = name_length_bound
+        # Selector literal -> method name, for selector dispatch
+        self.method_names = method_names or {}
+        self.instructions = self.listing.instructions
+        self.loops = {}
+        self._sub_costs = {}
+        self._sub_stack = []
+        self._build_blocks()
+
+    def _build_blocks(self):
+        n = len(self.instructions)
+        leaders = {0, n}
+        leaders.update(self.listing.labels.values())
+        for i, (tokens, _, _) in enumerate(self.instructions):
+            if tokens[0] in BRANCHES or tokens[0] in TERMINALS:
+                leaders.add(i + 1)
+        starts = sorted(l for l in leaders if l <= n)
+
+        self.blocks = []
+        self._block_at = {}
+        for k, start in enumerate(starts):
+            end = starts[k + 1] if k + 1 < len(starts) else n
+            block = _Block(k, start, end)
+            self.blocks.append(block)
+            self._block_at[start] = block
+
+        for block in self.blocks:
+            for i in range(block.start, block.end):
+                tokens, _, size = self.instructions[i]
+                block.size += size
+                block.cost += OPCODE_COSTS.get(tokens[0], 1)
+                if tokens[0] == "callsub":
+                    block.calls.append(tokens[1])
+            if block.start == block.end:
+                continue
+            last = self.instructions[block.end - 1][0]
+            if last[0] in BRANCHES:
+                block.succs.append(self.label_block(last[1]))
+            if last[0] not in TERMINALS and last[0] != "b" and block.end < n:
+                block.succs.append(self._block_at[block.end])
+
+    def label_block(self, label):
+        if label not in self.listing.labels:
+            raise CostAnalysisError("undefined label " + label)
+        return self._block_at[self.listing.labels[label]]
+
+    def _region(self, entry):
+        """Blocks reachable from entry, in DFS preorder, and the back edges among them."""
+        order = []
+        back_edges = []
+        state = {}
+        stack = [(entry, iter(entry.succs))]
+        state[entry.index] = 1
+        order.append(entry)
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if state.get(succ.index) == 1:
+                    back_edges.append((block, succ))
+                elif succ.index not in state:
+                    state[succ.index] = 1
+                    order.append(succ)
+                    stack.append((succ, iter(succ.succs)))
+                    break
+            else:
+                state[block.index] = 2
+                stack.pop()
+        return order, back_edges
+
+    def _loop_bound(self, header):
+        names = [tokens for tokens, _, _ in self.instructions[header.start:header.end]]
+        if any(t[0] == "global" and t[1] == "GroupSize" for t in names):
+            return GROUP_SIZE_BOUND, "group_size"
+        if any(t[0] == "len" for t in names):
+            return self.name_length_bound, "name_length"
+        return self.default_loop_bound, "assumed"
+
+    def _block_cost(self, block):
+        cost = block.cost
+        for label in block.calls:
+            cost += self.subroutine_cost(label)
+        return cost
+
+    def _longest_from(self, entry):
+        """Worst-case cost from entry to any exit, loops unrolled to their bound."""
+        order, back_edges = self._region(entry)
+        back = set((u.index, h.index) for u, h in back_edges)
+
+        def dag_succs(block):
+            return [s for s in block.succs if (block.index, s.index) not in back]
+
+        weight = dict((b.index, self._block_cost(b)) for b in order)
+
+        # Natural loops, merged per header, innermost (smallest) first
+        loops = {}
+        for latch, header in back_edges:
+            body = loops.setdefault(header.index, ({header.index}, set()))
+            body[1].add(latch.index)
+            stack = [latch]
+            while stack:
+                block = stack.pop()
+                if block.index in body[0]:
+                    continue
+                body[0].add(block.index)
+                for pred in order:
+                    if block in pred.succs and (pred.index, block.index) not in back:
+                        stack.append(pred)
+        by_index = dict((b.index, b) for b in order)
+        for header_index, (body, latches) in sorted(loops.items(), key=lambda item: len(item[1][0])):
+            header = by_index[header_index]
+            memo = {}
+
+            def to_latch(block):
+                # Longest path from block to any latch within the loop body
+                if block.index in memo:
+                    return memo[block.index]
+                best = weight[block.index] if block.index in latches else None
+                for succ in dag_succs(block):
+                    if succ.index not in body:
+                        continue
+                    rest = to_latch(succ)
+                    if rest is not None:
+                        candidate = weight[block.index] + rest
+                        best = candidate if best is None or candidate > best else best
+                memo[block.index] = best
+                return best
+
+            iteration = to_latch(header) or 0
+            bound, source = self._loop_bound(header)
+            weight[header_index] += bound * iteration
+            self.loops[header_index] = {
+                "label": self._label_of(header),
+                "bound": bound,
+                "bound_source": source,
+                "iteration_cost": iteration,
+            }
+
+        memo = {}
+
+        def longest(block):
+            if block.index in memo:
+                return memo[block.index]
+            tail = max([longest(s) for s in dag_succs(block)] or [0])
+            memo[block.index] = weight[block.index] + tail
+            return memo[block.index]
+
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * len(self.blocks) + 1000))
+        return longest(entry), order, weight, dag_succs
+
+    def _label_of(self, block):
+        for label, index in self.listing.labels.items():
+            if index == block.start:
+                return label
+        return "@{}".format(block.start)
+
+    def subroutine_cost(self, label):
+        if label in self._sub_costs:
+            return self._sub_costs[label]
+        if label in self._sub_stack:
+            raise CostAnalysisError("recursive subroutine " + label)
+        self._sub_stack.append(label)
+        cost = self._longest_from(self.label_block(label))[0]
+        self._sub_stack.pop()
+        self._sub_costs[label] = cost
+        return cost
+
+    def reachable_size(self, entry):
+        """Bytes of code reachable from entry, including called subroutines."""
+        seen = set()
+        stack = [entry]
+        size = 0
+        while stack:
+            block = stack.pop()
+            if block.index in seen:
+                continue
+            seen.add(block.index)
+            size += block.size
+            stack.extend(block.succs)
+            stack.extend(self.label_block(label) for label in block.calls)
+        return size
+
+    def _operand_name(self, tokens):
+        if tokens[:3] == ["txna", "ApplicationArgs", "0"] or tokens[:3] == ["txn", "ApplicationArgs", "0"]:
+            return "selector"
+        if tokens[:2] == ["txn", "OnCompletion"]:
+            return "on_completion"
+        if tokens[:2] == ["txn", "ApplicationID"]:
+            return "application_id"
+        return None
+
+    def _parse_condition(self, block, end):
+        """Parse the ==/|| condition ending before index end, returns (names, start) or None."""
+        if end <= block.start:
+            return None
+        op = self.instructions[end - 1][0]
+        if op[0] == "||":
+            right = self._parse_condition(block, end - 1)
+            if right is None:
+                return None
+            left = self._parse_condition(block, right[1])
+            if left is None:
+                return None
+            return left[0] + right[0], left[1]
+        if op[0] != "==" or end - 3 < block.start:
+            return None
+        a = self.instructions[end - 3][0]
+        b = self.instructions[end - 2][0]
+        for subject, value in ((a, b), (b, a)):
+            kind = self._operand_name(subject)
+            if kind is None or len(value) != 2:
+                continue
+            if kind == "selector" and value[0] in ("byte", "method", "pushbytes"):
+                literal = value[1]
+                literal = literal.strip('"') if literal.startswith('"') else literal
+                return [self.method_names.get(literal, literal)], end - 3
+            if kind == "on_completion" and value[0] in ("int", "pushint"):
+                return [value[1]], end - 3
+            if kind == "application_id" and value[0] in ("int", "pushint") and value[1] == "0":
+                return ["create"], end - 3
+        return None
+
+    def methods(self):
+        """[(method name, condition block, target block)] in dispatch order."""
+        entry = self.blocks[0]
+        found = []
+        for block in self._region(entry)[0]:
+            if block.start == block.end:
+                continue
+            last = self.instructions[block.end - 1][0]
+            if last[0] != "bnz":
+                continue
+            parsed = self._parse_condition(block, block.end - 1)
+            if parsed is None:
+                continue
+            found.append(("/".join(parsed[0]), block, self.label_block(last[1])))
+        return found
+
+    def report(self):
+        entry = self.blocks[0]
+        header_ops = self.listing.header_ops
+        total, order, weight, dag_succs = self._longest_from(entry)
+
+        # Longest path from entry to the end of each block, for dispatch cost
+        to_block = {entry.index: weight[entry.index]}
+        indegree = dict((b.index, 0) for b in order)
+        for block in order:
+            for succ in dag_succs(block):
+                indegree[succ.index] += 1
+        ready = [entry]
+        while ready:
+            block = ready.pop()
+            for succ in dag_succs(block):
+                candidate = to_block[block.index] + weight[succ.index]
+                if candidate > to_block.get(succ.index, -1):
+                    to_block[succ.index] = candidate
+                indegree[succ.index] -= 1
+                if indegree[succ.index] == 0:
+                    ready.append(succ)
+
+        methods = {}
+        for name, cond_block, target in self.methods():
+            body = self._longest_from(target)[0]
+            cost = header_ops + to_block[cond_block.index] + body
+            methods[name] = {
+                "cost": cost,
+                "dispatch_cost": header_ops + to_block[cond_block.index],
+                "bytes": self.reachable_size(target),
+                "over_budget": cost > self.budget,
+            }
+
+        return {
+            "version": self.listing.version,
+            "size": len(self.listing.program),
+            "budget": self.budget,
+            "cost": header_ops + total,
+            "over_budget": header_ops + total > self.budget,
+            "methods": methods,
+            "subroutines": dict(sorted(self._sub_costs.items())),
+            "loops": [loop for _, loop in sorted(self.loops.items())],
+        }
+
+
+def analyze(teal, budget=APPLICATION_BUDGET, default_loop_bound=DEFAULT_LOOP_BOUND,
+            name_length_bound=NAME_LENGTH_BOUND, method_names=None):
+    """Return the JSON-ready cost report for one TEAL program."""
+    return ProgramAnalysis(teal, budget, default_loop_bound, name_length_bound, method_names).report()
+
+
+def analyze_targets(targets, cache=None):
+    """Cost report for build targets as produced by contracts.build.build_targets."""
+    from pyteal import Mode
+    from .build import build_teal
+    from .methods import DAO_METHODS, REGISTRY_METHODS, selector_names
+    method_names = selector_names(REGISTRY_METHODS)
+    method_names.update(selector_names(DAO_METHODS))
+    reports = {}
+    for (artifact_name, _, _, mode, _), teal in zip(targets, build_teal(targets, cache=cache)):
+        budget = LOGIC_SIG_BUDGET if mode == Mode.Signature else APPLICATION_BUDGET
+        reports[artifact_name] = analyze(teal, budget, method_names=method_names)
+    return reports
+
+
+def compare(before, after):
+    """Per-method cost lines for two reports from analyze_targets, changed methods only."""
+    lines = []
+    for artifact_name in sorted(set(before) | set(after)):
+        old = before.get(artifact_name, {}).get("methods", {})
+        new = after.get(artifact_name, {}).get("methods", {})
+        for method in sorted(set(old) | set(new)):
+            old_cost = old.get(method, {}).get("cost")
+            new_cost = new.get(method, {}).get("cost")
+            if old_cost == new_cost:
+                continue
+            delta = "" if old_cost is None or new_cost is None else "{:+d}".format(new_cost - old_cost)
+            lines.append("{:<32} {:<28} {:>6} -> {:>6} {:>7}".format(
+                artifact_name, method, "-" if old_cost is None else old_cost,
+                "-" if new_cost is None else new_cost, delta))
+    return lines
+
+
+def main(argv=None):
+    import argparse
+    from .build import build_targets, ZERO_ADDRESS
+    parser = argparse.ArgumentParser(prog="python -m contracts.cost_analyzer")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--gov-asa-id", type=int, default=12345678)
+    parser.add_argument("--registry-controller", default=ZERO_ADDRESS)
+    parser.add_argument("--reg-app-id", type=int, default=1)
+    parser.add_argument("--name", action="append", dest="names", default=None,
+                        help="name record LogicSig to analyze, may be repeated")
+    parser.add_argument("--dispatch", default="name", choices=["name", "selector"])
+    parser.add_argument("--compare", metavar="BEFORE_JSON",
+                        help="print per-method cost changes against an earlier report instead")
+    args = parser.parse_args(argv)
+
+    names = args.names if args.names is not None else ["abc"]
+    targets = build_targets(args.gov_asa_id, args.registry_controller, args.reg_app_id, names, args.dispatch)
+    reports = analyze_targets(targets)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            before = json.load(f)
+        for line in compare(before, reports) or ["no method cost changed"]:
+            print(line)
+        return 0
+
+    report = json.dumps(reports, indent=4, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
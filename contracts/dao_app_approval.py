@@ -1,14 +1,19 @@
-from email.parser import BytesParser
-import sys
-from numpy import byte, uint
-
 from pyteal import *
+from .events import DAO_EVENTS, VOTE_CHOICES, LogEvent
+from .methods import DAO_METHODS, DAO_HOT_METHODS, REGISTRY_METHODS, DISPATCH_NAME, method_bytes, dispatch_methods
+from .proposals import (PROPOSAL_ID_BYTES, PROPOSAL_TYPES, MAX_ACTIVE_PROPOSALS, VOTES_TAG, PARAMS_TAG, URL_TAG,
+                        VOTES_RECORD, VOTES_OFFSETS, PARAMS_OFFSETS, APPROVAL_PROGRAM, CLEAR_PROGRAM, PAYOUT,
+                        MAX_PAYOUTS)
 
-def approval_program(ARG_GOV_TOKEN):
+def approval_program(ARG_GOV_TOKEN, dispatch=DISPATCH_NAME, registry_dispatch=None):
     """
     A stateful app with governance rules. Stores
     deposit, min_support, min_duration, max_duration, url.
 
+    dispatch selects how calls to this app are routed and
+    registry_dispatch how the registry it calls was deployed, the same
+    as dispatch unless given, see contracts.methods.
+
     Commands:
         add_proposal            Save proposal record in lsig
         deposit_vote_token      records deposited votes in voter.account
@@ -18,6 +23,7 @@ def approval_program(ARG_GOV_TOKEN):
         clear_vote_record       clears Sender local state by removing a record of vote cast from a not active proposal
         clear_proposal          clears proposal record and returns back the deposit
     """
+    registry_dispatch = registry_dispatch or dispatch
 
     # global DAO parameters
     govtoken_asa_id = Bytes("GOV_TOKEN_ASA_ID")
@@ -27,47 +33,45 @@ def approval_program(ARG_GOV_TOKEN):
     max_duration = App.globalGet(Bytes("max_duration"))
     url = App.globalGet(Bytes("url"))
 
-    # Proposal params
+    # Proposal params, packed records per open proposal, see contracts.proposals
     bytes_proposal_id = Bytes("proposal_id")
-    bytes_proposal_result = Bytes("UNKNOWN") # PASSED, REJECTED
-    bytes_proposal_initiator = Bytes("proposal_initiator") # Acct Addr
-    bytes_proposal_status = Bytes("proposal_status") # Active, Completed
-    bytes_proposal_type = Bytes("proposal_type") # Social/Funding/UpdateReg
-    bytes_voting_start = Bytes("voting_start") # Unix Timestamp
-    bytes_voting_end = Bytes("voting_end") # Unix Timestamp
-    bytes_proposal_url = Bytes("proposal_url") # URI
-    bytes_votecount_yes = Bytes("votecount_yes") # No. of yes
-    bytes_votecount_no = Bytes("votecount_no") # No. of no
-    bytes_votecount_abstain = Bytes("votecount_abstain") # No. of no
-    bytes_proposal_funding_amt_algo = Bytes("proposal_funding_amt_algo")
-    bytes_proposal_funding_amt_ans = Bytes("proposal_funding_amt_asa")
-    bytes_funding_recipient = Bytes("funding_recipient")
-    bytes_reg_app_id_to_update = Bytes("reg_app_id_to_update")
-    bytes_total_coins_voted = Bytes("total_coins_voted")
-    bytes_reg_app_progrm_hash = Bytes("reg_app_progrm_hash") # For ex: 123456
-    bytes_reg_clear_progrm_hash = Bytes("reg_clear_progrm_hash") # For ex: 123456
+    bytes_active_proposals = Bytes("active_proposals")
+    bytes_last_result = Bytes("last_result") # itob(proposal_id) + PASSED/REJECTED
     proposal_id_global = App.globalGet(bytes_proposal_id)
 
-    @Subroutine(TealType.none)
-    def ResetProposalParams():
+    # 8-byte id of the proposal the call operates on and its records
+    current_proposal = ScratchVar(TealType.bytes)
+    votes_record = ScratchVar(TealType.bytes)
+    params_record = ScratchVar(TealType.bytes)
+
+    def record_key(tag):
+        return Concat(current_proposal.load(), Bytes(tag.decode()))
+
+    def vote_field(field):
+        return ExtractUint64(votes_record.load(), Int(VOTES_OFFSETS[field]))
+
+    def param_uint(field):
+        return ExtractUint64(params_record.load(), Int(PARAMS_OFFSETS[field]))
+
+    def param_bytes(field, width=32):
+        return Extract(params_record.load(), Int(PARAMS_OFFSETS[field]), Int(width))
+
+    def proposal_type(kind):
+        return Bytes(bytes([PROPOSAL_TYPES[kind]]))
+
+    # Inlined, both callers are on the hot path
+    def load_proposal(proposal_id):
         return Seq([
-        App.globalPut(bytes_proposal_initiator,Bytes("NONE")),
-        App.globalPut(bytes_proposal_status,Bytes("completed")),
-        App.globalPut(bytes_proposal_type,Bytes("NONE")),
-        App.globalPut(bytes_voting_start,Int(0)),
-        App.globalPut(bytes_voting_end,Int(0)),
-        App.globalPut(bytes_proposal_url,Bytes("NONE")),
-        App.globalPut(bytes_reg_app_progrm_hash,Bytes("NONE")),
-        App.globalPut(bytes_reg_clear_progrm_hash,Bytes("NONE")),
-        App.globalPut(bytes_votecount_yes,Int(0)),
-        App.globalPut(bytes_votecount_no,Int(0)),
-        App.globalPut(bytes_votecount_abstain,Int(0)),
-        App.globalPut(bytes_proposal_funding_amt_algo,Int(0)),
-        App.globalPut(bytes_proposal_funding_amt_ans,Int(0)),
-        App.globalPut(bytes_funding_recipient,Global.zero_address()),
-        App.globalPut(bytes_reg_app_id_to_update,Int(0)),
-        App.globalPut(bytes_total_coins_voted, Int(0))
-    ])
+            current_proposal.store(proposal_id),
+            Assert(Len(current_proposal.load()) == Int(PROPOSAL_ID_BYTES)),
+            record := App.globalGetEx(Int(0), record_key(VOTES_TAG)),
+            Assert(record.hasValue()),
+            votes_record.store(record.value())
+        ])
+
+    @Subroutine(TealType.none)
+    def DeleteProposal():
+        return Seq([App.globalDel(record_key(tag)) for tag in (VOTES_TAG, PARAMS_TAG, URL_TAG)])
 
     # initialization
     # Expected arguments:
@@ -87,7 +91,7 @@ def approval_program(ARG_GOV_TOKEN):
         App.globalPut(Bytes("max_duration"), Btoi(Txn.application_args[3])),
         App.globalPut(Bytes("url"), Txn.application_args[4]),
         App.globalPut(govtoken_asa_id, Txn.assets[0]), 
-        ResetProposalParams(),
+        App.globalPut(bytes_active_proposals, Int(0)),
         App.globalPut(bytes_proposal_id,Int(31420)),
         Return(Int(1))
     ])
@@ -112,6 +116,8 @@ def approval_program(ARG_GOV_TOKEN):
     balance_dao_treasury = ScratchVar(TealType.uint64)
     max_funding_amt_algos = ScratchVar(TealType.uint64)
     max_funding_amt_ans = ScratchVar(TealType.uint64)
+    funding_total_algo = ScratchVar(TealType.uint64)
+    funding_total_ans = ScratchVar(TealType.uint64)
     acct_balance_asa = ScratchVar(TealType.uint64)
 
     @Subroutine(TealType.none)
@@ -138,28 +144,6 @@ def approval_program(ARG_GOV_TOKEN):
             balance_dao_treasury.store(balance.value()))
         )               
     
-    @Subroutine(TealType.none)
-    def store_voters_token_balance(addr_sender, asaid) :
-        return Seq(
-            balance := AssetHolding.balance(addr_sender, asaid),
-            If(balance.hasValue())
-            .Then(
-                acct_balance_asa.store(balance.value())
-            ).Else(
-                acct_balance_asa.store(Int(0))
-            )
-        )
-    
-    users_last_proposal = ScratchVar(TealType.uint64)
-    @Subroutine(TealType.none)
-    def get_users_last_proposal():
-        return Seq([
-            last_proposal := App.localGetEx(Int(0), Int(0), bytes_proposal_id),
-            If(last_proposal.hasValue() == Int(1))
-            .Then( users_last_proposal.store(last_proposal.value()))
-            .Else( users_last_proposal.store(Int(0))),
-        ])
-
     basic_checks_xfer = Seq([
         Assert(
             And(
@@ -172,19 +156,18 @@ def approval_program(ARG_GOV_TOKEN):
 
     # App-args: 
     # Social - [ type Social , duration (no. of days), url ]
-    # Funding - [ type Funding , duration (no. of days), url, amt_algos, amt_ans ];
-    #           foreign-accounts = [<funding_recipient>];
+    # Funding - [ type Funding , duration (no. of days), url, payouts ];
+    #           payouts packed as in contracts.proposals.PAYOUT, 1 to MAX_PAYOUTS entries
+    #           foreign-accounts = [<registry app account>];
     #           foreign-apps = [reg_app_id]
-    # UpdateReg - [ type UpdateReg , duration (no. of days), url, reg_app_id, approval_program ]
+    # UpdateReg - [ type UpdateReg , duration (no. of days), url, reg_app_id, approval_hash, clear_hash ]
+    #             hashes chained over the program chunks, see contracts.proposals
     add_proposal = Seq([
         # TODO: Uncomment below once vars are initiatilized
         Assert(
             And( 
-                App.globalGet(bytes_proposal_status) == Bytes("completed"),
+                App.globalGet(bytes_active_proposals) < Int(MAX_ACTIVE_PROPOSALS),
                 Global.group_size()==Int(2),
-                App.globalGet(bytes_votecount_yes)==Int(0),
-                App.globalGet(bytes_votecount_no)==Int(0),
-                App.globalGet(bytes_votecount_abstain)==Int(0),
                 Btoi(Gtxn[1].application_args[2])<=max_duration,
                 Gtxn[0].type_enum() == TxnType.AssetTransfer,
                 Gtxn[0].asset_receiver() == Global.current_application_address(),
@@ -199,99 +182,171 @@ def approval_program(ARG_GOV_TOKEN):
         # TODO: do basic checks for txns
         #TODO: do basic checks for url input
         App.globalPut(bytes_proposal_id, Add(proposal_id_global,Int(1))),
-        App.globalPut(bytes_proposal_initiator, Gtxn[0].sender()),
-        App.globalPut(bytes_proposal_type, Gtxn[1].application_args[1]),
-        App.globalPut(Bytes("voting_start"), Global.latest_timestamp()),
-        #App.globalPut(Bytes("voting_end"), Add(Global.latest_timestamp(), Mul(Btoi(Gtxn[1].application_args[2]),Int(86400)))),
-        App.globalPut(Bytes("voting_end"), Add(Global.latest_timestamp(), Mul(Btoi(Gtxn[1].application_args[2]),Int(60)))),
-        App.globalPut(bytes_proposal_url, Gtxn[1].application_args[3]),
-        App.globalPut(bytes_proposal_status, Bytes("active")),
-        App.globalPut(bytes_proposal_result, Bytes("UNKNOWN")),
+        App.globalPut(bytes_active_proposals, Add(App.globalGet(bytes_active_proposals), Int(1))),
+        current_proposal.store(Itob(proposal_id_global)),
+        #App.globalPut(record_key(VOTES_TAG), Concat(Itob(Add(Global.latest_timestamp(), Mul(Btoi(Gtxn[1].application_args[2]),Int(86400)))), BytesZero(Int(VOTES_RECORD.size - 8)))),
+        votes_record.store(Concat(
+            Itob(Add(Global.latest_timestamp(), Mul(Btoi(Gtxn[1].application_args[2]),Int(60)))),
+            BytesZero(Int(VOTES_RECORD.size - 8))
+        )),
+        App.globalPut(record_key(VOTES_TAG), votes_record.load()),
+        App.globalPut(record_key(URL_TAG), Gtxn[1].application_args[3]),
         If(Gtxn[1].application_args[1]==Bytes("funding"))
         .Then(
             Seq([ 
                 # TODO: Check maybe value
-                store_balance_reg_treasury(Txn.accounts[2]),
+                store_balance_reg_treasury(Txn.accounts[1]),
                 max_funding_amt_algos.store(Div(balance_reg_treasury.load(),Int(5))),
                 store_balance_dao_treasury(Global.current_application_address()),
                 max_funding_amt_ans.store(Div(balance_dao_treasury.load(),Int(5))),
                 Assert(
                     And(
-                        Btoi(Gtxn[1].application_args[4])>=Int(0),
-                        Btoi(Gtxn[1].application_args[4])<=max_funding_amt_algos.load()
+                        Len(Gtxn[1].application_args[4]) > Int(0),
+                        Len(Gtxn[1].application_args[4]) <= Int(PAYOUT.size * MAX_PAYOUTS),
+                        Len(Gtxn[1].application_args[4]) % Int(PAYOUT.size) == Int(0)
                     )
                 ),
-                App.globalPut(bytes_proposal_funding_amt_algo, Btoi(Gtxn[1].application_args[4])),
+                funding_total_algo.store(Int(0)),
+                funding_total_ans.store(Int(0)),
+                *[
+                    If(Len(Gtxn[1].application_args[4]) > Int(entry * PAYOUT.size)).Then(Seq([
+                        funding_total_algo.store(Add(funding_total_algo.load(),
+                            ExtractUint64(Gtxn[1].application_args[4], Int(entry * PAYOUT.size + 32)))),
+                        funding_total_ans.store(Add(funding_total_ans.load(),
+                            ExtractUint64(Gtxn[1].application_args[4], Int(entry * PAYOUT.size + 40))))
+                    ]))
+                    for entry in range(MAX_PAYOUTS)
+                ],
                 Assert(
                     And(
-                        Btoi(Gtxn[1].application_args[5])>=Int(0),
-                        Btoi(Gtxn[1].application_args[5])<=max_funding_amt_ans.load()
+                        funding_total_algo.load()<=max_funding_amt_algos.load(),
+                        funding_total_ans.load()<=max_funding_amt_ans.load()
                     )
                 ),
-                App.globalPut(bytes_reg_app_id_to_update,Txn.applications[1]),
-                App.globalPut(bytes_proposal_funding_amt_ans, Btoi(Gtxn[1].application_args[5])),
-                App.globalPut(bytes_funding_recipient, Gtxn[1].accounts[1])
+                params_record.store(Concat(
+                    proposal_type("funding"),
+                    Gtxn[0].sender(),
+                    Itob(Txn.applications[1]),
+                    Itob(funding_total_algo.load()),
+                    Itob(funding_total_ans.load()),
+                    Sha512_256(Gtxn[1].application_args[4])
+                ))
         ])
         ).ElseIf(Gtxn[1].application_args[1]==Bytes("updatereg"))
         .Then(
-            Seq( 
-                # TODO: Confirm the app_id is valid within reason
-                App.globalPut(bytes_reg_app_id_to_update, Btoi(Gtxn[1].application_args[4])),
-                App.globalPut(bytes_reg_app_progrm_hash, Sha512_256(Txn.application_args[5])),
-                App.globalPut(bytes_reg_clear_progrm_hash, Sha512_256(Txn.application_args[6]))
-            )
+            # TODO: Confirm the app_id is valid within reason
+            Seq([
+                Assert(
+                    And(
+                        Len(Txn.application_args[5]) == Int(32),
+                        Len(Txn.application_args[6]) == Int(32)
+                    )
+                ),
+                params_record.store(Concat(
+                    proposal_type("updatereg"),
+                    Gtxn[0].sender(),
+                    Itob(Btoi(Gtxn[1].application_args[4])),
+                    Txn.application_args[5],
+                    Txn.application_args[6]
+                ))
+            ])
+        ).Else(
+            params_record.store(Concat(
+                proposal_type("social"),
+                Gtxn[0].sender(),
+                BytesZero(Int(8))
+            ))
         ),
+        App.globalPut(record_key(PARAMS_TAG), params_record.load()),
+        # type and initiator lead the params record, voting_end the votes record
+        LogEvent(DAO_EVENTS, "ProposalAdded", current_proposal.load(),
+                 Extract(params_record.load(), Int(0), Int(PARAMS_OFFSETS["reg_app_id"])),
+                 Extract(votes_record.load(), Int(VOTES_OFFSETS["voting_end"]), Int(8))),
         Return(Int(1))
     ])
 
     bytes_yes = Bytes("yes")
     bytes_no = Bytes("no")
     bytes_abstain = Bytes("abstain")
-    bytes_hasvoted = Bytes("has_voted")
-    bytes_voteresponse = Bytes("vote_response")
 
+    # Votes are recorded in the voter's local state per proposal
     on_register = Seq([
-        App.localPut(Int(0), bytes_proposal_id, Int(0)),
-        App.localPut(Int(0), bytes_voteresponse, Bytes("UNKNOWN")),
-        App.localPut(Int(0), bytes_hasvoted, Bytes("NO")),
         Return(Int(1))
     ])
 
 
     # Register vote:
-    #   apps-args: ["vote", <yes/no/abstain>]
+    #   apps-args: ["vote", <proposal_id>, <yes/no/abstain>]
     #   foreign-assets: [<gov_token_asa_id>]
+    #   Sent alone, or grouped right after the voter's opt-in to this app
+    is_valid_vote_group = If(
+        Global.group_size() == Int(1),
+        Int(1),
+        And(
+            Global.group_size() == Int(2),
+            Txn.group_index() == Int(1),
+            Gtxn[0].type_enum() == TxnType.ApplicationCall,
+            Gtxn[0].application_id() == Global.current_application_id(),
+            Gtxn[0].on_completion() == OnComplete.OptIn,
+            Gtxn[0].sender() == Txn.sender()
+        )
+    )
+
+    # Bumps one vote count and total_coins_voted, the last field, in a single write
+    def count_vote(choice):
+        field = "votecount_" + choice
+        coins_offset = VOTES_OFFSETS["total_coins_voted"]
+        return Seq([
+            App.globalPut(record_key(VOTES_TAG), Concat(
+                Substring(votes_record.load(), Int(0), Int(VOTES_OFFSETS[field])),
+                Itob(Add(vote_field(field), Int(1))),
+                Substring(votes_record.load(), Int(VOTES_OFFSETS[field] + 8), Int(coins_offset)),
+                Itob(Add(vote_field("total_coins_voted"), acct_balance_asa.load()))
+            )),
+            LogEvent(DAO_EVENTS, "VoteCast", current_proposal.load(), Txn.sender(),
+                     Bytes(bytes([VOTE_CHOICES.index(choice)])), Itob(acct_balance_asa.load()))
+        ])
+
     vote = Seq([
-        store_voters_token_balance(Txn.sender(),App.globalGet(govtoken_asa_id)),
-        get_users_last_proposal(),
+        load_proposal(Txn.application_args[1]),
+        # Zero when the sender does not hold the token
+        balance := AssetHolding.balance(Txn.sender(), Txn.assets[0]),
+        acct_balance_asa.store(balance.value()),
+        previous_vote := App.localGetEx(Int(0), Int(0), current_proposal.load()),
+        # Not opted in fails the app_local_put below
         Assert(
             And(
-                App.optedIn(Txn.sender(),App.id()),
-                # voting_start <= now <= voting_end
-                App.globalGet(bytes_voting_start) <= Global.latest_timestamp(),
-                Global.latest_timestamp() <= App.globalGet(bytes_voting_end),
+                is_valid_vote_group,
+                Global.latest_timestamp() <= vote_field("voting_end"),
                 Txn.assets[0]==App.globalGet(govtoken_asa_id),
-                acct_balance_asa.load()>=Int(0),
-                # Sender.deposit >= 0 (i.e user "deposited" his votes using deposit_vote_token)
-                Or(
-                    users_last_proposal.load() == Int(0),
-                    users_last_proposal.load() != proposal_id_global
-                )
+                # One vote per account and proposal
+                Not(previous_vote.hasValue())
             )
         ),
-        If(Txn.application_args[1]==bytes_yes)
+        If(Txn.application_args[2]==bytes_yes)
         .Then(
-            App.globalPut(bytes_votecount_yes, Add(App.globalGet(bytes_votecount_yes),Int(1)))
-        ).ElseIf(Txn.application_args[1]==bytes_no)
+            count_vote("yes")
+        ).ElseIf(Txn.application_args[2]==bytes_no)
         .Then(
-            App.globalPut(bytes_votecount_no, Add(App.globalGet(bytes_votecount_no),Int(1)))
-        ).ElseIf(Txn.application_args[1]==bytes_abstain)
+            count_vote("no")
+        ).ElseIf(Txn.application_args[2]==bytes_abstain)
         .Then(
-            App.globalPut(bytes_votecount_abstain, Add(App.globalGet(bytes_votecount_abstain),Int(1)))
+            count_vote("abstain")
         ).Else(
             Err()
         ),
-        App.globalPut(bytes_total_coins_voted, Add(App.globalGet(bytes_total_coins_voted), acct_balance_asa.load())),
+        App.localPut(Int(0), current_proposal.load(), Txn.application_args[2]),
+        Return(Int(1))
+    ])
+
+    # Clear vote record:
+    #   apps-args: ["clear_vote_record", <proposal_id>]
+    #   Frees the sender's local slot once the proposal has been declared
+    clear_vote_record = Seq([
+        current_proposal.store(Txn.application_args[1]),
+        record := App.globalGetEx(Int(0), record_key(VOTES_TAG)),
+        Assert(Not(record.hasValue())),
+        App.localDel(Int(0), current_proposal.load()),
         Return(Int(1))
     ])
 
@@ -299,97 +354,171 @@ def approval_program(ARG_GOV_TOKEN):
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields({
             TxnField.type_enum: TxnType.AssetTransfer,
-            TxnField.asset_receiver: App.globalGet(bytes_proposal_initiator),
+            TxnField.asset_receiver: param_bytes("initiator"),
             TxnField.asset_amount: App.globalGet(Bytes("deposit")),
             TxnField.xfer_asset: Txn.assets[0]
         }),
         InnerTxnBuilder.Submit()
     ])
 
-    scratchvar_prpsl_funding_amt = ScratchVar(TealType.bytes)
+    # One inner group for a passed funding proposal: the registry's withdraw_funds
+    # paying every algo amount, then an ANS transfer per non-zero ANS amount.
+    # Recipients must be foreign accounts of the declare_result call.
+    payouts = Txn.application_args[2]
 
-    @Subroutine(TealType.none)
-    def get_prpsl_fund_amt():
-        return Seq([
-            scratchvar_prpsl_funding_amt.store(Itob(App.globalGet(bytes_proposal_funding_amt_algo)))
-        ])
+    def payout_recipient(entry):
+        return Extract(payouts, Int(entry * PAYOUT.size), Int(32))
 
-    withdraw_funds_from_name_registry = Seq([
-        #TODO: Assert(Txn.applications[1]==App.globalGet(bytes_reg_app_id_to_update)),
-        get_prpsl_fund_amt(),
+    def payout_amount(entry, offset):
+        return ExtractUint64(payouts, Int(entry * PAYOUT.size + offset))
+
+    pay_out_funding = Seq([
+        Assert(Sha512_256(payouts) == param_bytes("payouts_hash")),
+        Assert(Txn.applications[1] == param_uint("reg_app_id")),
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields({
             TxnField.type_enum: TxnType.ApplicationCall,
             TxnField.application_id: Txn.applications[1],
-            TxnField.accounts: [App.globalGet(bytes_funding_recipient)],
             TxnField.on_completion: OnComplete.NoOp,
-            TxnField.application_args: [ Bytes("withdraw_funds"), scratchvar_prpsl_funding_amt.load()]
+            TxnField.application_args: [method_bytes(REGISTRY_METHODS, "withdraw_funds", registry_dispatch)]
         }),
+        *[
+            If(Len(payouts) > Int(entry * PAYOUT.size)).Then(Seq([
+                InnerTxnBuilder.SetField(TxnField.accounts, [payout_recipient(entry)]),
+                InnerTxnBuilder.SetField(TxnField.application_args, [Extract(payouts, Int(entry * PAYOUT.size + 32), Int(8))])
+            ]))
+            for entry in range(MAX_PAYOUTS)
+        ],
+        *[
+            If(Len(payouts) > Int(entry * PAYOUT.size)).Then(
+                If(payout_amount(entry, 40) > Int(0)).Then(Seq([
+                    InnerTxnBuilder.Next(),
+                    InnerTxnBuilder.SetFields({
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.asset_receiver: payout_recipient(entry),
+                        TxnField.asset_amount: payout_amount(entry, 40),
+                        TxnField.xfer_asset: Txn.assets[0]
+                    })
+                ]))
+            )
+            for entry in range(MAX_PAYOUTS)
+        ],
         InnerTxnBuilder.Submit()
     ])
 
+    # Stage program:
+    #   apps-args: ["stage_program", <a/c>, <chunk>]
+    #   Carries one chunk of the new registry approval (a) or clear (c) program
+    #   to a declare_result later in the same group, nothing is stored
+    declare_result_arg = method_bytes(DAO_METHODS, "declare_result", dispatch)
+    stage_program_arg = method_bytes(DAO_METHODS, "stage_program", dispatch)
+
+    stage_program = Seq([
+        Assert(
+            And(
+                Txn.rekey_to() == Global.zero_address(),
+                Txn.application_args.length() == Int(3),
+                Txn.group_index() < Global.group_size() - Int(1),
+                Gtxn[Global.group_size() - Int(1)].application_id() == Global.current_application_id(),
+                Gtxn[Global.group_size() - Int(1)].application_args[0] == declare_result_arg
+            )
+        ),
+        Return(Int(1))
+    ])
+
+    staged_approval = ScratchVar(TealType.bytes)
+    staged_clear = ScratchVar(TealType.bytes)
+    staged_approval_hash = ScratchVar(TealType.bytes)
+    staged_clear_hash = ScratchVar(TealType.bytes)
+    k = ScratchVar(TealType.uint64)
+
+    # Every transaction ahead of declare_result must be a stage_program call,
+    # chunks are appended and hashed in group order
+    collect_staged_programs = Seq([
+        staged_approval.store(Bytes("")),
+        staged_clear.store(Bytes("")),
+        staged_approval_hash.store(BytesZero(Int(32))),
+        staged_clear_hash.store(BytesZero(Int(32))),
+        For(k.store(Int(0)), k.load() < Txn.group_index(), k.store(k.load() + Int(1))).Do(
+            Seq([
+                Assert(
+                    And(
+                        Gtxn[k.load()].application_id() == Global.current_application_id(),
+                        Gtxn[k.load()].application_args[0] == stage_program_arg
+                    )
+                ),
+                If(Gtxn[k.load()].application_args[1] == Bytes(APPROVAL_PROGRAM.decode()))
+                .Then(
+                    Seq([
+                        staged_approval.store(Concat(staged_approval.load(), Gtxn[k.load()].application_args[2])),
+                        staged_approval_hash.store(Sha512_256(Concat(staged_approval_hash.load(), Gtxn[k.load()].application_args[2])))
+                    ])
+                ).ElseIf(Gtxn[k.load()].application_args[1] == Bytes(CLEAR_PROGRAM.decode()))
+                .Then(
+                    Seq([
+                        staged_clear.store(Concat(staged_clear.load(), Gtxn[k.load()].application_args[2])),
+                        staged_clear_hash.store(Sha512_256(Concat(staged_clear_hash.load(), Gtxn[k.load()].application_args[2])))
+                    ])
+                ).Else(
+                    Err()
+                )
+            ])
+        )
+    ])
 
     update_registry_approval_program = Seq([
-        #TODO: make these assertions work
-        Assert(App.globalGet(bytes_reg_app_progrm_hash) == Sha512_256(Txn.application_args[1])),
-        Assert(App.globalGet(bytes_reg_clear_progrm_hash) == Sha512_256(Txn.application_args[2])),
+        Assert(Txn.applications[1] == param_uint("reg_app_id")),
+        collect_staged_programs,
+        Assert(param_bytes("reg_app_progrm_hash") == staged_approval_hash.load()),
+        Assert(param_bytes("reg_clear_progrm_hash") == staged_clear_hash.load()),
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields({
             TxnField.type_enum: TxnType.ApplicationCall,
             TxnField.application_id: Txn.applications[1],
             TxnField.on_completion: OnComplete.UpdateApplication,
-            TxnField.approval_program: Txn.application_args[1],
-            TxnField.clear_state_program: Txn.application_args[2]
+            TxnField.approval_program: staged_approval.load(),
+            TxnField.clear_state_program: staged_clear.load()
         }),
         InnerTxnBuilder.Submit()
     ])
 
 
-    withdraw_funds_from_dao_treasury = Seq([
-        InnerTxnBuilder.Begin(),
-        InnerTxnBuilder.SetFields({
-            TxnField.type_enum: TxnType.AssetTransfer,
-            TxnField.asset_receiver: App.globalGet(bytes_proposal_initiator),
-            TxnField.asset_amount: App.globalGet(bytes_proposal_funding_amt_ans),
-            TxnField.xfer_asset: Txn.assets[0]
-        }),
-        InnerTxnBuilder.Submit()
-    ])
-
-    @Subroutine(TealType.uint64)
-    def DidVotePass():
-        return And(
-            App.globalGet(bytes_votecount_yes)>App.globalGet(bytes_votecount_no),
-            App.globalGet(bytes_votecount_yes)>App.globalGet(bytes_votecount_abstain),
-            App.globalGet(bytes_total_coins_voted) >= App.globalGet(Bytes("min_support"))
-        )
+    DidVotePass = And(
+        vote_field("votecount_yes")>vote_field("votecount_no"),
+        vote_field("votecount_yes")>vote_field("votecount_abstain"),
+        vote_field("total_coins_voted") >= App.globalGet(Bytes("min_support"))
+    )
 
+    # Declare result:
+    #   apps-args: ["declare_result", <proposal_id>, <payouts>]
+    #   payouts are the funding proposal's packed entries, empty for other types
+    #   An updatereg proposal takes its programs from stage_program calls ahead
+    #   of it in the group
     declare_result = Seq([
+        load_proposal(Txn.application_args[1]),
+        params_record.store(App.globalGet(record_key(PARAMS_TAG))),
         Assert(
             And(
-                Global.latest_timestamp()>=App.globalGet(bytes_voting_end),
-                App.globalGet(bytes_proposal_status)==Bytes("active"),
+                Global.latest_timestamp()>=vote_field("voting_end"),
                 Txn.assets[0] == App.globalGet(govtoken_asa_id)
                 # TODO: Add any more checks necessary here
             )
         ),
-        If(DidVotePass()).Then(Seq([
-            App.globalPut(bytes_proposal_result, Bytes("PASSED")),
-            If(App.globalGet(bytes_proposal_type)==Bytes("funding"))
-            .Then(Seq([
-                    withdraw_funds_from_name_registry,
-                    withdraw_funds_from_dao_treasury
-            ])
-            ).ElseIf(App.globalGet(bytes_proposal_type)==Bytes("updatereg"))
+        If(DidVotePass).Then(Seq([
+            App.globalPut(bytes_last_result, Concat(current_proposal.load(), Bytes("PASSED"))),
+            LogEvent(DAO_EVENTS, "ResultDeclared", current_proposal.load(), Bytes(bytes([1])), votes_record.load()),
+            If(param_bytes("type", 1)==proposal_type("funding"))
+            .Then(pay_out_funding).ElseIf(param_bytes("type", 1)==proposal_type("updatereg"))
             .Then(update_registry_approval_program)
             ])
         ).Else(Seq([
-            App.globalPut(bytes_proposal_result, Bytes("REJECTED")),
-            
+            App.globalPut(bytes_last_result, Concat(current_proposal.load(), Bytes("REJECTED"))),
+            LogEvent(DAO_EVENTS, "ResultDeclared", current_proposal.load(), Bytes(bytes([0])), votes_record.load()),
         ])
         ),
         return_deposit,
-        ResetProposalParams(),
+        DeleteProposal(),
+        App.globalPut(bytes_active_proposals, Minus(App.globalGet(bytes_active_proposals), Int(1))),
         Return(Int(1))
     ])
 
@@ -401,6 +530,15 @@ def approval_program(ARG_GOV_TOKEN):
     program = Cond(
         # Verfies that the application_id is 0, jumps to on_initialize.
         [Txn.application_id() == Int(0), on_initialize],
+        # Method calls, the common case, are routed before the other OnCompletions.
+        [Txn.on_completion() == OnComplete.NoOp, dispatch_methods(DAO_METHODS, {
+            "register_vote": vote,
+            "add_proposal": add_proposal,
+            "declare_result": declare_result,
+            "clear_vote_record": clear_vote_record,
+            "stage_program": stage_program,
+            "opt_in_to_gov_token": opt_in_to_gov_token,
+        }, dispatch, DAO_HOT_METHODS)],
         # Verifies Update or delete transaction, rejects it.
         [
             Or(
@@ -417,15 +555,7 @@ def approval_program(ARG_GOV_TOKEN):
             handle_closeout_or_optin
         ],
         [Txn.on_completion() == OnComplete.OptIn, on_register],
-        [Txn.application_args[0] == Bytes("opt_in_to_gov_token"), opt_in_to_gov_token],
-        [Txn.application_args[0] == Bytes("add_proposal"), add_proposal],
-        [Txn.application_args[0] == Bytes("register_vote"), vote],
-        [Txn.application_args[0] == Bytes("declare_result"), declare_result],
     )
 
     return program
 
-with open('contract_approval.teal', 'w') as f:
-    compiled = compileTeal(approval_program(12345678), Mode.Application, version=6)
-    f.write(compiled)
-
@@ -22,30 +22,54 @@ SOFTWARE.
 
 from pyteal import *
 from . import constants
-
-def ValidateRecord(name, reg_app_id, reg_escrow_acct):
+from .methods import REGISTRY_METHODS, DISPATCH_NAME, method_bytes
+
+# Charset check strategies. CHARSET_CHECK_RANGE is the original per-byte
+# range comparison and stays the default, the LogicSig bytecode (and so
+# every name's escrow address) depends on it for registries deployed
+# with it. CHARSET_CHECK_BITMASK is cheaper, for new registries only.
+CHARSET_CHECK_BITMASK = "bitmask"
+CHARSET_CHECK_RANGE = "range"
+CHARSET_CHECKS = (CHARSET_CHECK_RANGE, CHARSET_CHECK_BITMASK)
+
+def charset_bitmask():
+    # 128-bit table, bit c (leftmost first, as getbit reads byte-arrays) set for valid c
+    mask = bytearray(16)
+    for c in list(range(constants.ASCII_LOWER_CASE_A, constants.ASCII_LOWER_CASE_Z + 1)) + \
+            list(range(constants.ASCII_DIGIT_0, constants.ASCII_DIGIT_9 + 1)):
+        mask[c // 8] |= 0x80 >> (c % 8)
+    return bytes(mask)
+
+def ValidateRecord(name, reg_app_id, reg_escrow_acct, charset_check=CHARSET_CHECK_RANGE, dispatch=DISPATCH_NAME):
 
     DOT_ALGO_APP_ID = reg_app_id
     DOT_ALGO_ESCROW_ADDRESS = reg_escrow_acct
     
     i = ScratchVar(TealType.uint64)
 
+    if charset_check == CHARSET_CHECK_BITMASK:
+        # One byte load and one table lookup per character, getbit fails
+        # the program outright for bytes >= 128
+        is_valid_char = GetBit(Bytes(charset_bitmask()), GetByte(Bytes(name), i.load()))
+    elif charset_check == CHARSET_CHECK_RANGE:
+        is_valid_char = Or(
+            And(
+                GetByte(Bytes(name), i.load()) >= Int(constants.ASCII_LOWER_CASE_A),
+                GetByte(Bytes(name), i.load()) <= Int(constants.ASCII_LOWER_CASE_Z)
+            ),
+            And(
+                GetByte(Bytes(name), i.load()) >= Int(constants.ASCII_DIGIT_0),
+                GetByte(Bytes(name), i.load()) <= Int(constants.ASCII_DIGIT_9)
+            )
+        )
+    else:
+        raise ValueError("unknown charset check: {}".format(charset_check))
+
     is_valid_txn = Seq([
 
         Assert(Len(Bytes(name)) <= Int(64)),
         For(i.store(Int(0)), i.load() < Len(Bytes(name)), i.store(i.load() + Int(1))).Do(
-            Assert(
-                Or(
-                    And(
-                        GetByte(Bytes(name), i.load()) >= Int(constants.ASCII_LOWER_CASE_A),
-                        GetByte(Bytes(name), i.load()) <= Int(constants.ASCII_LOWER_CASE_Z)
-                    ),
-                    And(
-                        GetByte(Bytes(name), i.load()) >= Int(constants.ASCII_DIGIT_0),
-                        GetByte(Bytes(name), i.load()) <= Int(constants.ASCII_DIGIT_9)
-                    )
-                )
-            )
+            Assert(is_valid_char)
         ),
         
         Assert(
@@ -64,7 +88,7 @@ def ValidateRecord(name, reg_app_id, reg_escrow_acct):
                 And(
 
                     Gtxn[1].application_id() == Int(DOT_ALGO_APP_ID),
-                    Gtxn[1].application_args[0] == Bytes("register_name"),
+                    Gtxn[1].application_args[0] == method_bytes(REGISTRY_METHODS, "register_name", dispatch),
                     Gtxn[1].application_args[1] == Bytes(name)
                 )
             )
@@ -78,7 +102,7 @@ def ValidateRecord(name, reg_app_id, reg_escrow_acct):
                     Gtxn[2].on_completion() == OnComplete.OptIn,
                     Gtxn[3].application_id() == Int(DOT_ALGO_APP_ID),
                     Gtxn[3].sender() == Gtxn[0].sender(),
-                    Gtxn[3].application_args[0] == Bytes("register_name"),
+                    Gtxn[3].application_args[0] == method_bytes(REGISTRY_METHODS, "register_name", dispatch),
                     Gtxn[3].application_args[1] == Bytes(name)
                 )
             )
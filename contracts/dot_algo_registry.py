@@ -20,19 +20,117 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
+from collections import namedtuple
+
 from pyteal import *
 from . import constants
+from .events import REGISTRY_EVENTS, LogEvent
+from .methods import REGISTRY_METHODS, REGISTRY_HOT_METHODS, DISPATCH_NAME, method_bytes, dispatch_methods
+from .name_records import RECORD, RECORD_KEY, RECORD_OFFSETS, SOCIAL_KEYS, RESERVED_KEYS, LEGACY_KEYS
+from .packed import ReplaceField, ReplaceUint64
+
+# Expected shape of one transaction in a method's group. None leaves the
+# field unchecked, close_remainder asserts CloseRemainderTo is zero.
+TxnShape = namedtuple("TxnShape", ["app_args", "accounts", "close_remainder"])
+TxnShape.__new__.__defaults__ = (None, None, False)
+
+# Accepted group layouts per method, one TxnShape per group index
+GROUP_SHAPES = {
+    "register_name": [
+        (TxnShape(close_remainder=True), TxnShape(app_args=3, accounts=1)),
+        (
+            TxnShape(close_remainder=True),
+            TxnShape(close_remainder=True),
+            TxnShape(accounts=0),
+            TxnShape(app_args=3, accounts=1)
+        ),
+    ],
+    "renew_name": [
+        (TxnShape(close_remainder=True), TxnShape(app_args=2, accounts=1)),
+    ],
+    "update_properties": [
+        (TxnShape(accounts=1),),
+    ],
+    "initiate_transfer": [
+        (TxnShape(app_args=2, accounts=2),),
+    ],
+    "migrate_record": [
+        (TxnShape(app_args=1, accounts=1),),
+    ],
+    "accept_transfer": [
+        (
+            TxnShape(close_remainder=True),
+            TxnShape(close_remainder=True),
+            TxnShape(app_args=1, accounts=1)
+        ),
+    ],
+}
+
+# Scratch slot holding a batch renewal's running total, read by the next
+# renew_name call in the group
+RENEWAL_TOTAL_SLOT = 255
+
+def txn_checks(index, shape):
+    txn = Gtxn[index]
+    checks = [
+        txn.rekey_to() == Global.zero_address(),
+        Not(BitwiseOr(txn.applications.length(), txn.assets.length()))
+    ]
+    if shape.close_remainder:
+        checks.append(txn.close_remainder_to() == Global.zero_address())
+    if shape.app_args is not None:
+        checks.append(txn.application_args.length() == Int(shape.app_args))
+    if shape.accounts is not None:
+        checks.append(txn.accounts.length() == Int(shape.accounts))
+    return checks
+
+def is_valid_group(method):
+    """
+    Every per-transaction invariant of a method's group in one unrolled
+    pass, selected by group size from GROUP_SHAPES.
+    """
+    program = Int(0)
+    for shapes in reversed(GROUP_SHAPES[method]):
+        checks = []
+        for index, shape in enumerate(shapes):
+            checks.extend(txn_checks(index, shape))
+        if len(GROUP_SHAPES[method]) == 1:
+            return And(Global.group_size() == Int(len(shapes)), *checks)
+        program = If(Global.group_size() == Int(len(shapes)), And(*checks), program)
+    return program
+
+def approval_program(registry_controller: str, dispatch=DISPATCH_NAME):
 
-def approval_program(registry_controller: str):
+    register_name_arg = method_bytes(REGISTRY_METHODS, "register_name", dispatch)
+    renew_name_arg = method_bytes(REGISTRY_METHODS, "renew_name", dispatch)
 
     get_arg_1 = Txn.application_args[1]
     get_arg_2 = Txn.application_args[2]
     
     number_of_years = Minus(Btoi(get_arg_2), Int(1))
 
-    get_name_status = App.localGetEx(Int(1), Txn.application_id(), Bytes("owner"))
-    is_name_owner = App.localGet(Int(1), Bytes("owner"))
-    current_expiry = App.localGet(Int(1), Bytes("expiry"))
+    # Packed core fields of the name, see contracts.name_records
+    record_key = Bytes(RECORD_KEY.decode())
+    name_record = ScratchVar(TealType.bytes)
+    load_record = name_record.store(App.localGet(Int(1), record_key))
+
+    def record_bytes(field):
+        return Extract(name_record.load(), Int(RECORD_OFFSETS[field]), Int(32))
+
+    def record_uint(field):
+        return ExtractUint64(name_record.load(), Int(RECORD_OFFSETS[field]))
+
+    def put_record(value):
+        return App.localPut(Int(1), record_key, value)
+
+    @Subroutine(TealType.uint64)
+    def is_reserved_key(key):
+        return Or(*[key == Bytes(reserved.decode()) for reserved in RESERVED_KEYS])
+
+    get_name_status = App.localGetEx(Int(1), Txn.application_id(), record_key)
+    legacy_owner = App.localGetEx(Int(1), Txn.application_id(), Bytes("owner"))
+    is_name_owner = record_bytes("owner")
+    current_expiry = record_uint("expiry")
     domain_name = App.localGet(Int(1), Bytes("name"))
 
     new_expiry = Add(current_expiry, Mul(Btoi(get_arg_1), Int(constants.RENEWAL_TIME)))
@@ -64,40 +162,9 @@ def approval_program(registry_controller: str):
             Return(Int(1))
         ])
 
-    @Subroutine(TealType.uint64)
-    def check_closeremndr(index):
-        return Seq([
-            Assert(Gtxn[index].close_remainder_to() == Global.zero_address()),
-            Return(Int(1))
-        ])
-
-    @Subroutine(TealType.uint64)
-    def check_app_args_size(txn_index, size):
-        return Seq([
-            Assert(Gtxn[txn_index].application_args.length() == size),
-            Return(Int(1))
-        ])
-
-    @Subroutine(TealType.uint64)
-    def check_app_accts_size(txn_index, size):
-        return Seq([
-            Assert(Gtxn[txn_index].accounts.length() == size),
-            Return(Int(1))
-        ])        
-
-                
-        
     is_valid_registration_txn = Seq([
         
-        Assert(check_closeremndr(Int(0)) == Int(1)),
-        Assert(basic_txn_checks() == Int(1)),
-        
-        Assert(
-            Or(
-                Global.group_size() == Int(2),
-                Global.group_size() == Int(4)
-            )
-        ),
+        Assert(is_valid_group("register_name")),
         
         Assert(Gtxn[0].sender() == Gtxn[1].sender()),
         Assert(Gtxn[0].receiver() == Global.current_application_address()),
@@ -106,43 +173,29 @@ def approval_program(registry_controller: str):
         .Then(
             Assert(
                 And(
-                    check_app_accts_size(Int(1), Int(1)),
-                    check_app_args_size(Int(1), Int(3)) == Int(1),
                     Gtxn[1].application_id() == Global.current_application_id(),
-                    Gtxn[1].sender() == Gtxn[0].sender(),
-                    Gtxn[1].application_args[0] == Bytes("register_name")
+                    Gtxn[1].application_args[0] == register_name_arg
                 )
             )
-        ).ElseIf(Global.group_size() == Int(4))
-        .Then(
+        ).Else(
             Assert(
                 And(
-                    check_app_accts_size(Int(2), Int(0)),
-                    check_app_accts_size(Int(3), Int(1)),
-                    check_closeremndr(Int(1)) == Int(1),
-                    check_app_args_size(Int(3), Int(3)) == Int(1),
                     Gtxn[1].receiver() == Gtxn[2].sender(),
                     Gtxn[2].application_id() == Global.current_application_id(),
                     Gtxn[2].on_completion() == OnComplete.OptIn,
                     Gtxn[3].application_id() == Global.current_application_id(),
                     Gtxn[3].sender() == Gtxn[0].sender(),
-                    Gtxn[3].application_args[0] == Bytes("register_name")
+                    Gtxn[3].application_args[0] == register_name_arg
                     
                 )
             )
-        ).Else(
-            Return(Int(0))
         ),
         
         Int(1)     
     ])
     
     is_valid_renewal_txn = And(
-        basic_txn_checks() == Int(1),
-        check_app_args_size(Int(1), Int(2)) == Int(1),
-        check_app_accts_size(Int(1), Int(1)) == Int(1),
-        check_closeremndr(Int(0)) == Int(1),
-        Global.group_size() == Int(2),
+        is_valid_group("renew_name"),
         Gtxn[0].type_enum() == TxnType.Payment,
         Gtxn[0].sender() == is_name_owner,
         Gtxn[0].receiver() == Global.current_application_address(),
@@ -152,23 +205,19 @@ def approval_program(registry_controller: str):
     is_valid_delete_prop_txn = And(
         basic_txn_checks() == Int(1),
         Txn.application_args.length() == Int(2),        
-        Txn.application_args[1] != Bytes("name"),
-        Txn.application_args[1] != Bytes("owner"),
-        Txn.application_args[1] != Bytes("expiry"),
-        Txn.application_args[1] != Bytes("transfer_price"),
-        Txn.application_args[1] != Bytes("transfer_to"),
-        Txn.application_args[1] != Bytes("subdomain"),
-        Txn.application_args[1] != Bytes("account")
+        Not(is_reserved_key(Txn.application_args[1]))
     )
 
     register_name = Seq([
 
         Assert(is_valid_registration_txn),
         get_name_status,        
+        # A name without a record is free unless it still has unmigrated fields
         Assert(
-            Or(
-                get_name_status.hasValue() == Int(0),
-                Global.latest_timestamp() >= current_expiry
+            If(
+                get_name_status.hasValue(),
+                Global.latest_timestamp() >= ExtractUint64(get_name_status.value(), Int(RECORD_OFFSETS["expiry"])),
+                Seq(legacy_owner, Not(legacy_owner.hasValue()))
             )
         ),
 
@@ -190,58 +239,135 @@ def approval_program(registry_controller: str):
             )
         ),
 
-        App.localPut(Int(1), Bytes("owner"), Txn.sender()),
-        App.localPut(Int(1), Bytes("expiry"), Add(Global.latest_timestamp(), Mul(Int(constants.RENEWAL_TIME), Add(number_of_years, Int(1))))),
-        App.localPut(Int(1), Bytes("subdomain"), Int(0)),
-        App.localPut(Int(1), Bytes("transfer_price"), Bytes("")),
-        App.localPut(Int(1), Bytes("transfer_to"), Bytes("")),
-        App.localPut(Int(1), Bytes("account"), Txn.sender()),
+        # owner, account, expiry, then no transfer and subdomain 0
+        name_record.store(Concat(
+            Txn.sender(),
+            Txn.sender(),
+            Itob(Add(Global.latest_timestamp(), Mul(Int(constants.RENEWAL_TIME), Add(number_of_years, Int(1))))),
+            BytesZero(Int(RECORD.size - RECORD_OFFSETS["transfer_price"]))
+        )),
+        put_record(name_record.load()),
         App.localPut(Int(1), Bytes("name"), Txn.application_args[1]),
+        LogEvent(REGISTRY_EVENTS, "NameRegistered", Txn.accounts[1],
+                 Extract(name_record.load(), Int(0), Int(RECORD_OFFSETS["transfer_price"])), Txn.application_args[1]),
         Return(Int(1))
     ])
 
+    renewal_price = ScratchVar(TealType.uint64)
+    renewal_total = ScratchVar(TealType.uint64, RENEWAL_TOTAL_SLOT)
+
+    def is_renewal_call(txn):
+        return And(
+            txn.type_enum() == TxnType.ApplicationCall,
+            txn.application_id() == Global.current_application_id(),
+            txn.on_completion() == OnComplete.NoOp,
+            txn.application_args[0] == renew_name_arg
+        )
+
+    # [payment of the summed price, renew_name, ..., renew_name], one call per
+    # name. Each call adds its price to the previous call's total and the last
+    # one checks the total against the payment.
+    batch_renewal = Seq([
+        Assert(
+            And(
+                Txn.group_index() > Int(0),
+                *txn_checks(Txn.group_index(), GROUP_SHAPES["renew_name"][0][1]),
+                *txn_checks(0, GROUP_SHAPES["renew_name"][0][0]),
+                Gtxn[0].type_enum() == TxnType.Payment,
+                Gtxn[0].sender() == is_name_owner,
+                Gtxn[0].receiver() == Global.current_application_address(),
+                Txn.sender() == Gtxn[0].sender()
+            )
+        ),
+        If(Txn.group_index() == Int(1))
+        .Then(
+            renewal_total.store(renewal_price.load())
+        ).Else(
+            Seq([
+                Assert(is_renewal_call(Gtxn[Txn.group_index() - Int(1)])),
+                renewal_total.store(Add(ImportScratchValue(Txn.group_index() - Int(1), RENEWAL_TOTAL_SLOT), renewal_price.load()))
+            ])
+        ),
+        If(Txn.group_index() == Global.group_size() - Int(1))
+        .Then(
+            Assert(Gtxn[0].amount() == renewal_total.load())
+        ).Else(
+            Assert(is_renewal_call(Gtxn[Txn.group_index() + Int(1)]))
+        )
+    ])
+
     renew_name = Seq([
-        Assert(is_valid_renewal_txn),
+        load_record,
         If(Len(domain_name) == Int(3))
         .Then(
-            Assert(Gtxn[0].amount() == Mul(Btoi(get_arg_1), Int(constants.COST_FOR_3)))
+            renewal_price.store(Mul(Btoi(get_arg_1), Int(constants.COST_FOR_3)))
         ).ElseIf(Len(domain_name) == Int(4))
         .Then(
-            Assert(Gtxn[0].amount() == Mul(Btoi(get_arg_1), Int(constants.COST_FOR_4)))
-        ).ElseIf(Len(domain_name) >= Int(5))
+            renewal_price.store(Mul(Btoi(get_arg_1), Int(constants.COST_FOR_4)))
+        ).Else(
+            renewal_price.store(Mul(Btoi(get_arg_1), Int(constants.COST_FOR_5)))
+        ),
+        If(Global.group_size() == Int(2))
         .Then(
-            Assert(Gtxn[0].amount() == Mul(Btoi(get_arg_1), Int(constants.COST_FOR_5)))
+            Seq([
+                Assert(is_valid_renewal_txn),
+                Assert(Gtxn[0].amount() == renewal_price.load())
+            ])
+        ).Else(
+            batch_renewal
         ),
-        App.localPut(Int(1),Bytes("expiry"), new_expiry),
+        name_record.store(ReplaceUint64(name_record.load(), RECORD.size, RECORD_OFFSETS["expiry"], new_expiry)),
+        put_record(name_record.load()),
+        LogEvent(REGISTRY_EVENTS, "NameRenewed", Txn.accounts[1], Extract(name_record.load(), Int(RECORD_OFFSETS["expiry"]), Int(8))),
         Return(Int(1))
     ])
-    
+
     update_name = Seq([
         Assert(basic_txn_checks() == Int(1)),
         Assert(Txn.application_args.length() == Int(3)),
         Assert(Txn.accounts.length() == Int(1)),                
-        Assert(get_arg_1 != Bytes("name")),
-        Assert(get_arg_1 != Bytes("owner")),
-        Assert(get_arg_1 != Bytes("expiry")),
-        Assert(get_arg_1 != Bytes("transfer_price")),
-        Assert(get_arg_1 != Bytes("transfer_to")),
-        Assert(get_arg_1 != Bytes("account")),
+        Assert(Not(is_reserved_key(get_arg_1))),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
         App.localPut(Int(1), get_arg_1, get_arg_2),
+        LogEvent(REGISTRY_EVENTS, "PropertyUpdated", Txn.accounts[1], get_arg_1),
         Return(Int(1))
     ])
 
+    # Sets 1 to 7 properties, apps-args: ["update_properties", key, value, key, value, ...]
+    # Unrolled from the last pair so a call only pays for the pairs it sends
+    set_properties = Return(Int(1))
+    for key_index in reversed(range(1, constants.MAX_APP_ARGS - 1, 2)):
+        set_properties = Seq([
+            Assert(Not(is_reserved_key(Txn.application_args[key_index]))),
+            App.localPut(Int(1), Txn.application_args[key_index], Txn.application_args[key_index + 1]),
+            LogEvent(REGISTRY_EVENTS, "PropertyUpdated", Txn.accounts[1], Txn.application_args[key_index]),
+            set_properties if key_index + 2 >= constants.MAX_APP_ARGS - 1
+            else If(Txn.application_args.length() > Int(key_index + 2), set_properties, Return(Int(1)))
+        ])
+
+    update_properties = Seq([
+        Assert(is_valid_group("update_properties")),
+        Assert(Txn.application_args.length() >= Int(3)),
+        Assert(Txn.application_args.length() % Int(2) == Int(1)),
+        load_record,
+        Assert(is_name_owner == Txn.sender()),
+        set_properties
+    ])
+
     update_resolver_account = Seq([
         Assert(basic_txn_checks() == Int(1)),
         Assert(Global.group_size() == Int(1)),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
         Assert(get_arg_1 == Bytes("account")),
-        App.localPut(Int(1), Bytes("account"), Txn.accounts[2]),
+        put_record(ReplaceField(name_record.load(), RECORD.size, RECORD_OFFSETS["account"], 32, Txn.accounts[2])),
         Return(Int(1))
     ])
 
     set_default_account = Seq([
         Assert(basic_txn_checks() == Int(1)),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
         Assert(Txn.application_args.length() == Int(1)),
         Assert(Txn.accounts.length() == Int(1)),
@@ -251,6 +377,7 @@ def approval_program(registry_controller: str):
 
     remove_property = Seq([
         Assert(is_valid_delete_prop_txn),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
         property_to_delete,
         If(property_to_delete.hasValue(),
@@ -261,66 +388,93 @@ def approval_program(registry_controller: str):
     ])
 
     initiate_transfer = Seq([
-        Assert(basic_txn_checks() == Int(1)),
-        Assert(check_app_args_size(Int(0), Int(2))),
-        Assert(check_app_accts_size(Int(0), Int(2))),
-        Assert(Global.group_size() == Int(1)),
+        Assert(is_valid_group("initiate_transfer")),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
-        App.localPut(Int(1), Bytes("transfer_price"), Btoi(Txn.application_args[1])),
-        App.localPut(Int(1), Bytes("transfer_to"), Txn.accounts[2]),
+        # transfer_price and transfer_to are adjacent
+        put_record(ReplaceField(name_record.load(), RECORD.size, RECORD_OFFSETS["transfer_price"], 40,
+                                Concat(Itob(Btoi(Txn.application_args[1])), Txn.accounts[2]))),
         Return(Int(1))
     ])
 
     withdraw_transfer = Seq([
         Assert(basic_txn_checks() == Int(1)),
+        load_record,
         Assert(is_name_owner == Txn.sender()),
         Assert(Txn.application_args.length() == Int(1)),
         Assert(Txn.accounts.length() == Int(1)),
-        App.localPut(Int(1), Bytes("transfer_price"), Int(0)),
-        App.localPut(Int(1), Bytes("transfer_to"), Bytes("")),
+        put_record(ReplaceField(name_record.load(), RECORD.size, RECORD_OFFSETS["transfer_price"], 40,
+                                BytesZero(Int(40)))),
         Return(Int(1))
     ])
 
     accept_transfer = Seq([
-        Assert(basic_txn_checks() == Int(1)),
-        Assert(check_app_args_size(Int(2), Int(1))),
-        Assert(check_app_accts_size(Int(2), Int(1))),
-        Assert(Global.group_size() == Int(3)),
+        Assert(is_valid_group("accept_transfer")),
+        load_record,
         Assert(Gtxn[0].receiver() == is_name_owner),
-        Assert(Gtxn[0].rekey_to() == Global.zero_address()),
-        Assert(check_closeremndr(Int(0)) == Int(1)),
-        Assert(Gtxn[0].amount() == App.localGet(Int(1), Bytes("transfer_price"))),
-        Assert(Gtxn[0].sender() == App.localGet(Int(1), Bytes("transfer_to"))),
+        Assert(Gtxn[0].amount() == record_uint("transfer_price")),
+        Assert(Gtxn[0].sender() == record_bytes("transfer_to")),
         Assert(Gtxn[0].sender() == Gtxn[1].sender()),
         Assert(Gtxn[0].sender() == Gtxn[2].sender()),
         Assert(Gtxn[1].receiver() == Global.current_application_address()),
         Assert(Gtxn[1].amount() == Int(constants.COST_FOR_TRANSFER)),
-        Assert(Gtxn[1].rekey_to() == Global.zero_address()),
-        Assert(check_closeremndr(Int(1)) == Int(1)),
-        App.localPut(Int(1), Bytes("owner"), Gtxn[0].sender()),
-        App.localPut(Int(1), Bytes("transfer_to"), Bytes("")),
-        App.localPut(Int(1), Bytes("transfer_price"), Int(0)),
-        App.localPut(Int(1), Bytes("discord"), Bytes("")),
-        App.localPut(Int(1), Bytes("github"), Bytes("")),
-        App.localPut(Int(1), Bytes("twitter"), Bytes("")),
-        App.localPut(Int(1), Bytes("reddit"), Bytes("")),
-        App.localPut(Int(1), Bytes("telegram"), Bytes("")),
-        App.localPut(Int(1), Bytes("youtube"), Bytes("")),
-        App.localPut(Int(1), Bytes("subdomain"), Int(0)),
+        # New owner, account and expiry kept, transfer and subdomain cleared
+        put_record(Concat(
+            Gtxn[0].sender(),
+            Extract(name_record.load(), Int(RECORD_OFFSETS["account"]), Int(RECORD_OFFSETS["transfer_price"] - RECORD_OFFSETS["account"])),
+            BytesZero(Int(RECORD.size - RECORD_OFFSETS["transfer_price"]))
+        )),
+        Seq([App.localDel(Int(1), Bytes(social.decode())) for social in SOCIAL_KEYS]),
+        LogEvent(REGISTRY_EVENTS, "NameTransferred", Txn.accounts[1], Gtxn[0].sender(), Itob(Gtxn[0].amount())),
+        Return(Int(1))
+    ])
+
+    # Packs a name's pre-record fields. All of them are read before the
+    # legacy keys are deleted, so a name using every local slot still fits.
+    # The old registry only set transfer_to to an account together with an
+    # int transfer_price, otherwise the price may still be the "" it was
+    # registered with.
+    legacy_transfer_to = App.localGet(Int(1), Bytes("transfer_to"))
+    migrate_record = Seq([
+        Assert(is_valid_group("migrate_record")),
+        get_name_status,
+        Assert(Not(get_name_status.hasValue())),
+        legacy_owner,
+        Assert(legacy_owner.hasValue()),
+        name_record.store(Concat(
+            legacy_owner.value(),
+            App.localGet(Int(1), Bytes("account")),
+            Itob(App.localGet(Int(1), Bytes("expiry"))),
+            If(Len(legacy_transfer_to) == Int(32))
+            .Then(Concat(Itob(App.localGet(Int(1), Bytes("transfer_price"))), legacy_transfer_to))
+            .Else(BytesZero(Int(RECORD_OFFSETS["subdomain"] - RECORD_OFFSETS["transfer_price"]))),
+            Itob(App.localGet(Int(1), Bytes("subdomain")))
+        )),
+        Seq([App.localDel(Int(1), Bytes(key.decode())) for key in LEGACY_KEYS]),
+        put_record(name_record.load()),
         Return(Int(1))
     ])
 
+    # Pays application_args[i] to accounts[i], up to 4 payouts in one inner group
+    def payout(index):
+        return InnerTxnBuilder.SetFields(
+            {
+                TxnField.type_enum: TxnType.Payment,
+                TxnField.receiver: Txn.accounts[index],
+                TxnField.amount: Btoi(Txn.application_args[index]),
+            }
+        )
+
     withdraw_funds = Seq(
         Assert(basic_txn_checks() == Int(1)),
         Assert(Txn.sender() == App.globalGet(Bytes("name_controller"))),
+        Assert(Txn.accounts.length() == Txn.application_args.length() - Int(1)),
         InnerTxnBuilder.Begin(),
-        InnerTxnBuilder.SetFields(
-            {
-                TxnField.type_enum: TxnType.Payment,
-                TxnField.receiver: Txn.accounts[1],
-                TxnField.amount: Btoi(Txn.application_args[1]),
-            }
-        ),
+        payout(1),
+        *[
+            If(Txn.application_args.length() > Int(index), Seq(InnerTxnBuilder.Next(), payout(index)))
+            for index in range(2, constants.MAX_APP_ACCOUNTS + 1)
+        ],
         InnerTxnBuilder.Submit(),
         Return(Int(1))
     )
@@ -340,23 +494,26 @@ def approval_program(registry_controller: str):
 
     program = Cond(
         [Txn.application_id() == Int(0), on_creation],
+        [Txn.on_completion() == OnComplete.NoOp, dispatch_methods(REGISTRY_METHODS, {
+            "register_name": register_name,
+            "renew_name": renew_name,
+            "update_name": update_name,
+            "update_properties": update_properties,
+            "accept_transfer": accept_transfer,
+            "initiate_transfer": initiate_transfer,
+            "withdraw_transfer": withdraw_transfer,
+            "update_resolver_account": update_resolver_account,
+            "set_default_account": set_default_account,
+            "remove_property": remove_property,
+            "migrate_record": migrate_record,
+            "withdraw_funds": withdraw_funds,
+            "update_global_state": update_global_state,
+        }, dispatch, REGISTRY_HOT_METHODS)],
         [Txn.on_completion() == OnComplete.OptIn, Return(Int(1))],
         [Txn.on_completion() == OnComplete.UpdateApplication, update_or_delete_application],
         [Txn.on_completion() == OnComplete.DeleteApplication, update_or_delete_application],
         [Txn.on_completion() == OnComplete.CloseOut, Return(Int(0))],
-        [Txn.on_completion() == OnComplete.ClearState, Return(Int(0))],
-        [Txn.application_args[0] == Bytes("update_global_state"), update_global_state],
-        [Txn.application_args[0] == Bytes("register_name"), register_name],
-        [Txn.application_args[0] == Bytes("update_name"), update_name],
-        [Txn.application_args[0] == Bytes("remove_property"), remove_property],
-        [Txn.application_args[0] == Bytes("renew_name"), renew_name],
-        [Txn.application_args[0] == Bytes("update_resolver_account"), update_resolver_account],
-        [Txn.application_args[0] == Bytes("set_default_account"), set_default_account],
-        [Txn.application_args[0] == Bytes("initiate_transfer"), initiate_transfer],
-        [Txn.application_args[0] == Bytes("accept_transfer"), accept_transfer],
-        [Txn.application_args[0] == Bytes("withdraw_transfer"), withdraw_transfer],
-        [Txn.application_args[0] == Bytes("withdraw_funds"), withdraw_funds]
-        
+        [Txn.on_completion() == OnComplete.ClearState, Return(Int(0))]
     )
 
     return program
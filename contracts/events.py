@@ -0,0 +1,122 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Events logged by the registry and the DAO.
+
+Every event is one log entry: the 4-byte selector of the event's
+signature, the first 4 bytes of sha512_256 over "name(types)" as in
+ARC-28, then its fields big-endian at fixed offsets. A byte[] field is
+only ever last and takes the rest of the entry. Addresses are raw 32
+byte public keys.
+
+Events are appended by the method calls themselves, so a client can
+follow names and proposals from the logs of confirmed transactions
+instead of reading back account and app state.
+"""
+
+import base64
+import hashlib
+import struct
+from collections import namedtuple, OrderedDict
+
+Event = namedtuple("Event", ["name", "fields"])
+
+_FORMATS = {"address": "32s", "uint64": "Q", "uint8": "B"}
+
+# Order of the choice byte of VoteCast
+VOTE_CHOICES = ("yes", "no", "abstain")
+
+REGISTRY_EVENTS = OrderedDict((e.name, e) for e in [
+    # register_name, the new record's leading owner, account and expiry
+    Event("NameRegistered", (("name_account", "address"), ("owner", "address"), ("account", "address"),
+                             ("expiry", "uint64"), ("name", "byte[]"))),
+    Event("NameRenewed", (("name_account", "address"), ("expiry", "uint64"))),
+    Event("NameTransferred", (("name_account", "address"), ("owner", "address"), ("price", "uint64"))),
+    # update_name, and update_properties once per key
+    Event("PropertyUpdated", (("name_account", "address"), ("key", "byte[]"))),
+])
+
+DAO_EVENTS = OrderedDict((e.name, e) for e in [
+    Event("ProposalAdded", (("proposal_id", "uint64"), ("type", "uint8"), ("initiator", "address"),
+                            ("voting_end", "uint64"))),
+    Event("VoteCast", (("proposal_id", "uint64"), ("voter", "address"), ("choice", "uint8"),
+                       ("weight", "uint64"))),
+    # The final votes record, see contracts.proposals
+    Event("ResultDeclared", (("proposal_id", "uint64"), ("passed", "uint8"), ("voting_end", "uint64"),
+                             ("votecount_yes", "uint64"), ("votecount_no", "uint64"),
+                             ("votecount_abstain", "uint64"), ("total_coins_voted", "uint64"))),
+])
+
+
+def event_signature(event):
+    return "{}({})".format(event.name, ",".join(arg_type for _, arg_type in event.fields))
+
+
+def event_selector(event):
+    return hashlib.new('sha512_256', event_signature(event).encode('utf-8')).digest()[:4]
+
+
+def _layout(event):
+    fixed = [(name, arg_type) for name, arg_type in event.fields if arg_type != "byte[]"]
+    tail = [name for name, arg_type in event.fields if arg_type == "byte[]"]
+    return struct.Struct(">" + "".join(_FORMATS[arg_type] for _, arg_type in fixed)), [name for name, _ in fixed], tail
+
+
+_EVENTS = dict(
+    (event_selector(event), (event,) + _layout(event))
+    for events in (REGISTRY_EVENTS, DAO_EVENTS) for event in events.values()
+)
+
+
+def LogEvent(events, name, *values):
+    """PyTeal Log of an event, values are its fields already encoded as bytes."""
+    from pyteal import Bytes, Concat, Log
+    return Log(Concat(Bytes("base16", event_selector(events[name]).hex()), *values))
+
+
+def encode_event(events, event_name, **values):
+    event = events[event_name]
+    record, names, tail = _layout(event)
+    return event_selector(event) + record.pack(*[values[n] for n in names]) + b"".join(values[n] for n in tail)
+
+
+def decode_event(raw):
+    """(name, {field: value}) of a log entry, None if it is not an event."""
+    entry = _EVENTS.get(bytes(raw[:4]))
+    if entry is None:
+        return None
+    event, record, names, tail = entry
+    if len(raw) < 4 + record.size or (not tail and len(raw) != 4 + record.size):
+        return None
+    fields = OrderedDict(zip(names, record.unpack_from(raw, 4)))
+    for name in tail:
+        fields[name] = bytes(raw[4 + record.size:])
+    return event.name, fields
+
+
+def decode_logs(logs):
+    """
+    Events among the base64 log entries of a transaction, as returned in
+    algod's pending transaction info or the indexer's 'logs'.
+    """
+    return [event for event in (decode_event(base64.b64decode(entry)) for entry in logs) if event is not None]
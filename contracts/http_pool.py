@@ -0,0 +1,306 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Keep-alive HTTP connection pooling for the SDK's algod and indexer clients.
+
+The SDK clients open a new connection, and on https a new TLS session,
+for every request. PooledAlgodClient and PooledIndexerClient are drop-in
+subclasses that send their requests over a thread-safe pool of
+persistent connections instead, and algod_client()/indexer_client()
+hand out one shared client per endpoint.
+
+To measure the difference against a local stub server:
+
+    python -m contracts.http_pool --requests 500 [--threads 8]
+"""
+
+import http.client
+import json
+import queue
+import sys
+import threading
+from urllib import parse
+
+from algosdk import constants, error
+from algosdk.v2client import algod, indexer
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30
+API_VERSION_PREFIX = "/v2"
+
+# A reused connection the server already closed fails with one of these
+# before any response arrives, the request is retried once on a new one.
+# Only idempotent requests are: a POST /transactions the server did get
+# would otherwise be submitted twice and its success reported as an error.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+RETRY_METHODS = frozenset(("GET", "HEAD"))
+
+
+class HTTPConnectionPool(object):
+    """
+    Persistent connections to one endpoint. At most pool_size requests
+    run at once across threads, the others wait for a free connection.
+    """
+
+    def __init__(self, address, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        url = parse.urlsplit(address)
+        if url.scheme == "https":
+            self._connection_class = http.client.HTTPSConnection
+        elif url.scheme == "http":
+            self._connection_class = http.client.HTTPConnection
+        else:
+            raise ValueError("unsupported endpoint: {}".format(address))
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        with self._lock:
+            self.connections_opened += 1
+        return self._connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _exchange(self, conn, method, path, headers, body):
+        conn.request(method, self.base_path + path, body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read(), not resp.will_close
+
+    def request(self, method, path, headers=None, body=None):
+        """(status, body) of one request, path is relative to the endpoint's base path."""
+        with self._slots:
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._open(), False
+            try:
+                try:
+                    status, data, keep_alive = self._exchange(conn, method, path, headers or {}, body)
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused or method not in RETRY_METHODS:
+                        raise
+                    conn.close()
+                    conn = self._open()
+                    status, data, keep_alive = self._exchange(conn, method, path, headers or {}, body)
+            except BaseException:
+                conn.close()
+                raise
+            if keep_alive:
+                self._idle.put(conn)
+            else:
+                conn.close()
+            return status, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class IndexerHTTPStatusError(error.IndexerHTTPError):
+    """The SDK's IndexerHTTPError, with the response status as code like AlgodHTTPError."""
+
+    def __init__(self, msg, code=None):
+        super().__init__(msg)
+        self.code = code
+
+
+def _request_path(requrl, params):
+    if requrl not in constants.unversioned_paths:
+        requrl = API_VERSION_PREFIX + requrl
+    if params:
+        requrl = requrl + "?" + parse.urlencode(params)
+    return requrl
+
+
+def _error_message(data):
+    text = data.decode('utf-8', 'replace')
+    try:
+        return json.loads(text)["message"]
+    except (ValueError, KeyError, TypeError):
+        return text
+
+
+class PooledAlgodClient(algod.AlgodClient):
+    """AlgodClient sending its requests over an HTTPConnectionPool."""
+
+    def __init__(self, algod_token, algod_address, headers=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        super().__init__(algod_token, algod_address, headers)
+        self.pool = HTTPConnectionPool(algod_address, pool_size, timeout)
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": "py-algorand-sdk"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth:
+            header[constants.algod_auth_header] = self.algod_token
+
+        status, body = self.pool.request(method, _request_path(requrl, params), header, data)
+        if status >= 400:
+            raise error.AlgodHTTPError(_error_message(body), status)
+        if response_format != "json":
+            return body
+        try:
+            return json.loads(body)
+        except ValueError as err:
+            raise error.AlgodResponseError("Failed to parse JSON response from algod") from err
+
+
+class PooledIndexerClient(indexer.IndexerClient):
+    """IndexerClient sending its requests over an HTTPConnectionPool."""
+
+    def __init__(self, indexer_token, indexer_address, headers=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        super().__init__(indexer_token, indexer_address, headers)
+        self.pool = HTTPConnectionPool(indexer_address, pool_size, timeout)
+
+    def indexer_request(self, method, requrl, params=None, data=None, headers=None):
+        header = {"User-Agent": "py-algorand-sdk"}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth and self.indexer_token:
+            header[constants.indexer_auth_header] = self.indexer_token
+
+        status, body = self.pool.request(method, _request_path(requrl, params), header, data)
+        if status >= 400:
+            raise IndexerHTTPStatusError(_error_message(body), status)
+        return json.loads(body)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared(client_class, token, address, headers, pool_size):
+    key = (client_class, address, token, tuple(sorted((headers or {}).items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = client_class(token, address, headers, pool_size)
+        return client
+
+
+def algod_client(algod_token, algod_address, headers=None, pool_size=DEFAULT_POOL_SIZE):
+    """The PooledAlgodClient shared by every caller of this endpoint and token."""
+    return _shared(PooledAlgodClient, algod_token, algod_address, headers, pool_size)
+
+
+def indexer_client(indexer_token, indexer_address, headers=None, pool_size=DEFAULT_POOL_SIZE):
+    """The PooledIndexerClient shared by every caller of this endpoint and token."""
+    return _shared(PooledIndexerClient, indexer_token, indexer_address, headers, pool_size)
+
+
+def stub_server(delay=0, status=200):
+    """
+    Local algod stand-in answering every GET with a status response,
+    after delay seconds (or delay() seconds when it is callable) and with
+    the given HTTP status. Runs on a daemon thread until shutdown().
+    """
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = json.dumps({"last-round": 1, "time-since-last-round": 0}).encode()
+    if status >= 400:
+        body = json.dumps({"message": "stub error"}).encode()
+
+    class StubAlgod(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            wait = delay() if callable(delay) else delay
+            if wait:
+                time.sleep(wait)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAlgod)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(client, requests, threads):
+    """Per-request latencies in seconds of client.status() from threads threads."""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    def timed(_):
+        start = time.perf_counter()
+        client.status()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+def main(argv=None):
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(prog="python -m contracts.http_pool")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    args = parser.parse_args(argv)
+
+    server = stub_server()
+    address = "http://127.0.0.1:{}".format(server.server_port)
+    clients = [
+        ("sdk", algod.AlgodClient("", address)),
+        ("pooled", PooledAlgodClient("", address, pool_size=args.pool_size)),
+    ]
+    print("{} status calls, {} threads".format(args.requests, args.threads))
+    print("{:8} {:>10} {:>10} {:>10} {:>12}".format("client", "mean ms", "p50 ms", "p99 ms", "connections"))
+    for label, client in clients:
+        client.status()
+        start = time.perf_counter()
+        latencies = sorted(benchmark(client, args.requests, args.threads))
+        elapsed = time.perf_counter() - start
+        connections = client.pool.connections_opened if hasattr(client, "pool") else args.requests + 1
+        print("{:8} {:>10.3f} {:>10.3f} {:>10.3f} {:>12}   {:.0f} req/s".format(
+            label, 1000 * sum(latencies) / len(latencies), 1000 * latencies[len(latencies) // 2],
+            1000 * latencies[int(len(latencies) * 0.99)], connections, args.requests / elapsed))
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
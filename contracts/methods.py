@@ -0,0 +1,193 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Application call methods of the registry and the DAO, shared by the
+contracts and their clients.
+
+An approval program dispatches either on the method name as the first
+application arg (DISPATCH_NAME, what deployed apps and name record
+LogicSigs expect) or on an ARC-4 style 4-byte selector, the first 4
+bytes of sha512_256 over the method signature (DISPATCH_SELECTOR).
+The remaining args are raw, byte[] as-is and uint64 as 8 bytes
+big-endian, so only the routing arg differs between the two.
+"""
+
+import hashlib
+import operator
+from collections import namedtuple, OrderedDict
+
+from .constants import MAX_APP_ARGS, MAX_APP_ACCOUNTS
+
+DISPATCH_NAME = "name"
+DISPATCH_SELECTOR = "selector"
+DISPATCH_MODES = (DISPATCH_NAME, DISPATCH_SELECTOR)
+
+# variants maps the value of the first arg to extra trailing arg types,
+# repeat is the most times args may be given over in a single call
+Method = namedtuple("Method", ["name", "args", "variants", "repeat"])
+Method.__new__.__defaults__ = (None, None)
+
+# Most frequently called first, the approval programs test them in this order
+REGISTRY_METHODS = OrderedDict((m.name, m) for m in [
+    Method("register_name", ("byte[]", "uint64")),
+    Method("renew_name", ("uint64",)),
+    Method("update_name", ("byte[]", "byte[]")),
+    Method("update_properties", ("byte[]", "byte[]"), repeat=(MAX_APP_ARGS - 1) // 2),
+    Method("accept_transfer", ()),
+    Method("initiate_transfer", ("uint64",)),
+    Method("withdraw_transfer", ()),
+    Method("update_resolver_account", ("byte[]",)),
+    Method("set_default_account", ()),
+    Method("remove_property", ("byte[]",)),
+    Method("migrate_record", ()),
+    Method("withdraw_funds", ("uint64",), repeat=MAX_APP_ACCOUNTS),
+    Method("update_global_state", ("byte[]", "byte[]")),
+])
+REGISTRY_HOT_METHODS = ("register_name", "renew_name")
+
+DAO_METHODS = OrderedDict((m.name, m) for m in [
+    Method("register_vote", ("uint64", "byte[]")),
+    Method("add_proposal", ("byte[]", "uint64", "byte[]"), {
+        "social": (),
+        "funding": ("byte[]",),
+        "updatereg": ("uint64", "byte[]", "byte[]"),
+    }),
+    Method("declare_result", ("uint64", "byte[]")),
+    Method("clear_vote_record", ("uint64",)),
+    Method("stage_program", ("byte[]", "byte[]")),
+    Method("opt_in_to_gov_token", ()),
+])
+DAO_HOT_METHODS = ("register_vote",)
+
+
+def signature(method):
+    args = ",".join(method.args)
+    if method.repeat is not None:
+        args = "({})[]".format(args)
+    return "{}({})void".format(method.name, args)
+
+
+def selector(method):
+    return hashlib.new('sha512_256', signature(method).encode('utf-8')).digest()[:4]
+
+
+def method_arg(methods, name, dispatch=DISPATCH_NAME):
+    """The first application arg that routes a call to name."""
+    if dispatch == DISPATCH_NAME:
+        return name.encode('utf-8')
+    if dispatch == DISPATCH_SELECTOR:
+        return selector(methods[name])
+    raise ValueError("unknown dispatch mode: {}".format(dispatch))
+
+
+def method_bytes(methods, name, dispatch=DISPATCH_NAME):
+    """method_arg as a PyTeal Bytes, names stay readable in the TEAL."""
+    from pyteal import Bytes
+    if dispatch == DISPATCH_NAME:
+        return Bytes(name)
+    return Bytes("base16", method_arg(methods, name, dispatch).hex())
+
+
+def selector_names(methods):
+    """{"0x<selector hex>": name}, as selectors appear in TEAL listings."""
+    return dict(("0x" + selector(m).hex(), name) for name, m in methods.items())
+
+
+def encode_arg(arg_type, value):
+    if arg_type == "uint64":
+        try:
+            value = operator.index(value)
+        except TypeError:
+            raise TypeError("uint64 arg must be an integer, got {!r}".format(value))
+        if not 0 <= value < 2 ** 64:
+            raise ValueError("uint64 arg out of range: {}".format(value))
+        return value.to_bytes(8, 'big')
+    if arg_type == "byte[]":
+        if isinstance(value, str):
+            return value.encode('utf-8')
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value)
+        raise TypeError("byte[] arg must be str or bytes, got {!r}".format(value))
+    raise ValueError("unknown arg type: {}".format(arg_type))
+
+
+def encode_call(methods, name, *values, dispatch=DISPATCH_NAME):
+    """Application args for a call to name, checked against its declared types."""
+    method = methods[name]
+    types = method.args
+    if method.variants is not None and values:
+        variant = values[0].decode('utf-8') if isinstance(values[0], bytes) else values[0]
+        if variant not in method.variants:
+            raise ValueError("unknown {} variant: {!r}".format(name, variant))
+        types = types + method.variants[variant]
+    if method.repeat is not None:
+        count, extra = divmod(len(values), len(types))
+        if extra or not 0 < count <= method.repeat:
+            raise TypeError("{} takes 1 to {} groups of {} args, got {} args".format(
+                name, method.repeat, len(types), len(values)))
+        types = types * count
+    if len(values) != len(types):
+        raise TypeError("{} takes {} args, got {}".format(name, len(types), len(values)))
+    return [method_arg(methods, name, dispatch)] + [encode_arg(t, v) for t, v in zip(types, values)]
+
+
+def registry_call(name, *values, dispatch=DISPATCH_NAME):
+    return encode_call(REGISTRY_METHODS, name, *values, dispatch=dispatch)
+
+
+def dao_call(name, *values, dispatch=DISPATCH_NAME):
+    return encode_call(DAO_METHODS, name, *values, dispatch=dispatch)
+
+
+def dispatch_methods(methods, branches, dispatch=DISPATCH_NAME, hot=()):
+    """
+    PyTeal routing of Txn.application_args[0] to branches, {name: expr}.
+
+    By name this is a linear Cond in table order. By selector the hot
+    methods are still tested first, the rest by binary search on the
+    selector value with b<, so no call pays more than a few compares.
+    """
+    from pyteal import BytesLt, Cond, Err, If, Txn
+
+    arg = Txn.application_args[0]
+    names = [name for name in methods if name in branches]
+    if dispatch == DISPATCH_NAME:
+        return Cond(*[[arg == method_bytes(methods, name), branches[name]] for name in names])
+    if dispatch != DISPATCH_SELECTOR:
+        raise ValueError("unknown dispatch mode: {}".format(dispatch))
+
+    def linear(entries, otherwise):
+        for _, name in reversed(entries):
+            otherwise = If(arg == method_bytes(methods, name, dispatch), branches[name], otherwise)
+        return otherwise
+
+    def search(entries):
+        if len(entries) <= 2:
+            return linear(entries, Err())
+        mid = len(entries) // 2
+        pivot = method_bytes(methods, entries[mid][1], dispatch)
+        return If(BytesLt(arg, pivot), search(entries[:mid]), search(entries[mid:]))
+
+    first = [(selector(methods[name]), name) for name in names if name in hot]
+    rest = sorted((selector(methods[name]), name) for name in names if name not in hot)
+    return linear(first, search(rest) if rest else Err())
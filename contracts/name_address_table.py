@@ -0,0 +1,319 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Bulk name -> escrow address derivation and a memory-mapped lookup table.
+
+    python -m contracts.name_address_table --reg-app-id 812342 --out names.tbl \\
+        --lengths 3,4 [--words words.txt] [--processes N] [--algod-address URL --algod-token T]
+
+Table layout (all integers big-endian):
+
+    header   magic "ANSNAMES", format u32, reg_app_id u64, count u64,
+             charset_check u8, dispatch u8 (indexes into CHARSET_CHECKS and
+             DISPATCH_MODES), padded to 64 bytes
+    by name  count x (name padded with NUL to 64 bytes, address 32 bytes), sorted by name
+    by addr  count x (address 32 bytes, u32 index into the by-name section), sorted by address
+"""
+
+import contextlib
+import heapq
+import itertools
+import mmap
+import multiprocessing
+import os
+import string
+import struct
+import sys
+import tempfile
+
+from .dot_algo_name_record import CHARSET_CHECK_RANGE, CHARSET_CHECKS
+from .methods import DISPATCH_NAME, DISPATCH_MODES
+from .name_record_template import NameRecordTemplate, MAX_NAME_LENGTH
+
+MAGIC = b"ANSNAMES"
+TABLE_FORMAT = 2
+HEADER = struct.Struct(">8sIQQBB")
+HEADER_SIZE = 64
+
+NAME_WIDTH = MAX_NAME_LENGTH
+ADDRESS_WIDTH = 32
+NAME_RECORD_SIZE = NAME_WIDTH + ADDRESS_WIDTH
+ADDRESS_RECORD_SIZE = ADDRESS_WIDTH + 4
+
+# Same language ValidateRecord accepts
+NAME_CHARSET = string.ascii_lowercase + string.digits
+
+DEFAULT_CHUNK_SIZE = 20000
+
+
+def charset_names(lengths=(3, 4), charset=NAME_CHARSET):
+    """Yield every name of the given lengths over charset."""
+    for length in lengths:
+        for combo in itertools.product(charset, repeat=length):
+            yield "".join(combo)
+
+
+def _chunks(names, chunk_size):
+    chunk = []
+    for name in names:
+        chunk.append(name)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_worker_template = None
+
+
+def _init_worker(reg_app_id, charset_check=CHARSET_CHECK_RANGE, dispatch=DISPATCH_NAME, algod=None):
+    global _worker_template
+    kwargs = {}
+    if algod is not None:
+        from .build import algod_assembler
+        kwargs["assemble"] = algod_assembler(*algod)
+    _worker_template = NameRecordTemplate(reg_app_id, charset_check=charset_check, dispatch=dispatch, **kwargs)
+
+
+def _derive_chunk(names):
+    """Return one sorted run of packed (padded name, address) records."""
+    records = []
+    for name in names:
+        raw = name.encode('utf-8')
+        if not 0 < len(raw) <= NAME_WIDTH:
+            raise ValueError("name must be 1-{} bytes: {!r}".format(NAME_WIDTH, name))
+        records.append(raw.ljust(NAME_WIDTH, b"\x00") + _worker_template.address_bytes(name))
+    records.sort()
+    return b"".join(records)
+
+
+def derive_runs(names, reg_app_id, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, charset_check=CHARSET_CHECK_RANGE,
+                dispatch=DISPATCH_NAME, algod=None):
+    """
+    Derive addresses for names in a process pool. algod is an optional
+    (address, token) whose compile assembles the name record template,
+    the offline assembler does otherwise.
+
+    Yields sorted runs of packed name records, one per chunk of input.
+    A single chunk, or processes=1, is handled in-process.
+    """
+    chunks = _chunks(names, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    if second is None or processes == 1:
+        _init_worker(reg_app_id, charset_check, dispatch, algod)
+        for chunk in itertools.chain([first], [] if second is None else [second], chunks):
+            yield _derive_chunk(chunk)
+        return
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(reg_app_id, charset_check, dispatch, algod)) as pool:
+        for run in pool.imap_unordered(_derive_chunk, itertools.chain([first, second], chunks)):
+            yield run
+
+
+def _iter_records(f, record_size):
+    while True:
+        record = f.read(record_size)
+        if len(record) < record_size:
+            return
+        yield record
+
+
+def _merge_runs(run_files, record_size):
+    """k-way merge of sorted run files, dropping duplicate records."""
+    previous = None
+    for record in heapq.merge(*[_iter_records(f, record_size) for f in run_files]):
+        if record != previous:
+            yield record
+            previous = record
+
+
+def write_table(path, names, reg_app_id, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, charset_check=CHARSET_CHECK_RANGE,
+                dispatch=DISPATCH_NAME, algod=None):
+    """Derive addresses for names and write the sorted lookup table to path. Returns the entry count."""
+    tmp_dir = os.path.dirname(os.path.abspath(path))
+    run_files = []
+    try:
+        for run in derive_runs(names, reg_app_id, processes, chunk_size, charset_check, dispatch, algod):
+            f = tempfile.TemporaryFile(dir=tmp_dir)
+            f.write(run)
+            f.seek(0)
+            run_files.append(f)
+
+        # By-name section straight from the merge, address runs spill to disk
+        address_runs = []
+        count = 0
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(b"\x00" * HEADER_SIZE)
+            pending = []
+            for record in _merge_runs(run_files, NAME_RECORD_SIZE):
+                out.write(record)
+                pending.append(record[NAME_WIDTH:] + count.to_bytes(4, 'big'))
+                count += 1
+                if len(pending) == chunk_size * 10:
+                    address_runs.append(_spill(sorted(pending), tmp_dir))
+                    pending = []
+            if pending:
+                address_runs.append(_spill(sorted(pending), tmp_dir))
+
+            for record in heapq.merge(*[_iter_records(f, ADDRESS_RECORD_SIZE) for f in address_runs]):
+                out.write(record)
+
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, TABLE_FORMAT, reg_app_id, count,
+                                  CHARSET_CHECKS.index(charset_check), DISPATCH_MODES.index(dispatch)))
+        for f in address_runs:
+            f.close()
+        os.replace(tmp_path, path)
+        return count
+    finally:
+        for f in run_files:
+            f.close()
+
+
+def _spill(records, tmp_dir):
+    f = tempfile.TemporaryFile(dir=tmp_dir)
+    f.write(b"".join(records))
+    f.seek(0)
+    return f
+
+
+class NameAddressTable(object):
+    """
+    Read-only view of a table written by write_table, queried by binary
+    search over the mmap. Opening it for a charset_check or dispatch other
+    than the one it was built with raises ValueError.
+    """
+
+    def __init__(self, path, charset_check=None, dispatch=None):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, table_format, self.reg_app_id, self.count, charset_index, dispatch_index = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or table_format != TABLE_FORMAT:
+            self.close()
+            raise ValueError("not a name address table: " + path)
+        self.charset_check = CHARSET_CHECKS[charset_index]
+        self.dispatch = DISPATCH_MODES[dispatch_index]
+        for setting, expected, built in (("charset_check", charset_check, self.charset_check),
+                                         ("dispatch", dispatch, self.dispatch)):
+            if expected is not None and expected != built:
+                self.close()
+                raise ValueError("{} was built with {} {}, not {}".format(path, setting, built, expected))
+        self._names_offset = HEADER_SIZE
+        self._addresses_offset = HEADER_SIZE + self.count * NAME_RECORD_SIZE
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _search(self, base, record_size, key):
+        mm = self._mm
+        width = len(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = base + mid * record_size
+            if mm[start:start + width] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            start = base + lo * record_size
+            if mm[start:start + width] == key:
+                return lo
+        return -1
+
+    def address_bytes(self, name):
+        """Return the 32-byte escrow public key for name, or None if it is not in the table."""
+        raw = name.encode('utf-8')
+        if len(raw) > NAME_WIDTH:
+            return None
+        index = self._search(self._names_offset, NAME_RECORD_SIZE, raw.ljust(NAME_WIDTH, b"\x00"))
+        if index < 0:
+            return None
+        start = self._names_offset + index * NAME_RECORD_SIZE + NAME_WIDTH
+        return self._mm[start:start + ADDRESS_WIDTH]
+
+    def name(self, address_bytes):
+        """Return the name whose escrow public key is address_bytes, or None."""
+        index = self._search(self._addresses_offset, ADDRESS_RECORD_SIZE, bytes(address_bytes))
+        if index < 0:
+            return None
+        start = self._addresses_offset + index * ADDRESS_RECORD_SIZE + ADDRESS_WIDTH
+        name_index = int.from_bytes(self._mm[start:start + 4], 'big')
+        start = self._names_offset + name_index * NAME_RECORD_SIZE
+        return self._mm[start:start + NAME_WIDTH].rstrip(b"\x00").decode('utf-8')
+
+    def __contains__(self, name):
+        return self.address_bytes(name) is not None
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m contracts.name_address_table")
+    parser.add_argument("--reg-app-id", type=int, required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--lengths", default="", help="comma separated name lengths to enumerate over a-z0-9")
+    parser.add_argument("--words", help="file with one candidate name per line")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--charset-check", default=CHARSET_CHECK_RANGE, choices=CHARSET_CHECKS,
+                        help="name record program variant the registry was deployed with")
+    parser.add_argument("--dispatch", default=DISPATCH_NAME, choices=DISPATCH_MODES,
+                        help="method routing the registry was deployed with")
+    parser.add_argument("--algod-address", help="assemble the name record template with this algod node")
+    parser.add_argument("--algod-token", default="")
+    args = parser.parse_args(argv)
+
+    if not (args.lengths or args.words):
+        parser.error("give --lengths and/or --words")
+
+    with contextlib.ExitStack() as stack:
+        sources = []
+        if args.lengths:
+            sources.append(charset_names([int(n) for n in args.lengths.split(",")]))
+        if args.words:
+            words = stack.enter_context(open(args.words, 'r'))
+            sources.append(line.strip() for line in words if line.strip())
+        count = write_table(args.out, itertools.chain(*sources), args.reg_app_id, args.processes,
+                            charset_check=args.charset_check, dispatch=args.dispatch,
+                            algod=(args.algod_address, args.algod_token) if args.algod_address else None)
+    print("{}: {} names".format(args.out, count))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import base64
+import functools
+import hashlib
+
+from pyteal import compileTeal, Mode
+
+from .dot_algo_name_record import ValidateRecord, CHARSET_CHECK_RANGE, charset_bitmask
+from .methods import REGISTRY_METHODS, DISPATCH_NAME, method_arg
+from .teal_assembler import assemble, encode_uvarint
+
+LOGIC_SIG_VERSION = 4
+MAX_NAME_LENGTH = 64
+
+# Lower-case alphanumeric so the placeholder compiles like a real name
+PLACEHOLDER_NAME = "ansnamerecordtemplateplaceholder"
+CHECK_NAME = "ansnamerecordtemplatecheck"
+
+
+def _application_address(app_id):
+    digest = hashlib.new('sha512_256', b"appID" + app_id.to_bytes(8, 'big')).digest()
+    return _encode_address(digest)
+
+
+def _encode_address(public_key):
+    checksum = hashlib.new('sha512_256', public_key).digest()[-4:]
+    return base64.b32encode(public_key + checksum).decode().rstrip("=")
+
+
+def build_name_record_program(name, reg_app_id, reg_escrow_acct, charset_check=CHARSET_CHECK_RANGE,
+                              dispatch=DISPATCH_NAME, assemble=assemble):
+    """Full PyTeal build of the name record LogicSig, the slow reference path."""
+    teal = compileTeal(ValidateRecord(name, reg_app_id, reg_escrow_acct, charset_check, dispatch),
+                       Mode.Signature, version=LOGIC_SIG_VERSION)
+    return assemble(teal)
+
+
+class NameRecordTemplate(object):
+    """
+    The ValidateRecord LogicSig compiled once for a registry app id.
+
+    Every reference to the name assembles into a single bytecblock entry,
+    so the program for any name is prefix + varuint(len) + name + suffix
+    and its escrow address is one sha512_256 over that.
+
+    assemble turns TEAL into bytecode, the offline assembler unless given.
+    Pass algod's compile to derive addresses from algod's own output,
+    it is only called for the template and for names that cannot be
+    spliced in.
+    """
+
+    def __init__(self, reg_app_id, reg_escrow_acct=None, charset_check=CHARSET_CHECK_RANGE,
+                 dispatch=DISPATCH_NAME, assemble=assemble):
+        self.reg_app_id = reg_app_id
+        self.reg_escrow_acct = reg_escrow_acct or _application_address(reg_app_id)
+        self.charset_check = charset_check
+        self.dispatch = dispatch
+        self.assemble = assemble
+
+        placeholder = PLACEHOLDER_NAME.encode()
+        program = self._build(PLACEHOLDER_NAME)
+        marker = encode_uvarint(len(placeholder)) + placeholder
+        offset = program.find(marker)
+        if offset < 0 or program.find(marker, offset + 1) >= 0:
+            raise ValueError("name does not assemble to a single constant in the name record program")
+        self.prefix = program[:offset]
+        self.suffix = program[offset + len(marker):]
+
+        # Other byte constants the name could be merged with by the assembler
+        self._reserved = {
+            method_arg(REGISTRY_METHODS, "register_name", dispatch),
+            base64.b32decode(self.reg_escrow_acct + "======")[:32],
+            charset_bitmask(),
+        }
+
+        if self.program(CHECK_NAME) != self._build(CHECK_NAME):
+            raise ValueError("name record template does not match a full build")
+
+    def _build(self, name):
+        return build_name_record_program(name, self.reg_app_id, self.reg_escrow_acct, self.charset_check, self.dispatch,
+                                         self.assemble)
+
+    def _spliceable(self, raw):
+        return 0 < len(raw) < 0x80 and raw not in self._reserved
+
+    def program(self, name):
+        """Return the LogicSig bytecode for name."""
+        raw = name.encode('utf-8')
+        if not self._spliceable(raw):
+            return self._build(name)
+        return self.prefix + bytes([len(raw)]) + raw + self.suffix
+
+    def address_bytes(self, name):
+        """Return the 32-byte public key of the name's escrow account."""
+        return hashlib.new('sha512_256', b"Program" + self.program(name)).digest()
+
+    def address(self, name):
+        """Return the name's escrow account address."""
+        return _encode_address(self.address_bytes(name))
+
+
+@functools.lru_cache(maxsize=64)
+def name_record_template(reg_app_id, charset_check=CHARSET_CHECK_RANGE, dispatch=DISPATCH_NAME, assemble=assemble):
+    return NameRecordTemplate(reg_app_id, charset_check=charset_check, dispatch=dispatch, assemble=assemble)
@@ -0,0 +1,120 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Local state of a name record account in the registry app.
+
+The core fields of a name are packed into one value under "record",
+
+    owner 32 bytes, account 32 bytes, expiry u64, transfer_price u64,
+    transfer_to 32 bytes, subdomain u64
+
+big-endian, with transfer_to all zero when no transfer is pending. The
+name itself is kept under "name".
+
+Names registered before the packed record keep their fields under one
+key each (LEGACY_KEYS). The registry will not re-register such a name
+until migrate_record has packed them, pending transfer included. Optional properties such as socials
+are only stored once set, one key each, and default_account is an int
+flag set by set_default_account.
+"""
+
+import base64
+import struct
+from collections import OrderedDict
+
+RECORD_KEY = b"record"
+NAME_KEY = b"name"
+DEFAULT_ACCOUNT_KEY = b"default_account"
+
+RECORD_FIELDS = (
+    ("owner", "32s"),
+    ("account", "32s"),
+    ("expiry", "Q"),
+    ("transfer_price", "Q"),
+    ("transfer_to", "32s"),
+    ("subdomain", "Q"),
+)
+
+RECORD = struct.Struct(">" + "".join(fmt for _, fmt in RECORD_FIELDS))
+RECORD_OFFSETS = OrderedDict()
+_offset = 0
+for _field, _fmt in RECORD_FIELDS:
+    RECORD_OFFSETS[_field] = _offset
+    _offset += struct.calcsize(">" + _fmt)
+
+# Socials the registry clears when a name changes hands
+SOCIAL_KEYS = (b"discord", b"github", b"twitter", b"reddit", b"telegram", b"youtube")
+
+# One key per field, as stored before the packed record
+LEGACY_KEYS = tuple(field.encode() for field, _ in RECORD_FIELDS)
+
+# Keys update_name and remove_property may not touch, including the
+# names of fields that now live in the packed record
+RESERVED_KEYS = (RECORD_KEY, NAME_KEY) + LEGACY_KEYS
+
+ZERO_ADDRESS = bytes(32)
+
+
+def encode_record(owner, account, expiry, transfer_price=0, transfer_to=ZERO_ADDRESS, subdomain=0):
+    return RECORD.pack(owner, account, expiry, transfer_price, transfer_to, subdomain)
+
+
+def decode_record(raw):
+    """Core fields of a name from its packed record."""
+    return OrderedDict(zip((field for field, _ in RECORD_FIELDS), RECORD.unpack(raw)))
+
+
+def _decode_legacy(field, raw):
+    if field in ("owner", "account", "transfer_to"):
+        return raw or ZERO_ADDRESS
+    # transfer_price was stored as "" until the first transfer
+    return raw if isinstance(raw, int) else 0
+
+
+def decode_local_state(key_value):
+    """
+    A name record account's registry state from algod or indexer
+    'key-value' list: the core fields, name, default_account and a
+    dict of its other properties. legacy is True for a name whose
+    fields are not packed yet.
+    """
+    state = OrderedDict([("name", None), ("default_account", False), ("legacy", False), ("properties", {})])
+    legacy = {}
+    for entry in key_value:
+        key = base64.b64decode(entry['key'])
+        value = entry['value']
+        raw = base64.b64decode(value['bytes']) if value['type'] == 1 else value['uint']
+        if key == RECORD_KEY:
+            state.update(decode_record(raw))
+        elif key in LEGACY_KEYS:
+            legacy[key.decode()] = _decode_legacy(key.decode(), raw)
+        elif key == NAME_KEY:
+            state["name"] = raw.decode()
+        elif key == DEFAULT_ACCOUNT_KEY:
+            state["default_account"] = bool(raw)
+        else:
+            state["properties"][key.decode('utf-8', 'replace')] = raw
+    if "owner" in legacy and "owner" not in state:
+        state.update((field, legacy.get(field, _decode_legacy(field, b""))) for field, _ in RECORD_FIELDS)
+        state["legacy"] = True
+    return state
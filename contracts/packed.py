@@ -0,0 +1,44 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Field updates on fixed-layout packed byte records.
+
+TEAL v6 has no replace opcode, so a field is overwritten by splicing the
+bytes either side of it around the new value. Reads use Extract and
+ExtractUint64 directly.
+"""
+
+from pyteal import *
+
+
+def ReplaceField(record, size, offset, width, value):
+    """record, size bytes long, with the width bytes at offset replaced by value"""
+    if isinstance(offset, int):
+        start, end = Int(offset), Int(offset + width)
+    else:
+        start, end = offset, Add(offset, Int(width))
+    return Concat(Substring(record, Int(0), start), value, Substring(record, end, Int(size)))
+
+
+def ReplaceUint64(record, size, offset, value):
+    return ReplaceField(record, size, offset, 8, Itob(value))
@@ -0,0 +1,130 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Shared cache of algod's suggested transaction params.
+
+Params are fetched once per round instead of once per transaction
+built. The cache tracks the round they were fetched in and estimates
+the current round from elapsed time, and refetches once that estimate
+passes it, once a newer round is observed (see observe_round), or
+once the validity window of the cached params gets close to its end.
+"""
+
+import copy
+import threading
+import time
+import weakref
+
+# Seconds per round the estimate assumes. Kept at the short end of block
+# times, so it runs ahead of the actual round rather than behind it.
+ROUND_TIME = 3.3
+# Rounds of validity a transaction built from cached params has left at least
+MIN_VALIDITY_ROUNDS = 10
+
+
+class SuggestedParamsCache(object):
+    """Suggested params of one algod client, refreshed at most once per round."""
+
+    def __init__(self, algod_client, round_time=ROUND_TIME, min_validity_rounds=MIN_VALIDITY_ROUNDS,
+                 clock=time.monotonic):
+        self.algod_client = algod_client
+        self.round_time = round_time
+        self.min_validity_rounds = min_validity_rounds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._params = None
+        self._round = 0
+        self._fetched_at = 0
+        self._observed_round = 0
+        self._lock = threading.RLock()
+
+    @property
+    def saved_calls(self):
+        """algod calls callers did not make because the cache answered."""
+        return self.hits
+
+    def estimated_round(self):
+        if self._params is None:
+            return self._observed_round
+        elapsed = int((self.clock() - self._fetched_at) / self.round_time)
+        return max(self._round + elapsed, self._observed_round)
+
+    def _is_fresh(self):
+        if self._params is None:
+            return False
+        current = self.estimated_round()
+        return current == self._round and current + self.min_validity_rounds <= self._params.last
+
+    def get(self):
+        """A copy of the current round's params, callers are free to change the fee."""
+        with self._lock:
+            params = self.lookup()
+            if params is None:
+                params = self.store(self.algod_client.suggested_params())
+            return params
+
+    def lookup(self):
+        """A copy of the cached params if they are still fresh, else None."""
+        with self._lock:
+            if not self._is_fresh():
+                return None
+            self.hits += 1
+            return copy.copy(self._params)
+
+    def store(self, params):
+        """Cache params just fetched from algod and return a copy."""
+        with self._lock:
+            self.misses += 1
+            self._params = params
+            # A lagging node keeps its params for the round already observed
+            self._round = max(params.first, self._observed_round)
+            self._fetched_at = self.clock()
+            return copy.copy(params)
+
+    def observe_round(self, round):
+        """Note a round seen elsewhere, e.g. in algod status, params older than it are refetched."""
+        with self._lock:
+            self._observed_round = max(self._observed_round, round)
+
+    def invalidate(self):
+        with self._lock:
+            self._params = None
+
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def params_cache(algod_client):
+    """The SuggestedParamsCache shared by every helper using algod_client."""
+    with _caches_lock:
+        cache = _caches.get(algod_client)
+        if cache is None:
+            cache = _caches[algod_client] = SuggestedParamsCache(algod_client)
+        return cache
+
+
+def suggested_params(algod_client):
+    """Drop-in for algod_client.suggested_params() served from the shared cache."""
+    return params_cache(algod_client).get()
@@ -0,0 +1,244 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Per-proposal storage of the DAO app.
+
+Every open proposal is kept in three global state values, each keyed by
+the 8-byte proposal id followed by a one byte tag:
+
+    v  votes record   voting_end, votecount_yes, votecount_no,
+                      votecount_abstain, total_coins_voted, all u64
+    p  params record  type u8, initiator 32 bytes, reg_app_id u64, then
+                      funding    funding_amt_algo u64, funding_amt_ans u64,
+                                 payouts_hash 32 bytes
+                      updatereg  reg_app_progrm_hash 32 bytes,
+                                 reg_clear_progrm_hash 32 bytes
+    u  url
+
+Integers are big-endian, so the contract reads fields with extract and
+extract_uint64. All three keys are deleted when the proposal's result is
+declared.
+
+A voter's choice is kept in their local state under the 8-byte
+proposal id.
+
+A funding proposal pays out to up to MAX_PAYOUTS recipients, each
+entry a recipient 32 bytes, algo amount u64 and ANS amount u64. The
+record keeps the totals and the sha512_256 of the packed entries, which
+are sent again to declare_result.
+
+The program hashes of an updatereg proposal are chained over the
+program's chunks, h = sha512_256(h || chunk) starting from 32 zero
+bytes. The programs themselves are only sent once, in stage_program
+calls grouped ahead of declare_result.
+"""
+
+import base64
+import hashlib
+import struct
+from collections import OrderedDict
+
+from .constants import MAX_APP_ACCOUNTS
+
+# 3 byte slices per proposal next to url and last_result fit 10
+# proposals into the 32 global byte slices DeployANSDAO reserves
+MAX_ACTIVE_PROPOSALS = 10
+
+PROPOSAL_ID_BYTES = 8
+
+VOTES_TAG = b"v"
+PARAMS_TAG = b"p"
+URL_TAG = b"u"
+
+PROPOSAL_TYPES = OrderedDict([
+    ("social", 0),
+    ("funding", 1),
+    ("updatereg", 2),
+])
+
+# (field, struct format) in record order
+VOTES_FIELDS = (
+    ("voting_end", "Q"),
+    ("votecount_yes", "Q"),
+    ("votecount_no", "Q"),
+    ("votecount_abstain", "Q"),
+    ("total_coins_voted", "Q"),
+)
+PARAMS_HEADER = (
+    ("type", "B"),
+    ("initiator", "32s"),
+    ("reg_app_id", "Q"),
+)
+PARAMS_PAYLOAD = {
+    "social": (),
+    "funding": (
+        ("funding_amt_algo", "Q"),
+        ("funding_amt_ans", "Q"),
+        ("payouts_hash", "32s"),
+    ),
+    "updatereg": (
+        ("reg_app_progrm_hash", "32s"),
+        ("reg_clear_progrm_hash", "32s"),
+    ),
+}
+
+
+def _record(fields):
+    return struct.Struct(">" + "".join(fmt for _, fmt in fields)), tuple(name for name, _ in fields)
+
+
+def _offsets(fields):
+    offsets, offset = OrderedDict(), 0
+    for name, fmt in fields:
+        offsets[name] = offset
+        offset += struct.calcsize(">" + fmt)
+    return offsets
+
+
+VOTES_RECORD, _VOTES_NAMES = _record(VOTES_FIELDS)
+VOTES_OFFSETS = _offsets(VOTES_FIELDS)
+
+PARAMS_RECORDS = dict((kind, _record(PARAMS_HEADER + payload)) for kind, payload in PARAMS_PAYLOAD.items())
+PARAMS_OFFSETS = OrderedDict()
+for _payload in PARAMS_PAYLOAD.values():
+    PARAMS_OFFSETS.update(_offsets(PARAMS_HEADER + _payload))
+
+_TYPE_NAMES = dict((code, kind) for kind, code in PROPOSAL_TYPES.items())
+
+# Every field a decoded proposal has, with the value it reads as when
+# the proposal's type does not store it
+PROPOSAL_DEFAULTS = OrderedDict(
+    [("type", ""), ("initiator", b""), ("url", b"")]
+    + [(name, 0) for name, _ in VOTES_FIELDS]
+    + [("reg_app_id", 0), ("funding_amt_algo", 0), ("funding_amt_ans", 0), ("payouts_hash", b""),
+       ("reg_app_progrm_hash", b""), ("reg_clear_progrm_hash", b"")]
+)
+
+
+def record_key(proposal_id, tag):
+    """Global state key of one of a proposal's records."""
+    return proposal_id.to_bytes(PROPOSAL_ID_BYTES, 'big') + tag
+
+
+def vote_key(proposal_id):
+    """Local state key of a voter's choice on a proposal."""
+    return proposal_id.to_bytes(PROPOSAL_ID_BYTES, 'big')
+
+
+def encode_votes(voting_end, votecount_yes=0, votecount_no=0, votecount_abstain=0, total_coins_voted=0):
+    return VOTES_RECORD.pack(voting_end, votecount_yes, votecount_no, votecount_abstain, total_coins_voted)
+
+
+def decode_votes(raw):
+    return OrderedDict(zip(_VOTES_NAMES, VOTES_RECORD.unpack(raw)))
+
+
+def encode_params(kind, initiator, reg_app_id=0, **payload):
+    record, names = PARAMS_RECORDS[kind]
+    values = dict(payload, type=PROPOSAL_TYPES[kind], initiator=initiator, reg_app_id=reg_app_id)
+    return record.pack(*[values[name] for name in names])
+
+
+def decode_params(raw):
+    kind = _TYPE_NAMES[raw[0]]
+    record, names = PARAMS_RECORDS[kind]
+    params = OrderedDict(zip(names, record.unpack(raw)))
+    params["type"] = kind
+    return params
+
+
+def decode_proposal(votes, params, url=b""):
+    """One proposal's fields from its raw records."""
+    proposal = OrderedDict(PROPOSAL_DEFAULTS)
+    proposal.update(decode_votes(votes))
+    proposal.update(decode_params(params))
+    proposal["url"] = url
+    return proposal
+
+
+def decode_proposals(global_state):
+    """
+    {proposal_id: {field: value}} for every open proposal in the app's
+    global state, as returned by algod's application info.
+    """
+    records = {}
+    for entry in global_state:
+        key = base64.b64decode(entry['key'])
+        if len(key) != PROPOSAL_ID_BYTES + 1 or key[PROPOSAL_ID_BYTES:] not in (VOTES_TAG, PARAMS_TAG, URL_TAG):
+            continue
+        proposal_id = int.from_bytes(key[:PROPOSAL_ID_BYTES], 'big')
+        records.setdefault(proposal_id, {})[key[PROPOSAL_ID_BYTES:]] = base64.b64decode(entry['value']['bytes'])
+    return dict(
+        (proposal_id, decode_proposal(r[VOTES_TAG], r[PARAMS_TAG], r.get(URL_TAG, b"")))
+        for proposal_id, r in records.items() if VOTES_TAG in r and PARAMS_TAG in r
+    )
+
+
+# recipient, algo amount, ANS amount. Every recipient has to be a foreign
+# account of declare_result and of the registry's withdraw_funds call.
+PAYOUT = struct.Struct(">32sQQ")
+MAX_PAYOUTS = MAX_APP_ACCOUNTS
+
+
+def encode_payouts(payouts):
+    """Packed funding entries from (recipient public key, algo amount, ANS amount) tuples."""
+    payouts = list(payouts)
+    if not 0 < len(payouts) <= MAX_PAYOUTS:
+        raise ValueError("a funding proposal pays 1 to {} recipients, got {}".format(MAX_PAYOUTS, len(payouts)))
+    return b"".join(PAYOUT.pack(*payout) for payout in payouts)
+
+
+def decode_payouts(raw):
+    return [PAYOUT.unpack_from(raw, offset) for offset in range(0, len(raw), PAYOUT.size)]
+
+
+# Program bytes per stage_program call, leaving room in the 2KB of app args
+# for the method and kind args
+PROGRAM_CHUNK_SIZE = 2000
+
+APPROVAL_PROGRAM = b"a"
+CLEAR_PROGRAM = b"c"
+
+
+def program_chunks(program, chunk_size=PROGRAM_CHUNK_SIZE):
+    return [program[i:i + chunk_size] for i in range(0, len(program), chunk_size)]
+
+
+def program_hash(program, chunk_size=PROGRAM_CHUNK_SIZE):
+    """Chained hash of program as staged in chunk_size pieces."""
+    digest = bytes(32)
+    for chunk in program_chunks(program, chunk_size):
+        digest = hashlib.new('sha512_256', digest + chunk).digest()
+    return digest
+
+
+def created_proposal_id(txinfo):
+    """
+    Id of the proposal an add_proposal call created, from its pending
+    transaction info. add_proposal bumps the proposal_id global before
+    storing the proposal under it, so the id is the new value.
+    """
+    for entry in txinfo.get('global-state-delta', []):
+        if base64.b64decode(entry['key']) == b"proposal_id":
+            return entry['value']['uint']
+    return None
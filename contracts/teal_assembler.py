@@ -0,0 +1,897 @@
+'''
+Copyright (c) 2022 Algorand Name Service
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+In-process TEAL assembler for the v1-v6 opcodes.
+
+Follows the constant layout of algod's /v2/teal/compile: int and byte
+pseudo-ops are collected into intcblock/bytecblock and, from v4 on,
+ordered by reference count with single-use constants emitted as
+pushint/pushbytes. It has only been compared with algod on small
+programs, the repo ships no recorded output for the full contracts, so
+record and check them against a node before deploying offline bytecode.
+
+    python -m contracts.teal_assembler --record [DIR] --algod-address URL [--algod-token T] [FILE.teal...]
+    python -m contracts.teal_assembler --check [DIR]
+
+--record stores algod's output next to each TEAL source, by default for
+the DAO and registry programs and the name record LogicSig in both
+charset modes into FIXTURES_DIR. --check re-assembles every recorded
+pair offline and reports any difference. The test helpers only use this
+assembler when ans_helper.OFFLINE_ASSEMBLY is set.
+"""
+
+import base64
+import hashlib
+import os
+import sys
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "algod")
+
+
+class TealAssemblyError(Exception):
+    pass
+
+
+# name: (opcode, min version, immediates)
+# immediate kinds: u8, curve, txn, txna, global, label, uint, bytes, uints,
+# bytes_list, asset_holding, asset_params, app_params, acct_params, itxn_field
+OPS = {
+    "err": (0x00, 1, ()),
+    "sha256": (0x01, 1, ()),
+    "keccak256": (0x02, 1, ()),
+    "sha512_256": (0x03, 1, ()),
+    "ed25519verify": (0x04, 1, ()),
+    "ecdsa_verify": (0x05, 5, ("curve",)),
+    "ecdsa_pk_decompress": (0x06, 5, ("curve",)),
+    "ecdsa_pk_recover": (0x07, 5, ("curve",)),
+    "+": (0x08, 1, ()),
+    "-": (0x09, 1, ()),
+    "/": (0x0a, 1, ()),
+    "*": (0x0b, 1, ()),
+    "<": (0x0c, 1, ()),
+    ">": (0x0d, 1, ()),
+    "<=": (0x0e, 1, ()),
+    ">=": (0x0f, 1, ()),
+    "&&": (0x10, 1, ()),
+    "||": (0x11, 1, ()),
+    "==": (0x12, 1, ()),
+    "!=": (0x13, 1, ()),
+    "!": (0x14, 1, ()),
+    "len": (0x15, 1, ()),
+    "itob": (0x16, 1, ()),
+    "btoi": (0x17, 1, ()),
+    "%": (0x18, 1, ()),
+    "|": (0x19, 1, ()),
+    "&": (0x1a, 1, ()),
+    "^": (0x1b, 1, ()),
+    "~": (0x1c, 1, ()),
+    "mulw": (0x1d, 1, ()),
+    "addw": (0x1e, 2, ()),
+    "divmodw": (0x1f, 4, ()),
+    "intcblock": (0x20, 1, ("uints",)),
+    "intc": (0x21, 1, ("u8",)),
+    "intc_0": (0x22, 1, ()),
+    "intc_1": (0x23, 1, ()),
+    "intc_2": (0x24, 1, ()),
+    "intc_3": (0x25, 1, ()),
+    "bytecblock": (0x26, 1, ("bytes_list",)),
+    "bytec": (0x27, 1, ("u8",)),
+    "bytec_0": (0x28, 1, ()),
+    "bytec_1": (0x29, 1, ()),
+    "bytec_2": (0x2a, 1, ()),
+    "bytec_3": (0x2b, 1, ()),
+    "arg": (0x2c, 1, ("u8",)),
+    "arg_0": (0x2d, 1, ()),
+    "arg_1": (0x2e, 1, ()),
+    "arg_2": (0x2f, 1, ()),
+    "arg_3": (0x30, 1, ()),
+    "txn": (0x31, 1, ("txn",)),
+    "global": (0x32, 1, ("global",)),
+    "gtxn": (0x33, 1, ("u8", "txn")),
+    "load": (0x34, 1, ("u8",)),
+    "store": (0x35, 1, ("u8",)),
+    "txna": (0x36, 2, ("txna", "u8")),
+    "gtxna": (0x37, 2, ("u8", "txna", "u8")),
+    "gtxns": (0x38, 3, ("txn",)),
+    "gtxnsa": (0x39, 3, ("txna", "u8")),
+    "gload": (0x3a, 4, ("u8", "u8")),
+    "gloads": (0x3b, 4, ("u8",)),
+    "gaid": (0x3c, 4, ("u8",)),
+    "gaids": (0x3d, 4, ()),
+    "loads": (0x3e, 5, ()),
+    "stores": (0x3f, 5, ()),
+    "bnz": (0x40, 1, ("label",)),
+    "bz": (0x41, 2, ("label",)),
+    "b": (0x42, 2, ("label",)),
+    "return": (0x43, 2, ()),
+    "assert": (0x44, 3, ()),
+    "pop": (0x48, 1, ()),
+    "dup": (0x49, 1, ()),
+    "dup2": (0x4a, 2, ()),
+    "dig": (0x4b, 3, ("u8",)),
+    "swap": (0x4c, 3, ()),
+    "select": (0x4d, 3, ()),
+    "cover": (0x4e, 5, ("u8",)),
+    "uncover": (0x4f, 5, ("u8",)),
+    "concat": (0x50, 2, ()),
+    "substring": (0x51, 2, ("u8", "u8")),
+    "substring3": (0x52, 2, ()),
+    "getbit": (0x53, 3, ()),
+    "setbit": (0x54, 3, ()),
+    "getbyte": (0x55, 3, ()),
+    "setbyte": (0x56, 3, ()),
+    "extract": (0x57, 5, ("u8", "u8")),
+    "extract3": (0x58, 5, ()),
+    "extract_uint16": (0x59, 5, ()),
+    "extract_uint32": (0x5a, 5, ()),
+    "extract_uint64": (0x5b, 5, ()),
+    "balance": (0x60, 2, ()),
+    "app_opted_in": (0x61, 2, ()),
+    "app_local_get": (0x62, 2, ()),
+    "app_local_get_ex": (0x63, 2, ()),
+    "app_global_get": (0x64, 2, ()),
+    "app_global_get_ex": (0x65, 2, ()),
+    "app_local_put": (0x66, 2, ()),
+    "app_global_put": (0x67, 2, ()),
+    "app_local_del": (0x68, 2, ()),
+    "app_global_del": (0x69, 2, ()),
+    "asset_holding_get": (0x70, 2, ("asset_holding",)),
+    "asset_params_get": (0x71, 2, ("asset_params",)),
+    "app_params_get": (0x72, 5, ("app_params",)),
+    "acct_params_get": (0x73, 6, ("acct_params",)),
+    "min_balance": (0x78, 3, ()),
+    "pushbytes": (0x80, 3, ("bytes",)),
+    "pushint": (0x81, 3, ("uint",)),
+    "callsub": (0x88, 4, ("label",)),
+    "retsub": (0x89, 4, ()),
+    "shl": (0x90, 4, ()),
+    "shr": (0x91, 4, ()),
+    "sqrt": (0x92, 4, ()),
+    "bitlen": (0x93, 4, ()),
+    "exp": (0x94, 4, ()),
+    "expw": (0x95, 4, ()),
+    "bsqrt": (0x96, 6, ()),
+    "divw": (0x97, 6, ()),
+    "b+": (0xa0, 4, ()),
+    "b-": (0xa1, 4, ()),
+    "b/": (0xa2, 4, ()),
+    "b*": (0xa3, 4, ()),
+    "b<": (0xa4, 4, ()),
+    "b>": (0xa5, 4, ()),
+    "b<=": (0xa6, 4, ()),
+    "b>=": (0xa7, 4, ()),
+    "b==": (0xa8, 4, ()),
+    "b!=": (0xa9, 4, ()),
+    "b%": (0xaa, 4, ()),
+    "b|": (0xab, 4, ()),
+    "b&": (0xac, 4, ()),
+    "b^": (0xad, 4, ()),
+    "b~": (0xae, 4, ()),
+    "bzero": (0xaf, 4, ()),
+    "log": (0xb0, 5, ()),
+    "itxn_begin": (0xb1, 5, ()),
+    "itxn_field": (0xb2, 5, ("itxn_field",)),
+    "itxn_submit": (0xb3, 5, ()),
+    "itxn": (0xb4, 5, ("txn",)),
+    "itxna": (0xb5, 5, ("txna", "u8")),
+    "itxn_next": (0xb6, 6, ()),
+    "gitxn": (0xb7, 6, ("u8", "txn")),
+    "gitxna": (0xb8, 6, ("u8", "txna", "u8")),
+    "txnas": (0xc0, 5, ("txna",)),
+    "gtxnas": (0xc1, 5, ("u8", "txna")),
+    "gtxnsas": (0xc2, 5, ("txna",)),
+    "args": (0xc3, 5, ()),
+    "gloadss": (0xc4, 6, ()),
+    "itxnas": (0xc5, 6, ("txna",)),
+    "gitxnas": (0xc6, 6, ("u8", "txna")),
+}
+
+# name: (index, min version, is array)
+TXN_FIELDS = {
+    "Sender": (0, 1, False),
+    "Fee": (1, 1, False),
+    "FirstValid": (2, 1, False),
+    "FirstValidTime": (3, 1, False),
+    "LastValid": (4, 1, False),
+    "Note": (5, 1, False),
+    "Lease": (6, 1, False),
+    "Receiver": (7, 1, False),
+    "Amount": (8, 1, False),
+    "CloseRemainderTo": (9, 1, False),
+    "VotePK": (10, 1, False),
+    "SelectionPK": (11, 1, False),
+    "VoteFirst": (12, 1, False),
+    "VoteLast": (13, 1, False),
+    "VoteKeyDilution": (14, 1, False),
+    "Type": (15, 1, False),
+    "TypeEnum": (16, 1, False),
+    "XferAsset": (17, 1, False),
+    "AssetAmount": (18, 1, False),
+    "AssetSender": (19, 1, False),
+    "AssetReceiver": (20, 1, False),
+    "AssetCloseTo": (21, 1, False),
+    "GroupIndex": (22, 1, False),
+    "TxID": (23, 1, False),
+    "ApplicationID": (24, 2, False),
+    "OnCompletion": (25, 2, False),
+    "ApplicationArgs": (26, 2, True),
+    "NumAppArgs": (27, 2, False),
+    "Accounts": (28, 2, True),
+    "NumAccounts": (29, 2, False),
+    "ApprovalProgram": (30, 2, False),
+    "ClearStateProgram": (31, 2, False),
+    "RekeyTo": (32, 2, False),
+    "ConfigAsset": (33, 2, False),
+    "ConfigAssetTotal": (34, 2, False),
+    "ConfigAssetDecimals": (35, 2, False),
+    "ConfigAssetDefaultFrozen": (36, 2, False),
+    "ConfigAssetUnitName": (37, 2, False),
+    "ConfigAssetName": (38, 2, False),
+    "ConfigAssetURL": (39, 2, False),
+    "ConfigAssetMetadataHash": (40, 2, False),
+    "ConfigAssetManager": (41, 2, False),
+    "ConfigAssetReserve": (42, 2, False),
+    "ConfigAssetFreeze": (43, 2, False),
+    "ConfigAssetClawback": (44, 2, False),
+    "FreezeAsset": (45, 2, False),
+    "FreezeAssetAccount": (46, 2, False),
+    "FreezeAssetFrozen": (47, 2, False),
+    "Assets": (48, 3, True),
+    "NumAssets": (49, 3, False),
+    "Applications": (50, 3, True),
+    "NumApplications": (51, 3, False),
+    "GlobalNumUint": (52, 3, False),
+    "GlobalNumByteSlice": (53, 3, False),
+    "LocalNumUint": (54, 3, False),
+    "LocalNumByteSlice": (55, 3, False),
+    "ExtraProgramPages": (56, 4, False),
+    "Nonparticipation": (57, 5, False),
+    "Logs": (58, 5, True),
+    "NumLogs": (59, 5, False),
+    "CreatedAssetID": (60, 5, False),
+    "CreatedApplicationID": (61, 5, False),
+    "LastLog": (62, 6, False),
+    "StateProofPK": (63, 6, False),
+}
+
+GLOBAL_FIELDS = {
+    "MinTxnFee": (0, 1),
+    "MinBalance": (1, 1),
+    "MaxTxnLife": (2, 1),
+    "ZeroAddress": (3, 1),
+    "GroupSize": (4, 1),
+    "LogicSigVersion": (5, 2),
+    "Round": (6, 2),
+    "LatestTimestamp": (7, 2),
+    "CurrentApplicationID": (8, 2),
+    "CreatorAddress": (9, 3),
+    "CurrentApplicationAddress": (10, 5),
+    "GroupID": (11, 5),
+    "OpcodeBudget": (12, 6),
+    "CallerApplicationID": (13, 6),
+    "CallerApplicationAddress": (14, 6),
+}
+
+ASSET_HOLDING_FIELDS = {
+    "AssetBalance": (0, 2),
+    "AssetFrozen": (1, 2),
+}
+
+ASSET_PARAMS_FIELDS = {
+    "AssetTotal": (0, 2),
+    "AssetDecimals": (1, 2),
+    "AssetDefaultFrozen": (2, 2),
+    "AssetUnitName": (3, 2),
+    "AssetName": (4, 2),
+    "AssetURL": (5, 2),
+    "AssetMetadataHash": (6, 2),
+    "AssetManager": (7, 2),
+    "AssetReserve": (8, 2),
+    "AssetFreeze": (9, 2),
+    "AssetClawback": (10, 2),
+    "AssetCreator": (11, 5),
+}
+
+APP_PARAMS_FIELDS = {
+    "AppApprovalProgram": (0, 5),
+    "AppClearStateProgram": (1, 5),
+    "AppGlobalNumUint": (2, 5),
+    "AppGlobalNumByteSlice": (3, 5),
+    "AppLocalNumUint": (4, 5),
+    "AppLocalNumByteSlice": (5, 5),
+    "AppExtraProgramPages": (6, 5),
+    "AppCreator": (7, 5),
+    "AppAddress": (8, 5),
+}
+
+ACCT_PARAMS_FIELDS = {
+    "AcctBalance": (0, 6),
+    "AcctMinBalance": (1, 6),
+    "AcctAuthAddr": (2, 6),
+}
+
+# Fields that itxn_field accepts, by the version they became settable in
+ITXN_FIELD_VERSIONS = {
+    "Sender": 5, "Fee": 5, "Receiver": 5, "Amount": 5, "CloseRemainderTo": 5,
+    "Type": 5, "TypeEnum": 5, "XferAsset": 5, "AssetAmount": 5, "AssetSender": 5,
+    "AssetReceiver": 5, "AssetCloseTo": 5,
+    "ConfigAsset": 5, "ConfigAssetTotal": 5, "ConfigAssetDecimals": 5,
+    "ConfigAssetDefaultFrozen": 5, "ConfigAssetUnitName": 5, "ConfigAssetName": 5,
+    "ConfigAssetURL": 5, "ConfigAssetMetadataHash": 5, "ConfigAssetManager": 5,
+    "ConfigAssetReserve": 5, "ConfigAssetFreeze": 5, "ConfigAssetClawback": 5,
+    "FreezeAsset": 5, "FreezeAssetAccount": 5, "FreezeAssetFrozen": 5,
+    "Note": 6, "VotePK": 6, "SelectionPK": 6, "VoteFirst": 6, "VoteLast": 6,
+    "VoteKeyDilution": 6, "Nonparticipation": 6, "RekeyTo": 6,
+    "ApplicationID": 6, "OnCompletion": 6, "ApplicationArgs": 6, "Accounts": 6,
+    "ApprovalProgram": 6, "ClearStateProgram": 6, "Assets": 6, "Applications": 6,
+    "GlobalNumUint": 6, "GlobalNumByteSlice": 6, "LocalNumUint": 6,
+    "LocalNumByteSlice": 6, "ExtraProgramPages": 6, "StateProofPK": 6,
+}
+
+NAMED_INTS = {
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3,
+    "UpdateApplication": 4, "DeleteApplication": 5,
+}
+
+MAX_VERSION = 6
+
+# v4 introduced frequency-ordered constant blocks in algod's assembler
+OPTIMIZE_CONSTANTS_VERSION = 4
+
+
+def encode_uvarint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _tokenize(line):
+    tokens = []
+    i = 0
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if c in ' \t':
+            i += 1
+            continue
+        if line.startswith("//", i):
+            break
+        start = i
+        if c == '"':
+            i += 1
+            while i < n and line[i] != '"':
+                i += 2 if line[i] == '\\' else 1
+            if i >= n:
+                raise TealAssemblyError("unterminated string: " + line)
+            i += 1
+        else:
+            while i < n and line[i] not in ' \t' and not line.startswith("//", i):
+                if line[i] == '(':
+                    # b64(...) / base32(...) keep their contents together
+                    close = line.find(')', i)
+                    i = n if close < 0 else close + 1
+                    break
+                i += 1
+        tokens.append(line[start:i])
+    return tokens
+
+
+def _parse_uint(token):
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    try:
+        if token.startswith(("0x", "0X")):
+            value = int(token[2:], 16)
+        elif token.startswith(("0o", "0O")):
+            value = int(token[2:], 8)
+        elif token.startswith(("0b", "0B")):
+            value = int(token[2:], 2)
+        elif len(token) > 1 and token.startswith("0"):
+            value = int(token[1:], 8)
+        else:
+            value = int(token, 10)
+    except ValueError:
+        raise TealAssemblyError("unable to parse integer: " + token)
+    if value < 0 or value >= 1 << 64:
+        raise TealAssemblyError("integer out of range: " + token)
+    return value
+
+
+def _parse_string_literal(token):
+    body = token[1:-1]
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c != '\\':
+            out.extend(c.encode('utf-8'))
+            i += 1
+            continue
+        if i + 1 >= len(body):
+            raise TealAssemblyError("bad escape in " + token)
+        e = body[i + 1]
+        if e == 'n':
+            out.append(0x0a)
+        elif e == 'r':
+            out.append(0x0d)
+        elif e == 't':
+            out.append(0x09)
+        elif e == '\\':
+            out.append(0x5c)
+        elif e == '"':
+            out.append(0x22)
+        elif e == 'x':
+            try:
+                out.append(int(body[i + 2:i + 4], 16))
+            except ValueError:
+                raise TealAssemblyError("bad hex escape in " + token)
+            i += 2
+        else:
+            raise TealAssemblyError("unknown escape \\{} in {}".format(e, token))
+        i += 2
+    return bytes(out)
+
+
+def _b32decode(text):
+    text = text.upper()
+    return base64.b32decode(text + "=" * (-len(text) % 8))
+
+
+def _parse_bytes(args, line):
+    """Parse byte-constant arguments, returns (value, tokens consumed)."""
+    if not args:
+        raise TealAssemblyError("missing byte constant: " + line)
+    first = args[0]
+    if first in ("base64", "b64"):
+        if len(args) < 2:
+            raise TealAssemblyError("missing base64 value: " + line)
+        return base64.b64decode(args[1]), 2
+    if first in ("base32", "b32"):
+        if len(args) < 2:
+            raise TealAssemblyError("missing base32 value: " + line)
+        return _b32decode(args[1]), 2
+    for prefix, decode in (("base64(", base64.b64decode), ("b64(", base64.b64decode),
+                           ("base32(", _b32decode), ("b32(", _b32decode)):
+        if first.startswith(prefix) and first.endswith(")"):
+            return decode(first[len(prefix):-1]), 1
+    if first.startswith("0x"):
+        try:
+            return bytes.fromhex(first[2:]), 1
+        except ValueError:
+            raise TealAssemblyError("bad hex constant: " + line)
+    if first.startswith('"') and first.endswith('"') and len(first) >= 2:
+        return _parse_string_literal(first), 1
+    raise TealAssemblyError("unable to parse byte constant: " + line)
+
+
+def _decode_address(addr):
+    try:
+        raw = _b32decode(addr)
+    except Exception:
+        raise TealAssemblyError("invalid address: " + addr)
+    if len(raw) != 36 or hashlib.new('sha512_256', raw[:32]).digest()[-4:] != raw[32:]:
+        raise TealAssemblyError("invalid address: " + addr)
+    return raw[:32]
+
+
+def _method_selector(signature):
+    return hashlib.new('sha512_256', signature.encode('utf-8')).digest()[:4]
+
+
+class _Instruction(object):
+    """One source line: either fixed bytes, a branch or a constant reference."""
+
+    __slots__ = ("kind", "data", "label", "const", "line", "tokens")
+
+    def __init__(self, kind, data=b"", label=None, const=None, line="", tokens=()):
+        self.kind = kind
+        self.data = data
+        self.label = label
+        self.const = const
+        self.line = line
+        self.tokens = tokens
+
+
+def _field(table, name, version, line, kind):
+    if name not in table:
+        raise TealAssemblyError("unknown {} field {}: {}".format(kind, name, line))
+    entry = table[name]
+    if entry[1] > version:
+        raise TealAssemblyError("{} field {} requires v{}: {}".format(kind, name, entry[1], line))
+    return entry[0]
+
+
+def _u8(token, line):
+    value = _parse_uint(token)
+    if value > 255:
+        raise TealAssemblyError("immediate out of range: " + line)
+    return value
+
+
+def _encode_immediates(name, kinds, args, version, line):
+    if name in ("txn", "gtxn", "gtxns", "itxn", "gitxn"):
+        # txn/gtxn/gtxns with an extra index assemble to their array form
+        expected = len(kinds)
+        if len(args) == expected + 1:
+            name = {"txn": "txna", "gtxn": "gtxna", "gtxns": "gtxnsa", "itxn": "itxna", "gitxn": "gitxna"}[name]
+            kinds = OPS[name][2]
+    if len(args) != len(kinds):
+        raise TealAssemblyError("{} expects {} immediate arguments: {}".format(name, len(kinds), line))
+    out = bytearray([OPS[name][0]])
+    for kind, token in zip(kinds, args):
+        if kind == "u8":
+            out.append(_u8(token, line))
+        elif kind == "curve":
+            curves = {"Secp256k1": 0}
+            out.append(curves[token] if token in curves else _u8(token, line))
+        elif kind in ("txn", "txna"):
+            index = _field(TXN_FIELDS, token, version, line, "txn")
+            is_array = TXN_FIELDS[token][2]
+            if kind == "txna" and not is_array:
+                raise TealAssemblyError("{} is not an array field: {}".format(token, line))
+            if kind == "txn" and is_array:
+                raise TealAssemblyError("{} requires an array index: {}".format(token, line))
+            out.append(index)
+        elif kind == "global":
+            out.append(_field(GLOBAL_FIELDS, token, version, line, "global"))
+        elif kind == "asset_holding":
+            out.append(_field(ASSET_HOLDING_FIELDS, token, version, line, "asset_holding"))
+        elif kind == "asset_params":
+            out.append(_field(ASSET_PARAMS_FIELDS, token, version, line, "asset_params"))
+        elif kind == "app_params":
+            out.append(_field(APP_PARAMS_FIELDS, token, version, line, "app_params"))
+        elif kind == "acct_params":
+            out.append(_field(ACCT_PARAMS_FIELDS, token, version, line, "acct_params"))
+        elif kind == "itxn_field":
+            if ITXN_FIELD_VERSIONS.get(token, MAX_VERSION + 1) > version:
+                raise TealAssemblyError("itxn_field {} not available in v{}: {}".format(token, version, line))
+            out.append(TXN_FIELDS[token][0])
+        else:
+            raise TealAssemblyError("unsupported immediate for {}: {}".format(name, line))
+    return bytes(out)
+
+
+def _const_ref_bytes(kind, index):
+    if kind == "int":
+        return bytes([0x22 + index]) if index < 4 else bytes([0x21, index])
+    return bytes([0x28 + index]) if index < 4 else bytes([0x27, index])
+
+
+def _push_bytes(kind, value):
+    if kind == "int":
+        return b"\x81" + encode_uvarint(value)
+    return b"\x80" + encode_uvarint(len(value)) + value
+
+
+def _order_constants(values, refs, optimize):
+    """Return the constant block for one kind, given every value referenced in order."""
+    if not optimize:
+        return values
+    freq = {}
+    for value in refs:
+        freq[value] = freq.get(value, 0) + 1
+    # Stable sort keeps first-appearance order among equal counts, like algod
+    ordered = sorted(values, key=lambda value: -freq[value])
+    return [value for value in ordered if freq[value] > 1]
+
+
+class Listing(object):
+    """Assembled program plus where each source instruction landed."""
+
+    def __init__(self, program, version, header_size, header_ops, instructions, labels):
+        self.program = program
+        self.version = version
+        # Version byte plus the intcblock/bytecblock the assembler prepended
+        self.header_size = header_size
+        self.header_ops = header_ops
+        # [(tokens, offset, size)] in source order
+        self.instructions = instructions
+        # label -> index into instructions (len(instructions) for a trailing label)
+        self.labels = labels
+
+
+def assemble(source):
+    """Assemble TEAL source text into program bytecode."""
+    return assemble_listing(source).program
+
+
+def assemble_listing(source):
+    """Assemble TEAL source text, returning a Listing."""
+    lines = source.splitlines()
+    version = 1
+    instructions = []
+    labels = {}
+    explicit_blocks = {"int": None, "byte": None}
+    const_values = {"int": [], "byte": []}
+    const_refs = {"int": [], "byte": []}
+
+    for raw_line in lines:
+        tokens = _tokenize(raw_line)
+        if not tokens:
+            continue
+        line = raw_line.strip()
+
+        if tokens[0] == "#pragma":
+            if len(tokens) != 3 or tokens[1] != "version":
+                raise TealAssemblyError("unsupported pragma: " + line)
+            if instructions:
+                raise TealAssemblyError("#pragma version must come first: " + line)
+            version = _parse_uint(tokens[2])
+            if version < 1 or version > MAX_VERSION:
+                raise TealAssemblyError("unsupported TEAL version {}".format(version))
+            continue
+
+        # Labels may share a line with an instruction
+        while tokens and tokens[0].endswith(":") and tokens[0] not in OPS:
+            label = tokens[0][:-1]
+            if label in labels:
+                raise TealAssemblyError("duplicate label " + label)
+            labels[label] = len(instructions)
+            tokens = tokens[1:]
+        if not tokens:
+            continue
+
+        name, args = tokens[0], tokens[1:]
+
+        if name in ("int", "byte", "addr", "method"):
+            if name == "int":
+                if len(args) != 1:
+                    raise TealAssemblyError("int expects one argument: " + line)
+                kind, value = "int", _parse_uint(args[0])
+            elif name == "byte":
+                value, used = _parse_bytes(args, line)
+                if used != len(args):
+                    raise TealAssemblyError("byte expects one constant: " + line)
+                kind = "byte"
+            elif name == "addr":
+                if len(args) != 1:
+                    raise TealAssemblyError("addr expects one argument: " + line)
+                kind, value = "byte", _decode_address(args[0])
+            else:
+                if len(args) != 1 or not args[0].startswith('"'):
+                    raise TealAssemblyError("method expects a quoted signature: " + line)
+                kind, value = "byte", _method_selector(_parse_string_literal(args[0]).decode('utf-8'))
+            instructions.append(_Instruction("const", const=(kind, value), line=line, tokens=tokens))
+            if value not in const_values[kind]:
+                const_values[kind].append(value)
+            const_refs[kind].append(value)
+            continue
+
+        if name not in OPS:
+            raise TealAssemblyError("unknown opcode: " + line)
+        opcode, min_version, kinds = OPS[name]
+        if min_version > version:
+            raise TealAssemblyError("{} requires v{}: {}".format(name, min_version, line))
+
+        if kinds == ("label",):
+            if len(args) != 1:
+                raise TealAssemblyError("{} expects a label: {}".format(name, line))
+            instructions.append(_Instruction("branch", bytes([opcode]), label=args[0], line=line, tokens=tokens))
+        elif kinds == ("uints",):
+            values = [_parse_uint(a) for a in args]
+            explicit_blocks["int"] = values
+            instructions.append(_Instruction("raw", bytes([opcode]) + encode_uvarint(len(values))
+                                             + b"".join(encode_uvarint(v) for v in values), line=line, tokens=tokens))
+        elif kinds == ("bytes_list",):
+            values = []
+            rest = list(args)
+            while rest:
+                value, used = _parse_bytes(rest, line)
+                values.append(value)
+                rest = rest[used:]
+            explicit_blocks["byte"] = values
+            instructions.append(_Instruction("raw", bytes([opcode]) + encode_uvarint(len(values))
+                                             + b"".join(encode_uvarint(len(v)) + v for v in values), line=line, tokens=tokens))
+        elif kinds == ("uint",):
+            if len(args) != 1:
+                raise TealAssemblyError("pushint expects one argument: " + line)
+            instructions.append(_Instruction("raw", _push_bytes("int", _parse_uint(args[0])), line=line, tokens=tokens))
+        elif kinds == ("bytes",):
+            value, used = _parse_bytes(args, line)
+            if used != len(args):
+                raise TealAssemblyError("pushbytes expects one constant: " + line)
+            instructions.append(_Instruction("raw", _push_bytes("byte", value), line=line, tokens=tokens))
+        else:
+            instructions.append(_Instruction("raw", _encode_immediates(name, kinds, args, version, line), line=line, tokens=tokens))
+
+    optimize = version >= OPTIMIZE_CONSTANTS_VERSION
+    blocks = {}
+    for kind in ("int", "byte"):
+        if explicit_blocks[kind] is not None:
+            blocks[kind] = explicit_blocks[kind]
+        else:
+            blocks[kind] = _order_constants(const_values[kind], const_refs[kind], optimize)
+
+    # Resolve constant references now that the blocks are final
+    for ins in instructions:
+        if ins.kind != "const":
+            continue
+        kind, value = ins.const
+        block = blocks[kind]
+        if value in block:
+            ins.data = _const_ref_bytes(kind, block.index(value))
+        elif version >= 3:
+            ins.data = _push_bytes(kind, value)
+        else:
+            raise TealAssemblyError("constant missing from explicit block: " + ins.line)
+
+    header = bytearray(encode_uvarint(version))
+    if explicit_blocks["int"] is None and blocks["int"]:
+        header += b"\x20" + encode_uvarint(len(blocks["int"])) + b"".join(encode_uvarint(v) for v in blocks["int"])
+    if explicit_blocks["byte"] is None and blocks["byte"]:
+        header += b"\x26" + encode_uvarint(len(blocks["byte"])) + b"".join(encode_uvarint(len(v)) + v for v in blocks["byte"])
+
+    # Every instruction now has a known size, branches are opcode + 2 bytes
+    offsets = []
+    pc = len(header)
+    for ins in instructions:
+        offsets.append(pc)
+        pc += 3 if ins.kind == "branch" else len(ins.data)
+    end = pc
+
+    program = bytearray(header)
+    for ins, offset in zip(instructions, offsets):
+        if ins.kind != "branch":
+            program += ins.data
+            continue
+        if ins.label not in labels:
+            raise TealAssemblyError("reference to undefined label: " + ins.line)
+        target_index = labels[ins.label]
+        target = offsets[target_index] if target_index < len(offsets) else end
+        delta = target - (offset + 3)
+        if delta < 0 and version < 4:
+            raise TealAssemblyError("backward branch requires v4: " + ins.line)
+        if not -0x8000 <= delta <= 0x7fff:
+            raise TealAssemblyError("branch target out of range: " + ins.line)
+        program += ins.data + (delta & 0xffff).to_bytes(2, 'big')
+
+    listing = [
+        (list(ins.tokens), offset, (offsets[i + 1] if i + 1 < len(offsets) else end) - offset)
+        for i, (ins, offset) in enumerate(zip(instructions, offsets))
+    ]
+    header_ops = sum(1 for kind in ("int", "byte") if explicit_blocks[kind] is None and blocks[kind])
+    return Listing(bytes(program), version, len(header), header_ops, listing, dict(labels))
+
+
+def record(out_dir, paths, algod_client):
+    """Store algod's compile output for each TEAL file as <name>.teal + <name>.bin."""
+    os.makedirs(out_dir, exist_ok=True)
+    for path in paths:
+        with open(path, 'r') as f:
+            teal = f.read()
+        program = base64.b64decode(algod_client.compile(teal)['result'])
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(os.path.join(out_dir, stem + ".teal"), 'w') as f:
+            f.write(teal)
+        with open(os.path.join(out_dir, stem + ".bin"), 'wb') as f:
+            f.write(program)
+
+
+# Fixed parameters of the recorded contract programs
+FIXTURE_GOV_ASA_ID = 12345678
+FIXTURE_REG_APP_ID = 812342
+FIXTURE_NAMES = ("ans", "algorandnameservice")
+
+
+def contract_teal():
+    """{stem: TEAL} of the DAO, registry and name record programs recorded as fixtures."""
+    from algosdk import logic
+    from .build import build_targets, build_teal, ZERO_ADDRESS
+    from .dot_algo_name_record import CHARSET_CHECKS
+    from .methods import DISPATCH_MODES
+
+    targets = []
+    for dispatch in DISPATCH_MODES:
+        for artifact_name, program_fn, args, mode, version in build_targets(
+                FIXTURE_GOV_ASA_ID, logic.get_application_address(FIXTURE_REG_APP_ID), dispatch=dispatch):
+            if artifact_name.endswith("_approval"):
+                targets.append((artifact_name + "_" + dispatch, program_fn, args, mode, version))
+    for charset_check in CHARSET_CHECKS:
+        for artifact_name, program_fn, args, mode, version in build_targets(
+                FIXTURE_GOV_ASA_ID, ZERO_ADDRESS, FIXTURE_REG_APP_ID, FIXTURE_NAMES, charset_check=charset_check):
+            if artifact_name.startswith("name_record_"):
+                targets.append((artifact_name + "_" + charset_check, program_fn, args, mode, version))
+    return dict(zip((target[0] for target in targets), build_teal(targets, processes=1)))
+
+
+def record_contracts(out_dir, algod_client):
+    """Store algod's compile output for every program of contract_teal()."""
+    os.makedirs(out_dir, exist_ok=True)
+    for stem, teal in contract_teal().items():
+        program = base64.b64decode(algod_client.compile(teal)['result'])
+        with open(os.path.join(out_dir, stem + ".teal"), 'w') as f:
+            f.write(teal)
+        with open(os.path.join(out_dir, stem + ".bin"), 'wb') as f:
+            f.write(program)
+
+
+def check(recorded_dir=FIXTURES_DIR):
+    """Re-assemble every recorded TEAL file, return (checked count, names that differ from algod)."""
+    mismatches = []
+    checked = 0
+    for name in sorted(os.listdir(recorded_dir)):
+        if not name.endswith(".teal"):
+            continue
+        stem = name[:-len(".teal")]
+        bin_path = os.path.join(recorded_dir, stem + ".bin")
+        if not os.path.exists(bin_path):
+            continue
+        with open(os.path.join(recorded_dir, name), 'r') as f:
+            teal = f.read()
+        with open(bin_path, 'rb') as f:
+            expected = f.read()
+        checked += 1
+        try:
+            if assemble(teal) != expected:
+                mismatches.append(stem)
+        except TealAssemblyError as err:
+            mismatches.append("{} ({})".format(stem, err))
+    return checked, mismatches
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m contracts.teal_assembler")
+    parser.add_argument("--record", metavar="DIR", nargs="?", const=FIXTURES_DIR)
+    parser.add_argument("--check", metavar="DIR", nargs="?", const=FIXTURES_DIR)
+    parser.add_argument("--algod-address")
+    parser.add_argument("--algod-token", default="")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        if not args.algod_address:
+            parser.error("--record requires --algod-address")
+        from algosdk.v2client import algod
+        algod_client = algod.AlgodClient(args.algod_token, args.algod_address)
+        if args.files:
+            record(args.record, args.files, algod_client)
+        else:
+            record_contracts(args.record, algod_client)
+        return 0
+    if args.check:
+        if not os.path.isdir(args.check):
+            print("no recorded algod output in {}, record it with --record".format(args.check))
+            return 1
+        checked, mismatches = check(args.check)
+        for stem in mismatches:
+            print("MISMATCH " + stem)
+        if not checked:
+            print("no recorded algod output in {}, record it with --record".format(args.check))
+            return 1
+        print("{} of {} programs match algod".format(checked - len(mismatches), checked))
+        return 1 if mismatches else 0
+
+    for path in args.files:
+        with open(path, 'r') as f:
+            sys.stdout.write(base64.b64encode(assemble(f.read())).decode() + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -52,7 +52,7 @@ class Env(object):
 	def dao_app_id(self):
 		return self._DAO_APP_ID
 
-def AddRandomVotesFromRandomAccounts(env: Env, num: int64):
+def AddRandomVotesFromRandomAccounts(env: Env, num: int64, proposal_id: int64):
 
 	print("Generating {} random accounts".format(num))
 
@@ -66,8 +66,8 @@ def AddRandomVotesFromRandomAccounts(env: Env, num: int64):
 		FundNewAccount(env.my_algod_client, addr_new_acc, 1030000, env.funding_acct_mnemonic)
 		ASAOptIn(env.my_algod_client, privkey_new_acc, env.gov_asa_id)
 		TransferASA(env.my_algod_client, 200000, privkey_funding_acc, addr_new_acc, env.gov_asa_id)
-		#DAORegisterVote(env.my_algod_client, random.choice(choices_vote), privkey_new_acc, env.gov_asa_id, env.dao_app_id)
-		DAORegisterVote(env.my_algod_client, "yes", privkey_new_acc, env.gov_asa_id, env.dao_app_id)
+		#DAORegisterVote(env.my_algod_client, random.choice(choices_vote), privkey_new_acc, env.gov_asa_id, env.dao_app_id, proposal_id)
+		DAORegisterVote(env.my_algod_client, "yes", privkey_new_acc, env.gov_asa_id, env.dao_app_id, proposal_id)
 		generated_accts.append(privkey_new_acc)
 	
 	return generated_accts
@@ -96,22 +96,22 @@ def TestSocialProposal(env: Env):
 
 	#DAO_APP_ID=86039171
 	print("Attempting to add a social proposal")
-	DAOAddProposalSocial(env.my_algod_client,pvk_new_acct, 1, env.gov_asa_id, 20000000, env.dao_app_id)
+	proposal_id = DAOAddProposalSocial(env.my_algod_client,pvk_new_acct, 1, env.gov_asa_id, 20000000, env.dao_app_id)
 	print_asset_holding(env.my_algod_client, new_acct_addr, env.gov_asa_id)
 	print("Successfully added social proposal")
 	print("--------------------------------------------------------------------")
 
 	print("Funding acct with some more ALGOs to meet raised min balance")
 	print("Attempting to vote on the social proposal")
-	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id)
+	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id, proposal_id)
 	print("Successfully registered vote")
 	print("--------------------------------------------------------------------")
 
-	AddRandomVotesFromRandomAccounts(env, 2)
+	AddRandomVotesFromRandomAccounts(env, 2, proposal_id)
 	#time.sleep(100)
 
 	print("Declaring Result")
-	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, 812342)
+	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, 812342, proposal_id)
 	print("Vote Declared successfully")
 	print("--------------------------------------------------------------------")
 
@@ -167,7 +167,7 @@ def TestFundingProposal(env: Env):
 	print("--------------------------------------------------------------------")
 	#DAO_APP_ID=86039171
 	print("Attempting to add a Funding proposal")
-	DAOAddProposalFunding(
+	proposal_id = DAOAddProposalFunding(
 		env.my_algod_client,
 		pvk_new_acct,
 		1, 
@@ -175,24 +175,22 @@ def TestFundingProposal(env: Env):
 		20000000,
 		env.dao_app_id,
 		dot_algo_reg_app_id,
-		100000,
-		100000,
-		new_acct_addr
+		[(new_acct_addr, 100000, 100000)]
 	)
 	print_asset_holding(env.my_algod_client, new_acct_addr, env.gov_asa_id)
 	print("Successfully added funding proposal")
 	print("--------------------------------------------------------------------")
 
 	print("Attempting to vote on the funding proposal")
-	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id)
+	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id, proposal_id)
 	print("Successfully registered vote")
 	print("--------------------------------------------------------------------")
 
-	AddRandomVotesFromRandomAccounts(env, 1)
+	AddRandomVotesFromRandomAccounts(env, 1, proposal_id)
 	#time.sleep(100)
 
 	print("Declaring Result")
-	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, dot_algo_reg_app_id)
+	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, dot_algo_reg_app_id, proposal_id, [(new_acct_addr, 100000, 100000)])
 	print("Vote Declared successfully")
 	print("--------------------------------------------------------------------")
 
@@ -247,7 +245,7 @@ def TestUpdateRegProposal(env: Env):
 	print("--------------------------------------------------------------------")
 	#DAO_APP_ID=86039171
 	print("Attempting to add an Update Registry proposal")
-	DAOAddProposalUpdateReg(
+	proposal_id = DAOAddProposalUpdateReg(
 		env.my_algod_client,
 		pvk_new_acct,
 		1, 
@@ -262,15 +260,15 @@ def TestUpdateRegProposal(env: Env):
 	print("--------------------------------------------------------------------")
 
 	print("Attempting to vote on the update reg proposal")
-	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id)
+	DAORegisterVote(env.my_algod_client, "yes", pvk_new_acct, env.gov_asa_id, env.dao_app_id, proposal_id)
 	print("Successfully registered vote")
 	print("--------------------------------------------------------------------")
 
-	AddRandomVotesFromRandomAccounts(env, 1)
+	AddRandomVotesFromRandomAccounts(env, 1, proposal_id)
 	#time.sleep(100)
 
 	print("Declaring Result")
-	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, dot_algo_reg_app_id)
+	DAODeclareResult(env.my_algod_client, pvk_new_acct, env.dao_app_id, env.gov_asa_id, dot_algo_reg_app_id, proposal_id)
 	print("Vote Declared successfully")
 	print("--------------------------------------------------------------------")
 
@@ -283,4 +281,7 @@ if __name__ == "__main__":
 
 	TestFundingProposal(ans_dao_env)	
 
-	TestUpdateRegProposal(ans_dao_env)
\ No newline at end of file
+	TestUpdateRegProposal(ans_dao_env)
+
+	cache = params_cache(ans_dao_env.my_algod_client)
+	print("Suggested params fetched {} times, {} algod calls saved".format(cache.misses, cache.saved_calls))
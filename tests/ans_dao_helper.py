@@ -40,12 +40,22 @@ sys.path.insert(0,'..')
 #from contracts.dao_app_approval import approval_program
 from contracts.dao_app_approval import approval_program
 from contracts.dao_app_clear import clear_state_program
+from contracts.methods import DISPATCH_NAME, dao_call
+from contracts.params_cache import params_cache, suggested_params
+from contracts import confirmation
+from contracts import http_pool
+from contracts import client_pool
+from contracts.proposals import created_proposal_id, decode_proposals, encode_payouts, program_chunks, program_hash, APPROVAL_PROGRAM, CLEAR_PROGRAM
 
 import base64
 import datetime,time
 # Import PureStake API
 import mysecrets
 
+# Method routing the DAO was deployed with. It may differ from
+# anshelper.REGISTRY_DISPATCH, which its calls into the registry follow.
+DAO_DISPATCH = DISPATCH_NAME
+
 
 def SetupClient(network):
 
@@ -53,6 +63,7 @@ def SetupClient(network):
 		# Local sandbox node 
 		algod_address = "http://localhost:4001"
 		algod_token = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+		headers = None
 
 	elif(network=="purestake"):
 		# Purestake conn
@@ -62,10 +73,18 @@ def SetupClient(network):
 			"X-API-Key": mysecrets.MY_PURESTAKE_TOKEN
 		}
 	
+	elif(network=="testnet"):
+		# PureStake and AlgoNode, hedged reads and failover between them
+		return client_pool.algod_pool([
+			(mysecrets.MY_PURESTAKE_TOKEN, "https://testnet-algorand.api.purestake.io/ps2", {"X-API-Key": mysecrets.MY_PURESTAKE_TOKEN}),
+			("", "https://testnet-api.algonode.cloud", None),
+		])
+	
 	else:
 		raise ValueError
 
-	algod_client=algod.AlgodClient(algod_token, algod_address, headers=headers)
+	# One keep-alive client per endpoint, shared by every helper
+	algod_client=http_pool.algod_client(algod_token, algod_address, headers=headers)
 	return algod_client
 
 def SetupIndexer(network):
@@ -74,7 +93,12 @@ def SetupIndexer(network):
 		headers = {
 			'X-API-key' : mysecrets.MY_PURESTAKE_TOKEN,
 		}
-		algod_indexer=indexer.IndexerClient("", algod_address, headers)
+		algod_indexer=http_pool.indexer_client("", algod_address, headers)
+	elif(network=="testnet"):
+		algod_indexer=client_pool.indexer_pool([
+			("", "https://testnet-algorand.api.purestake.io/idx2", {"X-API-Key": mysecrets.MY_PURESTAKE_TOKEN}),
+			("", "https://testnet-idx.algonode.cloud", None),
+		])
 	
 	return algod_indexer
 
@@ -103,7 +127,7 @@ def FundNewAccount(algod_client, receiver, amount, funding_acct_mnemonic):
 	sender_private_key=mnemonic.to_private_key(funding_acct_mnemonic)
 	sender=account.address_from_private_key(sender_private_key)
 
-	unsigned_txn = transaction.PaymentTxn(sender, algod_client.suggested_params(), receiver,amount, None)
+	unsigned_txn = transaction.PaymentTxn(sender, suggested_params(algod_client), receiver,amount, None)
 	signed_txn = unsigned_txn.sign(sender_private_key)
 
 	#submit transaction
@@ -128,7 +152,7 @@ def DeployANSToken(algod_client, asa_owner_mnemonic):
 
 	txn = transaction.AssetConfigTxn(
 		sender=sender_asa_deploy,
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		total=20000000000, #200M.00
 		default_frozen=False,
 		unit_name="ANS",
@@ -154,8 +178,6 @@ def DeployANSToken(algod_client, asa_owner_mnemonic):
 		return
 
 def IsOptedInASA(algod_client_in, account, asaid):
-	params = algod_client_in.suggested_params()
-	
 	account_info = algod_client_in.account_info(account)
 	holding = False
 	idx = 0
@@ -176,7 +198,7 @@ def ASAOptIn(algod_client_in, pk_account, asaid):
 		# Use the AssetTransferTxn class to transfer assets and opt-in
 		txn = transaction.AssetOptInTxn(
 			sender=sender_asa_optin,
-			sp=algod_client_in.suggested_params(),
+			sp=suggested_params(algod_client_in),
 			index=asaid,
 			rekey_to=None)
 		stxn = txn.sign(pk_account)
@@ -197,7 +219,7 @@ def TransferASA(algod_client_in, amount, pk_sender, acct_receiver, asaid):
 	# Use the AssetTransferTxn class to transfer assets and opt-in
 	txn = transaction.AssetTransferTxn(
 		sender=acct_sender,
-		sp=algod_client_in.suggested_params(),
+		sp=suggested_params(algod_client_in),
 		receiver=acct_receiver,
 		amt=amount,
 		index=asaid,
@@ -274,16 +296,11 @@ def DeployANSDAO(algod_client: algod,
 		"https://ansdao.org".encode('utf-8') #url
 	]
 	
-	compiled_approval_program = compileTeal(approval_program(gov_asaid), Mode.Application, version=6)
-	compiled_clear_state_program = compileTeal(clear_state_program(), Mode.Application,version=6)
-
-	
-	
 	#ans_approval_program = compile_program(algod_client, import_teal_source_code_as_binary('dao_app_approval.teal'))
 	#ans_clear_state_program = compile_program(algod_client, import_teal_source_code_as_binary('dao_app_clear_state.teal'))
 
-	ans_approval_program = compile_program(algod_client, str.encode(compiled_approval_program))
-	ans_clear_state_program = compile_program(algod_client,str.encode(compiled_clear_state_program))
+	ans_approval_program = anshelper.build_program(algod_client, approval_program, gov_asaid, DAO_DISPATCH, anshelper.REGISTRY_DISPATCH)
+	ans_clear_state_program = anshelper.build_program(algod_client, clear_state_program)
 
 	h = hashlib.new('sha256')
 	h.update(ans_approval_program)
@@ -291,14 +308,15 @@ def DeployANSDAO(algod_client: algod,
 	
 	txn = transaction.ApplicationCreateTxn(
 		sender=acct_owner,
-		sp=algod_client.suggested_params(), 
+		sp=suggested_params(algod_client), 
 		on_complete=on_complete,
 		approval_program=ans_approval_program, 
 		clear_program=ans_clear_state_program,
 		global_schema=global_schema,
 		local_schema=local_schema,
 		app_args=appargs,
-		foreign_assets=[gov_asaid]
+		foreign_assets=[gov_asaid],
+		extra_pages=(len(ans_approval_program) + len(ans_clear_state_program) - 1) // 2048
 	)
 	
 	# sign transaction
@@ -322,11 +340,11 @@ def DeployANSDAO(algod_client: algod,
 
 def DAOOptInToGOVASA(algod_client, pk_sender, gov_asaid, dao_app_id):
 	acct_sender=account.address_from_private_key(pk_sender)
-	appargs = ["opt_in_to_gov_token"]
+	appargs = dao_call("opt_in_to_gov_token", dispatch=DAO_DISPATCH)
 
 	txn = transaction.ApplicationNoOpTxn(
 		sender=acct_sender,
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		index=dao_app_id,
 		foreign_assets=[gov_asaid],
 		app_args=appargs
@@ -354,7 +372,7 @@ def DAOAddProposalSocial(
 
 	deposit_txn = transaction.AssetTransferTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		amt=deposit_amt,
 		receiver=logic.get_application_address(dao_app_id),
 		index=gov_asaid
@@ -366,14 +384,9 @@ def DAOAddProposalSocial(
 
 	txn_add_proposal = transaction.ApplicationNoOpTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		index=dao_app_id,
-		app_args=[
-			"add_proposal".encode("utf-8"),
-			"social".encode("utf-8"),
-			duration.to_bytes(8, 'big'),
-			"https://github.com/someproposal"
-		]
+		app_args=dao_call("add_proposal", "social", duration, "https://github.com/someproposal", dispatch=DAO_DISPATCH)
 		#rekey_to=constants.ZERO_ADDRESS
 	)
 
@@ -389,7 +402,7 @@ def DAOAddProposalSocial(
 	try:
 		txn_id = Grp_txns_signed[1].transaction.get_txid()
 		algod_client.send_transactions(Grp_txns_signed)
-		wait_for_confirmation(algod_client, txn_id)
+		return created_proposal_id(wait_for_confirmation(algod_client, txn_id))
 	except Exception as err:
 		print(err)
 
@@ -401,16 +414,14 @@ def DAOAddProposalFunding(
 	deposit_amt: int64,
 	dao_app_id: int64,
 	reg_app_id: int64,
-	amt_algos: int64,
-	amt_ans: int64,
-	addr_recipient: int64
+	payouts: list
 ):
 
 	Grp_txns_unsign = []
 
 	deposit_txn = transaction.AssetTransferTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		amt=deposit_amt,
 		receiver=logic.get_application_address(dao_app_id),
 		index=gov_asaid,
@@ -420,18 +431,14 @@ def DAOAddProposalFunding(
 
 	txn_add_proposal = transaction.ApplicationNoOpTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		index=dao_app_id,
 		foreign_apps=[reg_app_id],
-		accounts=[addr_recipient, logic.get_application_address(reg_app_id)],
-		app_args=[
-			"add_proposal".encode("utf-8"),
-			"funding".encode("utf-8"),
-			duration.to_bytes(8, 'big'),
-			"https://github.com/someproposal".encode("utf-8"),
-			amt_algos.to_bytes(8, 'big'),
-			amt_ans.to_bytes(8, 'big')
-		]
+		accounts=[logic.get_application_address(reg_app_id)],
+		app_args=dao_call(
+			"add_proposal", "funding", duration, "https://github.com/someproposal", PackPayouts(payouts),
+			dispatch=DAO_DISPATCH
+		)
 		#rekey_to=constants.ZERO_ADDRESS
 	)
 	
@@ -446,7 +453,7 @@ def DAOAddProposalFunding(
 	try:
 		txn_id = Grp_txns_signed[1].transaction.get_txid()
 		algod_client.send_transactions(Grp_txns_signed)
-		wait_for_confirmation(algod_client, txn_id)
+		return created_proposal_id(wait_for_confirmation(algod_client, txn_id))
 	except Exception as err:
 		print(err)
 
@@ -465,7 +472,7 @@ def DAOAddProposalUpdateReg(
 
 	deposit_txn = transaction.AssetTransferTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		amt=deposit_amt,
 		receiver=logic.get_application_address(dao_app_id),
 		index=gov_asaid,
@@ -473,27 +480,20 @@ def DAOAddProposalUpdateReg(
 	
 	Grp_txns_unsign.append(deposit_txn)
 	
-	compiled_approval_program = anshelper.compileTeal(anshelper.approval_program(logic.get_application_address(dao_app_id)), Mode.Application,version=6)
-	compiled_clear_state_program = anshelper.compileTeal(anshelper.clear_state_program(), Mode.Application,version=6)
-
-	ans_app_program = anshelper.compile_program(algod_client, str.encode(compiled_approval_program))
-	ans_clear_program = anshelper.compile_program(algod_client, str.encode(compiled_clear_state_program))
+	ans_app_program = anshelper.build_program(algod_client, anshelper.approval_program, logic.get_application_address(dao_app_id), anshelper.REGISTRY_DISPATCH)
+	ans_clear_program = anshelper.build_program(algod_client, anshelper.clear_state_program)
 
 	txn_add_proposal = transaction.ApplicationNoOpTxn(
 		sender=account.address_from_private_key(pk_sender),
-		sp=algod_client.suggested_params(),
+		sp=suggested_params(algod_client),
 		index=dao_app_id,
 		foreign_apps=[reg_app_id],
 		accounts=[addr_recipient, logic.get_application_address(reg_app_id)],
-		app_args=[
-			"add_proposal".encode("utf-8"),
-			"updatereg".encode("utf-8"),
-			duration.to_bytes(8, 'big'),
-			"https://github.com/someproposal".encode("utf-8"),
-			reg_app_id.to_bytes(8, 'big'),
-			ans_app_program,
-			ans_clear_program
-		],
+		app_args=dao_call(
+			"add_proposal", "updatereg", duration, "https://github.com/someproposal", reg_app_id,
+			program_hash(ans_app_program), program_hash(ans_clear_program),
+			dispatch=DAO_DISPATCH
+		),
 		#rekey_to=constants.ZERO_ADDRESS
 	)
 	
@@ -508,45 +508,53 @@ def DAOAddProposalUpdateReg(
 	try:
 		txn_id = Grp_txns_signed[1].transaction.get_txid()
 		algod_client.send_transactions(Grp_txns_signed)
-		wait_for_confirmation(algod_client, txn_id)
+		return created_proposal_id(wait_for_confirmation(algod_client, txn_id))
 	except Exception as err:
 		print(err)
 
+def IsOptedInToApp(algod_client: algod, address: str, app_id: int64):
+	for local_state in algod_client.account_info(address).get('apps-local-state', []):
+		if(local_state['id'] == app_id):
+			return True
+	return False
+
+# Votes in a single round, opting the voter in to the DAO in the same
+# group when they are not opted in yet
 def DAORegisterVote(
 	algod_client: algod,
 	choice: str,
 	pvk_sender: str ,
 	gov_asaid: int64, 
-	dao_app_id: int64):
+	dao_app_id: int64,
+	proposal_id: int64):
 
-	txn_dao_opt_in = transaction.ApplicationOptInTxn(
-		sender=account.address_from_private_key(pvk_sender),
-		sp=algod_client.suggested_params(),
-		index=dao_app_id
-	)
+	addr_sender = account.address_from_private_key(pvk_sender)
+	sp = suggested_params(algod_client)
+	Grp_txns_unsign = []
 
-	try:
-		txn_id = txn_dao_opt_in.get_txid()
-		algod_client.send_transaction(txn_dao_opt_in.sign(pvk_sender))
-		wait_for_confirmation(algod_client, txn_id)
-	except Exception as err:
-		print(err)
+	if(not IsOptedInToApp(algod_client, addr_sender, dao_app_id)):
+		Grp_txns_unsign.append(transaction.ApplicationOptInTxn(
+			sender=addr_sender,
+			sp=sp,
+			index=dao_app_id
+		))
 
-	txn_register_vote = transaction.ApplicationNoOpTxn(
-		sender=account.address_from_private_key(pvk_sender),
-		sp=algod_client.suggested_params(),
+	Grp_txns_unsign.append(transaction.ApplicationNoOpTxn(
+		sender=addr_sender,
+		sp=sp,
 		index=dao_app_id,
-		app_args=[
-			"register_vote".encode("utf-8"),
-			choice.encode("utf-8"),
-		],
+		app_args=dao_call("register_vote", proposal_id, choice, dispatch=DAO_DISPATCH),
 		foreign_assets=[gov_asaid],
 		rekey_to=None
-	)
+	))
+
+	if(len(Grp_txns_unsign) > 1):
+		transaction.assign_group_id(Grp_txns_unsign)
+	Grp_txns_signed = [txn.sign(pvk_sender) for txn in Grp_txns_unsign]
 
 	try:
-		txn_id = txn_register_vote.get_txid()
-		algod_client.send_transaction(txn_register_vote.sign(pvk_sender))
+		txn_id = Grp_txns_signed[-1].transaction.get_txid()
+		algod_client.send_transactions(Grp_txns_signed)
 		wait_for_confirmation(algod_client, txn_id)
 	except Exception as err:
 		print(err)
@@ -556,42 +564,63 @@ def DAODeclareResult(
 	pvk_sender: str,
 	dao_app_id: int64,
 	gov_asa_id: int64,
-	reg_app_id: int64
+	reg_app_id: int64,
+	proposal_id: int64,
+	payouts: list = None
 	):
 
-	compiled_approval_program = anshelper.compileTeal(anshelper.approval_program(logic.get_application_address(dao_app_id)), Mode.Application,version=6)
-	compiled_clear_state_program = anshelper.compileTeal(anshelper.clear_state_program(), Mode.Application,version=6)
-
-	ans_app_program = anshelper.compile_program(algod_client, str.encode(compiled_approval_program))
-	ans_clear_program = anshelper.compile_program(algod_client, str.encode(compiled_clear_state_program))
+	addr_sender = account.address_from_private_key(pvk_sender)
+	sp = suggested_params(algod_client)
+	Grp_txns_unsign = []
 
-	
-	txn_declare_result = transaction.ApplicationNoOpTxn(
-		sender=account.address_from_private_key(pvk_sender),
-		sp=algod_client.suggested_params(),
+	# An updatereg proposal gets the registry programs staged in chunks ahead
+	# of declare_result in the same group
+	if(DAOGetProposals(algod_client, dao_app_id)[proposal_id]['type'] == "updatereg"):
+		ans_app_program = anshelper.build_program(algod_client, anshelper.approval_program, logic.get_application_address(dao_app_id), anshelper.REGISTRY_DISPATCH)
+		ans_clear_program = anshelper.build_program(algod_client, anshelper.clear_state_program)
+		for kind, program in ((APPROVAL_PROGRAM, ans_app_program), (CLEAR_PROGRAM, ans_clear_program)):
+			for chunk in program_chunks(program):
+				Grp_txns_unsign.append(transaction.ApplicationNoOpTxn(
+					sender=addr_sender,
+					sp=sp,
+					index=dao_app_id,
+					app_args=dao_call("stage_program", kind, chunk, dispatch=DAO_DISPATCH)
+				))
+
+	Grp_txns_unsign.append(transaction.ApplicationNoOpTxn(
+		sender=addr_sender,
+		sp=sp,
 		index=dao_app_id,
 		foreign_apps= [reg_app_id],
-		app_args=[
-			"declare_result".encode("utf-8"),
-			ans_app_program,
-			ans_clear_program
-		],
+		accounts=[addr for addr, _, _ in payouts or []],
+		app_args=dao_call("declare_result", proposal_id, PackPayouts(payouts) if payouts else b"", dispatch=DAO_DISPATCH),
 		foreign_assets=[gov_asa_id]
-	)
+	))
+
+	if(len(Grp_txns_unsign) > 1):
+		transaction.assign_group_id(Grp_txns_unsign)
+	Grp_txns_signed = [txn.sign(pvk_sender) for txn in Grp_txns_unsign]
 
 	try:
-		txnid = txn_declare_result.get_txid()
-		algod_client.send_transaction(txn_declare_result.sign(pvk_sender))
+		txnid = Grp_txns_signed[-1].transaction.get_txid()
+		algod_client.send_transactions(Grp_txns_signed)
 		wait_for_confirmation(algod_client, txnid)
 	except Exception as err:
 		print(err)
 
+# packed funding entries from (recipient address, algo amount, ANS amount)
+def PackPayouts(payouts: list):
+	return encode_payouts([(encoding.decode_address(addr), amt_algos, amt_ans) for addr, amt_algos, amt_ans in payouts])
 
+# open proposals of the DAO by id
+def DAOGetProposals(algod_client: algod, dao_app_id: int64):
+	app_info = algod_client.application_info(dao_app_id)
+	return decode_proposals(app_info['params'].get('global-state', []))
 
-# helper function to compile program source
+# helper function to compile program source with algod, or with the offline
+# assembler with anshelper.OFFLINE_ASSEMBLY, see anshelper.compile_program
 def compile_program(algod_client: algod, source_code: str) :
-	compile_response = algod_client.compile(source_code.decode('utf-8'))
-	return base64.b64decode(compile_response['result'])
+	return anshelper.compile_program(algod_client, source_code)
 
 def import_teal_source_code_as_binary(file_name):
 	with open(file_name, 'r') as f:
@@ -600,14 +629,12 @@ def import_teal_source_code_as_binary(file_name):
 
 # helper function that waits for a given txid to be confirmed by the network
 def wait_for_confirmation(algod_client,txid) :
-	last_round = algod_client.status().get('last-round')
-	txinfo = algod_client.pending_transaction_info(txid)
-	while not (txinfo.get('confirmed-round') and txinfo.get('confirmed-round') > 0):
-		print("Waiting for txn confirmation...")
-		last_round += 1
-		algod_client.status_after_block(last_round)
-		txinfo = algod_client.pending_transaction_info(txid)
+	txinfo = wait_for_confirmations(algod_client, [txid])[0]
 	#print("Transaction {} confirmed in round {}.".format(txid, txinfo.get('confirmed-round')))
 	print("Txn confirmed in round {}".format(txinfo.get('confirmed-round')))
 	return txinfo
+
+# pending transaction info of several txids, all waited for together
+def wait_for_confirmations(algod_client, txids):
+	return confirmation.wait_for_confirmations(algod_client, txids, params_cache(algod_client).observe_round)
 	
@@ -33,11 +33,33 @@ sys.path.append('../')
 
 from contracts.dot_algo_registry import approval_program, clear_state_program
 from contracts.dot_algo_name_record import ValidateRecord
+from contracts.build_cache import default_cache as build_cache
+from contracts.teal_assembler import assemble, TealAssemblyError
+from contracts.name_record_template import name_record_template
+from contracts.dot_algo_name_record import CHARSET_CHECK_RANGE
+from contracts import constants
+from contracts.methods import DISPATCH_NAME, REGISTRY_METHODS, registry_call
+from contracts.name_records import decode_local_state
+from contracts.params_cache import params_cache, suggested_params
+from contracts import confirmation
+from contracts import http_pool
+from contracts import client_pool
 import base64
 import datetime,time
 # Import PureStake API
 import mysecrets
 
+# Method routing the registry was deployed with, see contracts.methods
+REGISTRY_DISPATCH = DISPATCH_NAME
+# Name record charset check the registry's names were created with, every
+# name's escrow address depends on it, see contracts.dot_algo_name_record
+REGISTRY_CHARSET_CHECK = CHARSET_CHECK_RANGE
+# Assemble TEAL in-process instead of with algod's compile, only once
+# `python3 -m contracts.teal_assembler --check` passes on recorded algod
+# output, every name's escrow address depends on the bytecode
+OFFLINE_ASSEMBLY = False
+MAX_PROPERTIES_PER_CALL = REGISTRY_METHODS["update_properties"].repeat
+
 
 def SetupClient(network):
 
@@ -45,6 +67,7 @@ def SetupClient(network):
         # Local sandbox node 
         algod_address = "http://localhost:4001"
         algod_token = "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"
+        headers = None
 
     elif(network=="purestake"):
         # Purestake conn
@@ -54,10 +77,18 @@ def SetupClient(network):
             "X-API-Key": mysecrets.MY_PURESTAKE_TOKEN
         }
     
+    elif(network=="testnet"):
+        # PureStake and AlgoNode, hedged reads and failover between them
+        return client_pool.algod_pool([
+            (mysecrets.MY_PURESTAKE_TOKEN, "https://testnet-algorand.api.purestake.io/ps2", {"X-API-Key": mysecrets.MY_PURESTAKE_TOKEN}),
+            ("", "https://testnet-api.algonode.cloud", None),
+        ])
+    
     else:
         raise ValueError
 
-    algod_client=algod.AlgodClient(algod_token, algod_address, headers=headers)
+    # One keep-alive client per endpoint, shared by every helper
+    algod_client=http_pool.algod_client(algod_token, algod_address, headers=headers)
     return algod_client
 
 def SetupIndexer(network):
@@ -66,7 +97,12 @@ def SetupIndexer(network):
         headers = {
             'X-API-key' : 'iG4m46pAcU5ws8WYhgYPu1rywUbfYT2DaAfSs9Tv',
         }
-        algod_indexer=indexer.IndexerClient("", algod_address, headers)
+        algod_indexer=http_pool.indexer_client("", algod_address, headers)
+    elif(network=="testnet"):
+        algod_indexer=client_pool.indexer_pool([
+            ("", "https://testnet-algorand.api.purestake.io/idx2", {"X-API-Key": mysecrets.MY_PURESTAKE_TOKEN}),
+            ("", "https://testnet-idx.algonode.cloud", None),
+        ])
     
     return algod_indexer
 
@@ -95,7 +131,7 @@ def FundNewAccount(algod_client, receiver, amount, funding_acct_mnemonic):
     sender_private_key=mnemonic.to_private_key(funding_acct_mnemonic)
     sender=account.address_from_private_key(sender_private_key)
 
-    unsigned_txn = transaction.PaymentTxn(sender, algod_client.suggested_params(), receiver,amount, None)
+    unsigned_txn = transaction.PaymentTxn(sender, suggested_params(algod_client), receiver,amount, None)
     signed_txn = unsigned_txn.sign(sender_private_key)
 
     #submit transaction
@@ -131,21 +167,20 @@ def DeployDotAlgoReg(
 
     on_complete = transaction.OnComplete.NoOpOC.real
 
-    compiled_approval_program = compileTeal(approval_program(registry_controller), Mode.Application,version=6)
-    compiled_clear_state_program = compileTeal(clear_state_program(), Mode.Application,version=6)
-
-    ans_approval_program = compile_program(algod_client, str.encode(compiled_approval_program))
-    ans_clear_state_program = compile_program(algod_client, str.encode(compiled_clear_state_program))
+    ans_approval_program = build_program(algod_client, approval_program, registry_controller, REGISTRY_DISPATCH)
+    ans_clear_state_program = build_program(algod_client, clear_state_program)
 
     txn = transaction.ApplicationCreateTxn(
         sender=sender,
-        sp=algod_client.suggested_params(),
+        sp=suggested_params(algod_client),
         on_complete=on_complete,
         approval_program=ans_approval_program,
         clear_program=ans_clear_state_program,
         global_schema=global_schema,
         local_schema=local_schema,
-        accounts=[registry_controller]
+        accounts=[registry_controller],
+        # the approval program outgrew a single 2KB page
+        extra_pages=(len(ans_approval_program) + len(ans_clear_state_program) - 1) // 2048
     )
 
     # sign transaction
@@ -168,13 +203,17 @@ def DeployDotAlgoReg(
     return app_id
 
 def prep_name_record_logic_sig(algod_client, name, reg_app_id):
-    reg_escrow_acct = logic.get_application_address(reg_app_id)
-    logic_sig_teal = compileTeal(ValidateRecord(name,reg_app_id,reg_escrow_acct), Mode.Signature, version=4)
-    validate_name_record_program = compile_program(algod_client, str.encode(logic_sig_teal))
+    # The name record program is compiled once per registry, the name is spliced in
+    validate_name_record_program = name_record_template(
+        reg_app_id, REGISTRY_CHARSET_CHECK, REGISTRY_DISPATCH, teal_assembler(algod_client)).program(name)
     lsig = LogicSig(validate_name_record_program)
 
     return lsig
 
+def get_name_record_address(algod_client, name, reg_app_id):
+    return name_record_template(
+        reg_app_id, REGISTRY_CHARSET_CHECK, REGISTRY_DISPATCH, teal_assembler(algod_client)).address(name)
+
 def get_name_price(name):
     #TODO: Find out max length of name, is 1 char = 1 byte?
     assert(len(name)>=3 and len(name)<=64)
@@ -193,27 +232,23 @@ def prep_name_reg_gtxn(sender, name, validity, reg_app_id, algod_client):
 
     # 1. PaymentTxn to Smart Contract
     reg_escrow_acct = logic.get_application_address(reg_app_id)
-    pmnt_txn_unsign = transaction.PaymentTxn(sender, algod_client.suggested_params(), reg_escrow_acct, get_name_price(name), None)
+    pmnt_txn_unsign = transaction.PaymentTxn(sender, suggested_params(algod_client), reg_escrow_acct, get_name_price(name), None)
     Grp_txns_unsign.append(pmnt_txn_unsign)
 
 
     # 2. Funding lsig
     lsig = prep_name_record_logic_sig(algod_client, name, reg_app_id)
     # Min amount necessary: 915000
-    fund_lsig_txn_unsign = transaction.PaymentTxn(sender, algod_client.suggested_params(), lsig.address(), 915000, None, None)
+    fund_lsig_txn_unsign = transaction.PaymentTxn(sender, suggested_params(algod_client), lsig.address(), 915000, None, None)
     Grp_txns_unsign.append(fund_lsig_txn_unsign)
 
     # 3. Optin to registry
-    optin_txn_unsign = transaction.ApplicationOptInTxn(lsig.address(), algod_client.suggested_params(), reg_app_id)
+    optin_txn_unsign = transaction.ApplicationOptInTxn(lsig.address(), suggested_params(algod_client), reg_app_id)
     Grp_txns_unsign.append(optin_txn_unsign)
 
     # 4. Write name and owner's address in local storage
-    txn_args = [
-        "register_name".encode("utf-8"),
-        name.encode("utf-8"),
-        validity.to_bytes(8, "big")
-    ]
-    store_owners_add_txn_unsign = transaction.ApplicationNoOpTxn(sender, algod_client.suggested_params(), reg_app_id, txn_args, [lsig.address()])
+    txn_args = registry_call("register_name", name, validity, dispatch=REGISTRY_DISPATCH)
+    store_owners_add_txn_unsign = transaction.ApplicationNoOpTxn(sender, suggested_params(algod_client), reg_app_id, txn_args, [lsig.address()])
     Grp_txns_unsign.append(store_owners_add_txn_unsign)
 
     gid = transaction.calculate_group_id(Grp_txns_unsign)
@@ -236,27 +271,50 @@ def sign_name_reg_gtxn(sender_add, sender_private_key, Grp_txns_unsign, lsig, al
 
 def link_socials(domainname, platform_name, profile, sender, sender_private_key, reg_app_id, algod_client):
     
-    txn_args = [
-        "update_name".encode("utf-8"),
-        platform_name.encode("utf-8"),
-        profile.encode("utf-8"),
-    ]
+    txn_args = registry_call("update_name", platform_name, profile, dispatch=REGISTRY_DISPATCH)
     reg_escrow_acct = logic.get_application_address(reg_app_id)
-    lsig = prep_name_record_logic_sig(algod_client, domainname, reg_app_id)
-    link_social_txn_unsign = transaction.ApplicationNoOpTxn(sender, algod_client.suggested_params(), reg_app_id, txn_args, [lsig.address()])
+    name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+    link_social_txn_unsign = transaction.ApplicationNoOpTxn(sender, suggested_params(algod_client), reg_app_id, txn_args, [name_record_addr])
     txn_signed_link_social = link_social_txn_unsign.sign(sender_private_key)
     txid = txn_signed_link_social.get_txid()
     algod_client.send_transaction(txn_signed_link_social)
     wait_for_confirmation(algod_client,txid)
 
+# Links several socials, {platform_name: profile}, with one app call per
+# MAX_PROPERTIES_PER_CALL of them, all sent before waiting for confirmation
+def link_socials_batch(domainname, profiles, sender, sender_private_key, reg_app_id, algod_client):
+
+    name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+    sp = suggested_params(algod_client)
+    items = list(profiles.items())
+    txids = []
+    for start in range(0, len(items), MAX_PROPERTIES_PER_CALL):
+        pairs = [value for item in items[start:start + MAX_PROPERTIES_PER_CALL] for value in item]
+        txn_args = registry_call("update_properties", *pairs, dispatch=REGISTRY_DISPATCH)
+        txn_signed = transaction.ApplicationNoOpTxn(sender, sp, reg_app_id, txn_args, [name_record_addr]).sign(sender_private_key)
+        algod_client.send_transaction(txn_signed)
+        txids.append(txn_signed.get_txid())
+    wait_for_confirmations(algod_client, txids)
+
+# Packs the fields of names registered before the packed record, any
+# account may send it
+def migrate_name_records(domainnames, sender, sender_private_key, reg_app_id, algod_client):
+
+    txn_args = registry_call("migrate_record", dispatch=REGISTRY_DISPATCH)
+    sp = suggested_params(algod_client)
+    txids = []
+    for domainname in domainnames:
+        name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+        txn_signed = transaction.ApplicationNoOpTxn(sender, sp, reg_app_id, txn_args, [name_record_addr]).sign(sender_private_key)
+        algod_client.send_transaction(txn_signed)
+        txids.append(txn_signed.get_txid())
+    wait_for_confirmations(algod_client, txids)
+
 def init_name_tnsfr_txn(domainname, sender, sender_private_key, tnsfr_price, recipient_addr, reg_app_id, algod_client):
 
-    txn_args = [
-        "initiate_transfer".encode("utf-8"),
-        tnsfr_price.to_bytes(8, "big")
-    ]
-    lsig = prep_name_record_logic_sig(algod_client, domainname, reg_app_id)
-    txn_init_name_tnsfr_unsign = transaction.ApplicationNoOpTxn(sender, algod_client.suggested_params(), reg_app_id, txn_args, [lsig.address(),recipient_addr])
+    txn_args = registry_call("initiate_transfer", tnsfr_price, dispatch=REGISTRY_DISPATCH)
+    name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+    txn_init_name_tnsfr_unsign = transaction.ApplicationNoOpTxn(sender, suggested_params(algod_client), reg_app_id, txn_args, [name_record_addr,recipient_addr])
     txn_init_name_tnsfr_signd = txn_init_name_tnsfr_unsign.sign(sender_private_key)
     txid = txn_init_name_tnsfr_signd.get_txid()
     algod_client.send_transaction(txn_init_name_tnsfr_signd)
@@ -269,20 +327,18 @@ def prep_cmplte_name_tnsfr_gtxn(domainname, sender, tnsfr_price, recipient_addr,
     Grp_txns_unsign = []
 
     # 1. Payment for name transfer 
-    pmnt_txn_unsign = transaction.PaymentTxn(sender, algod_client.suggested_params(), recipient_addr, tnsfr_price, None)
+    pmnt_txn_unsign = transaction.PaymentTxn(sender, suggested_params(algod_client), recipient_addr, tnsfr_price, None)
     Grp_txns_unsign.append(pmnt_txn_unsign)
 
     # 2. Transfer fee payment to registry 
     reg_escrow_acct = logic.get_application_address(reg_app_id)
-    tnsfr_fee_pmnt_txn_unsign = transaction.PaymentTxn(sender, algod_client.suggested_params(), reg_escrow_acct, 2000000, None)
+    tnsfr_fee_pmnt_txn_unsign = transaction.PaymentTxn(sender, suggested_params(algod_client), reg_escrow_acct, 2000000, None)
     Grp_txns_unsign.append(tnsfr_fee_pmnt_txn_unsign)
 
     # 3. 
-    txn_args = [
-        "accept_transfer".encode("utf-8"),
-    ]
-    lsig = prep_name_record_logic_sig(algod_client, domainname, reg_app_id)
-    txn_accpt_name_tnsfr_unsign = transaction.ApplicationNoOpTxn(sender, algod_client.suggested_params(), reg_app_id, txn_args, [lsig.address()])
+    txn_args = registry_call("accept_transfer", dispatch=REGISTRY_DISPATCH)
+    name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+    txn_accpt_name_tnsfr_unsign = transaction.ApplicationNoOpTxn(sender, suggested_params(algod_client), reg_app_id, txn_args, [name_record_addr])
     Grp_txns_unsign.append(txn_accpt_name_tnsfr_unsign)
 
     gid = transaction.calculate_group_id(Grp_txns_unsign)
@@ -305,15 +361,14 @@ def get_socials(algod_client, name, platform_name, reg_app_id):
     algod_indexer = SetupIndexer("purestake")
     reg_escrow_acct = logic.get_application_address(reg_app_id)
     # TODO: Need proper error handling, this fails keynotfound
-    for apps_local_data in algod_indexer.account_info(address=prep_name_record_logic_sig(algod_client, name, reg_app_id).address())['account']['apps-local-state']:
+    for apps_local_data in algod_indexer.account_info(address=get_name_record_address(algod_client, name, reg_app_id))['account']['apps-local-state']:
         profile_name = None
         expiry = None
         if(apps_local_data['id']==reg_app_id and not apps_local_data['deleted']):
-            for key_value in apps_local_data['key-value']:
-                if(base64.b64decode(key_value['key']).decode()=="expiry"):
-                    expiry = key_value['value']['uint']
-                elif(base64.b64decode(key_value['key']).decode()==platform_name):
-                    profile_name = base64.b64decode(key_value['value']['bytes']).decode()
+            state = decode_local_state(apps_local_data['key-value'])
+            expiry = state.get('expiry')
+            if(platform_name in state['properties']):
+                profile_name = state['properties'][platform_name].decode()
         if(profile_name!=None and expiry!=None and expiry>int(time.time())):
             return profile_name
         else:
@@ -323,17 +378,16 @@ def resolve_name(algod_client, name, reg_app_id):
     # TODO: Make sure there are no edge cases
     algod_indexer = SetupIndexer("purestake")
     reg_escrow_acct = logic.get_application_address(reg_app_id)
-    for apps_local_data in algod_indexer.account_info(address=prep_name_record_logic_sig(algod_client,name, reg_app_id).address())['account']['apps-local-state']:
+    for apps_local_data in algod_indexer.account_info(address=get_name_record_address(algod_client, name, reg_app_id))['account']['apps-local-state']:
         owner = None
         expiry = None
         if(apps_local_data['id']==reg_app_id and not apps_local_data['deleted']):
-            for key_value in apps_local_data['key-value']:
-                if(base64.b64decode(key_value['key']).decode()=="expiry"):
-                    expiry = key_value['value']['uint']
-                    print("Current time: "+str(int(time.time())))
-                    print("Expiry time: "+str(expiry))
-                elif(base64.b64decode(key_value['key']).decode()=="owner"):
-                    owner = encoding.encode_address(base64.b64decode(key_value['value']['bytes']))
+            state = decode_local_state(apps_local_data['key-value'])
+            if('expiry' in state):
+                expiry = state['expiry']
+                print("Current time: "+str(int(time.time())))
+                print("Expiry time: "+str(expiry))
+                owner = encoding.encode_address(state['owner'])
         if(owner!=None and expiry!=None and expiry>int(time.time())):
             return owner
         else:
@@ -343,12 +397,9 @@ def get_name_expiry(algod_client, name, reg_app_id):
     # TODO: Make sure there are no edge cases
     algod_indexer = SetupIndexer("purestake")
     reg_escrow_acct = logic.get_application_address(reg_app_id)
-    for apps_local_data in algod_indexer.account_info(address=prep_name_record_logic_sig(algod_client,name, reg_app_id).address())['account']['apps-local-state']:
+    for apps_local_data in algod_indexer.account_info(address=get_name_record_address(algod_client, name, reg_app_id))['account']['apps-local-state']:
         if(apps_local_data['id']==reg_app_id and not apps_local_data['deleted']):
-            for key_value in apps_local_data['key-value']:
-                if(base64.b64decode(key_value['key']).decode()=="expiry"):
-                    expiry = key_value['value']['uint']
-                    return expiry
+            return decode_local_state(apps_local_data['key-value']).get('expiry')
         return None
 
 
@@ -359,16 +410,13 @@ def renew_name(algod_client,domainname,no_years,reg_app_id,sender_private_key):
     # 1. PaymentTxn to Smart Contract
     reg_escrow_acct = logic.get_application_address(reg_app_id)
     sender = account.address_from_private_key(sender_private_key)
-    pmnt_txn_unsign = transaction.PaymentTxn(sender, algod_client.suggested_params(), reg_escrow_acct, get_name_price(domainname)*no_years, None)
+    pmnt_txn_unsign = transaction.PaymentTxn(sender, suggested_params(algod_client), reg_escrow_acct, get_name_price(domainname)*no_years, None)
     Grp_txns_unsign.append(pmnt_txn_unsign)
 
 
-    txn_args = [
-        "renew_name".encode("utf-8"),
-        no_years.to_bytes(8, "big")
-    ]
-    lsig = prep_name_record_logic_sig(algod_client,domainname, reg_app_id)
-    renewal_txn_unsign = transaction.ApplicationNoOpTxn(sender, algod_client.suggested_params(), reg_app_id, txn_args, [lsig.address()])
+    txn_args = registry_call("renew_name", no_years, dispatch=REGISTRY_DISPATCH)
+    name_record_addr = get_name_record_address(algod_client, domainname, reg_app_id)
+    renewal_txn_unsign = transaction.ApplicationNoOpTxn(sender, suggested_params(algod_client), reg_app_id, txn_args, [name_record_addr])
     Grp_txns_unsign.append(renewal_txn_unsign)
 
     transaction.assign_group_id(Grp_txns_unsign)
@@ -380,11 +428,58 @@ def renew_name(algod_client,domainname,no_years,reg_app_id,sender_private_key):
     algod_client.send_transactions(Grp_txns_signed)
     wait_for_confirmation(algod_client,txid)
 
-# helper function to compile program source
+# Renews many names, {domainname: no_years}, in groups of one payment and up
+# to MAX_GROUP_SIZE-1 renew_name calls. All groups are sent before waiting.
+def renew_names(algod_client,renewals,reg_app_id,sender_private_key):
+    reg_escrow_acct = logic.get_application_address(reg_app_id)
+    sender = account.address_from_private_key(sender_private_key)
+    sp = suggested_params(algod_client)
+    items = list(renewals.items())
+    per_group = constants.MAX_GROUP_SIZE - 1
+    txids = []
+    for start in range(0, len(items), per_group):
+        batch = items[start:start + per_group]
+        total = sum(get_name_price(domainname)*no_years for domainname, no_years in batch)
+        Grp_txns_unsign = [transaction.PaymentTxn(sender, sp, reg_escrow_acct, total, None)]
+        for domainname, no_years in batch:
+            txn_args = registry_call("renew_name", no_years, dispatch=REGISTRY_DISPATCH)
+            Grp_txns_unsign.append(transaction.ApplicationNoOpTxn(sender, sp, reg_app_id, txn_args, [get_name_record_address(algod_client, domainname, reg_app_id)]))
+        transaction.assign_group_id(Grp_txns_unsign)
+        Grp_txns_signed = [txn.sign(sender_private_key) for txn in Grp_txns_unsign]
+        algod_client.send_transactions(Grp_txns_signed)
+        txids.append(Grp_txns_signed[-1].get_txid())
+    wait_for_confirmations(algod_client, txids)
+
+_algod_assemblers = {}
+
+# TEAL to bytecode for the helpers: algod's compile, or the offline
+# assembler with OFFLINE_ASSEMBLY. One function per client, so the name
+# record templates built with it are cached per client.
+def teal_assembler(algod_client):
+    if OFFLINE_ASSEMBLY:
+        return assemble
+    algod_assemble = _algod_assemblers.get(algod_client)
+    if algod_assemble is None:
+        def algod_assemble(teal):
+            return base64.b64decode(algod_client.compile(teal)['result'])
+        _algod_assemblers[algod_client] = algod_assemble
+    return algod_assemble
+
+# helper function to compile program source with algod, or with the offline
+# assembler on request, falling back to algod for programs it can't handle
 def compile_program(algod_client, source_code) :
+    if OFFLINE_ASSEMBLY:
+        try:
+            return assemble(source_code.decode('utf-8'))
+        except TealAssemblyError:
+            pass
     compile_response = algod_client.compile(source_code.decode('utf-8'))
     return base64.b64decode(compile_response['result'])
 
+# helper function to build and compile a PyTeal program through the build cache
+def build_program(algod_client, program_fn, *args, mode=Mode.Application, version=6):
+    return build_cache.program(teal_assembler(algod_client), program_fn, *args, mode=mode, version=version)
+
 def import_teal_source_code_as_binary(file_name):
     with open(file_name, 'r') as f:
         data = f.read()
@@ -392,15 +487,13 @@ def import_teal_source_code_as_binary(file_name):
 
 # helper function that waits for a given txid to be confirmed by the network
 def wait_for_confirmation(algod_client,txid) :
-    last_round = algod_client.status().get('last-round')
-    txinfo = algod_client.pending_transaction_info(txid)
-    while not (txinfo.get('confirmed-round') and txinfo.get('confirmed-round') > 0):
-        print("Waiting for txn confirmation...")
-        last_round += 1
-        algod_client.status_after_block(last_round)
-        txinfo = algod_client.pending_transaction_info(txid)
+    txinfo = wait_for_confirmations(algod_client, [txid])[0]
     print("Transaction {} confirmed in round {}.".format(txid, txinfo.get('confirmed-round')))
     return txinfo
 
+# pending transaction info of several txids, all waited for together
+def wait_for_confirmations(algod_client, txids):
+    return confirmation.wait_for_confirmations(algod_client, txids, params_cache(algod_client).observe_round)
+
 if __name__ == "__main__":
     main()